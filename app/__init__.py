@@ -1,35 +1,77 @@
 from flask import Flask
-from flask_cors import CORS
-from flask_mail import Mail
 from flask_jwt_extended import JWTManager
-from config import Config
 
 from app.database.context import db
 
 
-mail = Mail()
 jwt = JWTManager()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
-    # Load config
-    app.config.from_object(Config)
+    # Load config; settings read from the environment are resolved here
+    from config import configure
+    configure(app, config)
+
+    from flask_cors import CORS
     CORS(app)
 
-    # Initialize extensions
-    mail.init_app(app)
+    # orjson-backed JSON for requests and responses, and opt-in compression
+    from app.compression import init_compression
+    from app.json_provider import init_json_provider
+    init_json_provider(app)
+    init_compression(app)
+
+    # Initialize extensions. Flask-Mail is set up on first send, see
+    # app.mailman.utils.get_mail_state.
     jwt.init_app(app)
 
     # Initialize database
     db.init_app(app)
 
+    # Server-side sessions in the database, fronted by a per-process cache
+    if app.config.get('SESSION_TYPE') == 'SqlAlchemy':
+        from app.database.sessions import init_sessions
+        init_sessions(app)
+
+    # Replays of retried requests that carry an Idempotency-Key
+    from app.idempotency import init_idempotency
+    init_idempotency(app)
+
+    # Request, SQL and SMTP instrumentation served at /metrics
+    if app.config.get('METRICS_ENABLED', True):
+        from app.metrics.instrumentation import init_metrics
+        init_metrics(app)
+
+    from app.auth.cache import init_identity_cache
+    from app.auth.keys import init_key_ring
+    from app.auth.hashing import init_password_hasher
+    from app.auth.ratelimit import init_auth_admission
+    from app.auth.revocation import init_token_revocations
+    init_identity_cache(app)
+    init_key_ring(app)
+    init_password_hasher(app)
+    init_auth_admission(app)
+    init_token_revocations(app)
+
     # Register blueprints
-    from app.auth import auth_bp
+    from app.auth import auth_bp, well_known_bp
     app.register_blueprint(auth_bp)
+    app.register_blueprint(well_known_bp)
 
     from app.mailman import mailman_bp
     app.register_blueprint(mailman_bp)
 
+    from app.auth.commands import jwt_cli, users_cli
+    app.cli.add_command(users_cli)
+    app.cli.add_command(jwt_cli)
+
+    # Compile mail templates and set up background mail delivery; the
+    # serving process starts the senders, see app.lifecycle.start_background
+    from app.mailman.engine import init_template_engine
+    from app.mailman.queue import init_mail_queue
+    init_template_engine(app)
+    init_mail_queue(app)
+
 
     return app
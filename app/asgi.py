@@ -0,0 +1,168 @@
+import inspect
+import io
+import sys
+
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+_views = {}
+
+
+def async_view(endpoint):
+    """Register the decorated coroutine as the async variant of ``endpoint``.
+
+    The sync view keeps serving the WSGI app; under ``AsyncApp`` requests
+    for the endpoint are served by the async one instead.
+    """
+    def decorator(view):
+        _views[endpoint] = view
+        return view
+    return decorator
+
+
+class AsyncApp(object):
+    """Serves a Flask app over ASGI.
+
+    Endpoints with an async variant run it on the event loop inside a
+    regular Flask request context, so request hooks, error handlers and
+    ``request`` work as usual, and the loop serves other requests while it
+    awaits the database or the hashing pool. Everything else goes to the
+    sync Flask app on a thread through asgiref's ``WsgiToAsgi``.
+    """
+
+    def __init__(self, flask_app, views=None):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.views = dict(_views if views is None else views)
+        self.wsgi = WsgiToAsgi(flask_app)
+        self._urls = flask_app.url_map.bind('')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        view = self._match(scope) if scope['type'] == 'http' else None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        environ = _environ(scope, await _read_body(receive))
+        response = await self.dispatch(environ, view)
+        try:
+            await _send_response(send, response, environ)
+        finally:
+            response.close()
+
+    async def dispatch(self, environ, view):
+        """Flask's ``full_dispatch_request`` with the view awaited."""
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = view(**request.view_args)
+                        # Decorators such as validate_json return early
+                        # responses directly rather than a coroutine.
+                        if inspect.isawaitable(rv):
+                            rv = await rv
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.handle_exception(e)
+
+    async def aclose(self):
+        """Close the async engines; call it from the loop that used them."""
+        database = self.flask_app.extensions.get('async_db')
+        if database is not None:
+            await database.dispose()
+
+    def _match(self, scope):
+        try:
+            endpoint, _ = self._urls.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None
+        return self.views.get(endpoint)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Already running under gunicorn, started by post_fork.
+                from app.lifecycle import start_background
+                start_background(self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            continue
+        key = 'CONTENT_TYPE' if name == 'content-type' else 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    # The body has been read whole, chunked or not.
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+async def _send_response(send, response, environ):
+    body, status, headers = response.get_wsgi_response(environ)
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+    })
+    for chunk in body:
+        if chunk:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def create_asgi_app(flask_app=None):
+    """Wrap ``flask_app``, or a new app from ``create_app``, for an ASGI server."""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+
+    from app.database.aio import init_async_database
+    if 'async_db' not in flask_app.extensions:
+        init_async_database(flask_app)
+
+    # Importing the async views registers them.
+    import app.auth.async_views
+    import app.mailman.async_views
+    return AsyncApp(flask_app)
@@ -1 +1 @@
-from app.auth.routes import auth_bp
\ No newline at end of file
+from app.auth.routes import auth_bp, well_known_bp
\ No newline at end of file
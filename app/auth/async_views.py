@@ -0,0 +1,174 @@
+"""Async variants of the I/O-bound auth views, served by ``app.asgi.AsyncApp``.
+
+They behave like the views in ``app.auth.routes`` but talk to the database
+through the asyncio engine and await the hashing pool, so a slow query or
+hash doesn't hold a thread. Users are the same ``UserRecord``s as in the
+identity cache, and writes are targeted UPDATEs that invalidate it.
+"""
+from datetime import timedelta
+from functools import wraps
+
+import jwt
+from flask import current_app as app, g, jsonify, request
+from flask_jwt_extended import create_access_token, decode_token
+from flask_jwt_extended.exceptions import (InvalidHeaderError, NoAuthorizationError, RevokedTokenError,
+                                           UserLookupError, WrongTokenError)
+from sqlalchemy.exc import IntegrityError
+
+from app.asgi import async_view
+from app.auth.cache import UserRecord, invalidate_user, select_records, users
+from app.auth.hashing import get_password_hasher
+from app.auth.models import User, canonical_email, canonical_username
+from app.auth.ratelimit import get_auth_admission
+from app.auth.schemas import login_schema, register_schema
+from app.auth.utils import CONFIRM_EMAIL, is_token_revoked, verified_claims
+from app.database.aio import from_replica_async, get_async_database
+from app.idempotency import idempotent
+from app.mailman.queue import get_mail_queue
+from app.mailman.utils import queue_email
+from app.validation import validate_json
+
+
+async def _first_user(condition):
+    async def load(connection):
+        row = (await connection.execute(select_records.where(condition))).first()
+        return UserRecord(*row) if row is not None else None
+    return await from_replica_async(load)
+
+
+async def load_user(user_id=None, email=None):
+    """A user's record by id or email, from the identity cache if possible."""
+    cache = app.extensions.get('identity_cache')
+    user = cache.cached(user_id, email) if cache is not None else None
+    if user is None:
+        user = await _first_user(users.c.id == user_id if user_id is not None else users.c.email_key == canonical_email(email))
+        if user is not None and cache is not None:
+            cache.store(user)
+    return user
+
+
+async def update_user(user_id, *where, **values):
+    async with get_async_database().engine().begin() as connection:
+        changed = (await connection.execute(users.update().where(users.c.id == user_id, *where).values(**values))).rowcount
+    if changed:
+        invalidate_user(user_id=user_id)
+    return bool(changed)
+
+
+async def authenticate(username, password):
+    hasher = get_password_hasher()
+    user = await _first_user(users.c.username_key == canonical_username(username))
+    if user and await hasher.verify_async(user.password, password):
+        if hasher.needs_rehash(user.password):
+            await update_user(user.id, password=await hasher.hash_async(password))
+        return user
+
+
+async def verify_token(token):
+    try:
+        claims = verified_claims(token)
+        if claims and claims.get('purpose') == CONFIRM_EMAIL:
+            return await load_user(email=claims['sub'])
+    except Exception as e:
+        return None
+
+
+def jwt_required_async(view):
+    """``jwt_required`` for async views; the user is loaded without blocking.
+
+    Failures raise the same flask_jwt_extended errors, so the responses
+    come from the handlers the JWTManager registered.
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization')
+        if not header:
+            raise NoAuthorizationError('Missing Authorization Header')
+        scheme, _, token = header.partition(' ')
+        if scheme != 'Bearer' or not token:
+            raise InvalidHeaderError("Bad Authorization header. Expected 'Authorization: Bearer <JWT>'")
+
+        claims = decode_token(token)
+        jwt_header = jwt.get_unverified_header(token)
+        if claims.get('type') != 'access':
+            raise WrongTokenError('Only non-refresh tokens are allowed')
+        if is_token_revoked(jwt_header, claims):
+            raise RevokedTokenError(jwt_header, claims)
+        # Only login tokens, which carry the user id, load a user.
+        identity = claims['sub']
+        user = None
+        if 'purpose' not in claims and isinstance(identity, int):
+            user = await load_user(user_id=identity)
+        if user is None:
+            raise UserLookupError('Error loading the user %s' % identity, jwt_header, claims)
+        # Where jwt_required leaves them for get_jwt() and get_jwt_identity().
+        g._jwt_extended_jwt_header = jwt_header
+        g._jwt_extended_jwt = claims
+        return await view(*args, **kwargs)
+    return wrapper
+
+
+@async_view('auth.login')
+@validate_json(login_schema)
+async def login(data):
+    username = data['username']
+    password = data['password']
+
+    admission = get_auth_admission()
+    if admission:
+        admission.limit_username(username)
+        with admission.verification_slot():
+            user = await authenticate(username, password)
+    else:
+        user = await authenticate(username, password)
+
+    if not user:
+        return jsonify({'msg': 'Invalid username or password'}), 401
+
+    return jsonify({'access_token': create_access_token(identity=user.id)}), 200
+
+
+@async_view('auth.register')
+@validate_json(register_schema)
+@idempotent()
+async def register(data):
+    username = data['username']
+    email = data['email']
+    phone = data['phone']
+
+    # The schema applies the model's rules; only the hash and the lookup
+    # keys are left to do.
+    row = dict(data, password=await get_password_hasher().hash_async(data['password']),
+               **User.lookup_keys(username, email, phone))
+    token = create_access_token(identity=email, expires_delta=timedelta(seconds=app.config['JWT_REGISTRATION_TOKEN_EXPIRES']),
+                                additional_claims={'purpose': CONFIRM_EMAIL})
+    confirm_url = "{frontend_url}/confirm/email?token={token}".format(frontend_url=app.config['FRONTEND_URL'], token=token)
+
+    # The user and their email are committed together, as in the sync view.
+    database = get_async_database()
+    try:
+        async with database.engine().begin() as connection:
+            await connection.execute(users.insert().values(**row))
+            await queue_email(connection, email, 'Confirm your email', 'confirm_email.html', {'confirm_url': confirm_url})
+    except IntegrityError:
+        async with database.engine().connect() as connection:
+            taken = (await connection.execute(User.select_taken(username, email, phone))).all()
+        return jsonify(msg=User.uniqueness_error(username, email, phone, taken) or 'User already exists'), 400
+    except Exception as e:
+        app.logger.error('Could not queue email to %s: %r', email, e)
+        return jsonify({'msg': 'Error in sending verification email'}), 500
+
+    get_mail_queue().notify()
+    return jsonify({'msg': 'Verification email sent'}), 201
+
+
+@async_view('auth.confirm_email')
+async def confirm_email():
+    user = await verify_token(request.args.get('token'))
+
+    if not user:
+        return jsonify({'msg': 'Invalid token'}), 401
+
+    await update_user(user.id, users.c.email_verified.is_not(True), email_verified=True)
+
+    return jsonify({'msg': 'Email confirmed'}), 200
@@ -0,0 +1,107 @@
+"""Add and fill the canonical lookup keys of users created before they existed.
+
+The columns are added without an index, filled in id order a batch per
+transaction, and only then indexed, so the table is never locked for the
+whole backfill. A row whose key another user already has keeps NULL in that
+column and is reported; it can't be found by that value until the clash is
+resolved and the command is run again.
+"""
+import time
+
+from sqlalchemy import bindparam, inspect
+from sqlalchemy.schema import CreateColumn
+
+from app.auth.models import User
+from app.database.context import db
+
+KEY_FIELDS = (('username_key', 'username'), ('email_key', 'email'), ('phone_key', 'phone'))
+KEY_INDEXES = ('uq_user_username_key', 'uq_user_email_key', 'uq_user_phone_key')
+
+users = User.__table__
+
+
+class BackfillStats(object):
+    __slots__ = ('added_columns', 'scanned', 'updated', 'conflicts', 'started')
+
+    def __init__(self):
+        self.added_columns = []
+        self.scanned = 0
+        self.updated = 0
+        self.conflicts = []
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.scanned / elapsed if elapsed else 0.0
+
+
+def add_key_columns(engine):
+    """Add the key columns a table from an older release lacks; returns their names."""
+    existing = {column['name'] for column in inspect(engine).get_columns(users.name)}
+    missing = [field for field, _ in KEY_FIELDS if field not in existing]
+    with engine.begin() as connection:
+        table = connection.dialect.identifier_preparer.format_table(users)
+        for field in missing:
+            column = CreateColumn(users.c[field]).compile(dialect=connection.dialect)
+            connection.exec_driver_sql('ALTER TABLE %s ADD COLUMN %s' % (table, column))
+    return missing
+
+
+def create_key_indexes(engine):
+    for index in users.indexes:
+        if index.name in KEY_INDEXES:
+            index.create(engine, checkfirst=True)
+
+
+def backfill_keys(batch_size=1000, progress=None):
+    """Fill the NULL key columns of every user; safe to run again."""
+    engine = db.engine
+    stats = BackfillStats()
+    stats.added_columns = add_key_columns(engine)
+
+    missing = db.or_(*[users.c[field].is_(None) for field, _ in KEY_FIELDS])
+    update = users.update().where(users.c.id == bindparam('row_id')).values(
+        {field: bindparam('new_' + field) for field, _ in KEY_FIELDS})
+
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                db.select(users.c.id, users.c.username, users.c.email, users.c.phone)
+                .where(users.c.id > last_id, missing).order_by(users.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            params = _batch_params(connection, rows, stats)
+            connection.execute(update, params)
+        last_id = rows[-1].id
+        stats.scanned += len(rows)
+        stats.updated += len(params)
+        if progress is not None:
+            progress(stats)
+
+    create_key_indexes(engine)
+    return stats
+
+
+def _batch_params(connection, rows, stats):
+    keys = [User.lookup_keys(row.username, row.email, row.phone) for row in rows]
+    # Who holds each key already, including rows earlier in this batch.
+    holders = {}
+    for field, _ in KEY_FIELDS:
+        column = users.c[field]
+        wanted = {row_keys[field] for row_keys in keys}
+        holders[field] = dict(connection.execute(db.select(column, users.c.id).where(column.in_(wanted))).all())
+
+    params = []
+    for row, row_keys in zip(rows, keys):
+        values = {'row_id': row.id}
+        for field, source in KEY_FIELDS:
+            value = row_keys[field]
+            holder = holders[field].setdefault(value, row.id)
+            if holder != row.id:
+                stats.conflicts.append((row.id, source, getattr(row, source), holder))
+                value = None
+            values['new_' + field] = value
+        params.append(values)
+    return params
@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from app.auth.models import User, canonical_email
+from app.database.context import db, from_replica
+
+# What the read paths use; never the names or the phone.
+RECORD_COLUMNS = ('id', 'username', 'password', 'email', 'email_verified', 'phone_verified', 'is_admin')
+
+users = User.__table__
+select_records = db.select(*[users.c[name] for name in RECORD_COLUMNS])
+
+
+class UserRecord(namedtuple('UserRecord', RECORD_COLUMNS)):
+    """A user as the routes that don't change it see it: a few columns in
+    a tuple, without the identity map or change tracking of a ``User``.
+    Writers update the row by id instead of saving a loaded ``User``."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<UserRecord %r>' % self.username
+
+
+def query_user_record(condition):
+    """The ``UserRecord`` of the first user matching ``condition``, or None."""
+    row = db.session.execute(select_records.where(condition)).first()
+    return UserRecord(*row) if row is not None else None
+
+
+class IdentityCache(object):
+    """Per-process TTL/LRU cache of ``UserRecord``s, keyed by id and
+    canonical email. Records are immutable, so hits are shared as they are.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._records = OrderedDict()
+        self._ids_by_email = {}
+        self._lock = threading.Lock()
+
+    def get_by_id(self, user_id):
+        return self._lookup(user_id, lambda: _query_by_id(user_id))
+
+    def get_by_email(self, email):
+        with self._lock:
+            user_id = self._ids_by_email.get(canonical_email(email))
+        return self._lookup(user_id, lambda: _query_by_email(email))
+
+    def invalidate(self, user_id=None, email=None):
+        with self._lock:
+            if email is not None and user_id is None:
+                user_id = self._ids_by_email.get(canonical_email(email))
+            if user_id is not None:
+                self._discard(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._ids_by_email.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._records)}
+
+    def cached(self, user_id=None, email=None):
+        """The cached record of a user, or None on a miss.
+
+        For callers that don't query through the session, e.g. the async
+        views; they ``store`` what they load themselves.
+        """
+        if user_id is None and email is not None:
+            with self._lock:
+                user_id = self._ids_by_email.get(canonical_email(email))
+        return self._cached(user_id)
+
+    def store(self, record):
+        self._store(record)
+
+    def _lookup(self, user_id, query):
+        record = self._cached(user_id)
+        if record is None:
+            record = query()
+            if record is not None:
+                self._store(record)
+        return record
+
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._records.get(user_id) if user_id is not None else None
+            if entry is not None and entry[1] > time.monotonic():
+                self._records.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._discard(user_id)
+            self.misses += 1
+        return None
+
+    def _store(self, record):
+        with self._lock:
+            self._discard(record.id)
+            self._records[record.id] = (record, time.monotonic() + self.ttl)
+            self._ids_by_email[canonical_email(record.email)] = record.id
+            while len(self._records) > self.maxsize:
+                _, (evicted, _) = self._records.popitem(last=False)
+                self._ids_by_email.pop(canonical_email(evicted.email), None)
+
+    def _discard(self, user_id):
+        entry = self._records.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_email.pop(canonical_email(entry[0].email), None)
+
+
+def _query_by_id(user_id):
+    return from_replica(lambda: query_user_record(users.c.id == user_id))
+
+
+def _query_by_email(email):
+    return from_replica(lambda: query_user_record(users.c.email_key == canonical_email(email)))
+
+
+def _changed_users(session):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            yield instance
+
+
+def _current_cache():
+    if has_app_context():
+        return current_app.extensions.get('identity_cache')
+
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_after_flush(session, flush_context):
+    cache = _current_cache()
+    if cache is None:
+        return
+    stale = session.info.setdefault('identity_cache_stale', set())
+    for user in _changed_users(session):
+        stale.add((user.id, None))
+        stale.update((None, email) for email in inspect(user).attrs.email.history.sum())
+    for user_id, email in stale:
+        cache.invalidate(user_id=user_id, email=email)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    # Invalidate again: another thread may have cached the pre-commit row
+    # between our flush and commit.
+    stale = session.info.pop('identity_cache_stale', None)
+    cache = _current_cache()
+    if stale and cache is not None:
+        for user_id, email in stale:
+            cache.invalidate(user_id=user_id, email=email)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('identity_cache_stale', None)
+
+
+def init_identity_cache(app):
+    cache = None
+    if app.config.get('IDENTITY_CACHE_ENABLED', True):
+        cache = IdentityCache(app.config.get('IDENTITY_CACHE_SIZE', 1024), app.config.get('IDENTITY_CACHE_TTL', 60))
+        app.extensions['identity_cache'] = cache
+    return cache
+
+
+def load_user_by_id(user_id):
+    cache = _current_cache()
+    if cache is None:
+        return _query_by_id(user_id)
+    return cache.get_by_id(user_id)
+
+
+def load_user_by_email(email):
+    cache = _current_cache()
+    if cache is None:
+        return _query_by_email(email)
+    return cache.get_by_email(email)
+
+
+def invalidate_user(user_id=None, email=None):
+    """Drop a user changed without the session, e.g. by a Core UPDATE."""
+    cache = _current_cache()
+    if cache is not None:
+        cache.invalidate(user_id=user_id, email=email)
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+users_cli = AppGroup('users', help='Manage users.')
+jwt_cli = AppGroup('jwt', help='Manage JWT signing keys.')
+
+
+@users_cli.command('import')
+@click.argument('source', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Input format. Defaults to the file extension, or jsonl for stdin.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows validated, hashed and inserted together.')
+@click.option('--workers', type=int, help='Hashing processes. Defaults to PASSWORD_HASH_WORKERS.')
+@click.option('--hash-method', help='Defaults to PASSWORD_HASH_METHOD; weaker hashes are upgraded on login.')
+@click.option('--rejects', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows here as JSON lines, with the password removed.')
+def import_users(source, fmt, chunk_size, workers, hash_method, rejects):
+    """Bulk-create users from a CSV or JSON Lines file ("-" for stdin).
+
+    Needs username, password, firstname, lastname, email and phone per row.
+    """
+    from app.auth.importer import UserImporter, read_rows
+
+    config = current_app.config
+    fmt = fmt or ('csv' if source.lower().endswith('.csv') else 'jsonl')
+    stream = sys.stdin if source == '-' else open(source, newline='', encoding='utf-8')
+    rejects_file = open(rejects, 'w', encoding='utf-8') if rejects else None
+
+    def reject(line, row, error):
+        if rejects_file is not None:
+            row = {key: value for key, value in row.items() if key != 'password'}
+            rejects_file.write(json.dumps({'line': line, 'error': error, 'row': row}) + '\n')
+
+    def progress(stats):
+        click.echo('%d read, %d imported, %d rejected (%.0f rows/s)'
+                   % (stats.read, stats.imported, stats.rejected, stats.rate), err=True)
+
+    importer = UserImporter(
+        hash_method or config['PASSWORD_HASH_METHOD'],
+        config.get('PASSWORD_HASH_SALT_LENGTH', 16),
+        workers=config['PASSWORD_HASH_WORKERS'] if workers is None else workers,
+        chunk_size=chunk_size,
+        reject=reject,
+        progress=progress,
+    )
+    try:
+        stats = importer.run(read_rows(stream, fmt))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if rejects_file is not None:
+            rejects_file.close()
+
+    click.echo('Imported %d users, rejected %d%s' % (
+        stats.imported, stats.rejected, ' (see %s)' % os.path.abspath(rejects) if rejects and stats.rejected else ''))
+
+
+@users_cli.command('backfill-keys')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows updated per transaction.')
+def backfill_keys(batch_size):
+    """Add and fill the canonical username, email and phone lookup keys.
+
+    Run it once after upgrading a database created without them; it is safe
+    to run again. Logins and email lookups miss rows it hasn't filled yet.
+    """
+    from app.auth.backfill import backfill_keys as backfill
+
+    def progress(stats):
+        click.echo('%d scanned, %d updated (%.0f rows/s)' % (stats.scanned, stats.updated, stats.rate), err=True)
+
+    stats = backfill(batch_size, progress)
+    if stats.added_columns:
+        click.echo('Added columns %s' % ', '.join(stats.added_columns))
+    for user_id, field, value, holder in stats.conflicts:
+        click.echo('User %d: %s %r clashes with user %d; left unset' % (user_id, field, value, holder), err=True)
+    click.echo('Filled keys of %d users, %d conflicts' % (stats.updated, len(stats.conflicts)))
+    if stats.conflicts:
+        sys.exit(1)
+
+
+@jwt_cli.command('generate-key')
+@click.option('--algorithm', type=click.Choice(['RS256', 'EdDSA']),
+              help='Defaults to JWT_ALGORITHM.')
+@click.option('--directory', type=click.Path(file_okay=False),
+              help='Defaults to JWT_KEYS_DIR.')
+def generate_key(algorithm, directory):
+    """Write a new private key named after its kid.
+
+    The newest kid signs once workers restart, unless JWT_ACTIVE_KEY_ID pins
+    another; older keys keep verifying until they are removed.
+    """
+    from app.auth.keys import generate_private_key, new_kid, private_key_pem
+
+    config = current_app.config
+    algorithm = algorithm or config['JWT_ALGORITHM']
+    if algorithm not in ('RS256', 'EdDSA'):
+        raise click.UsageError('JWT_ALGORITHM is %s; pass --algorithm RS256 or EdDSA' % algorithm)
+    directory = directory or config['JWT_KEYS_DIR']
+    if not directory:
+        raise click.UsageError('Set JWT_KEYS_DIR or pass --directory')
+
+    os.makedirs(directory, exist_ok=True)
+    kid = new_kid()
+    path = os.path.join(directory, kid + '.pem')
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'wb') as key_file:
+        key_file.write(private_key_pem(generate_private_key(algorithm)))
+    click.echo(kid)
@@ -0,0 +1,137 @@
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HashingUnavailable(Exception):
+    """Raised when the hashing pool already has ``max_pending`` jobs."""
+
+
+class PasswordHasher(object):
+    """Runs password hashing and verification in a bounded process pool.
+
+    PBKDF2 holds the GIL for its whole run, so doing it on the request
+    thread stalls every other thread in the worker. With ``workers=0`` the
+    work runs inline instead, which is what the tests use.
+    """
+
+    def __init__(self, method='pbkdf2:sha256', salt_length=16, workers=2, max_pending=32, timeout=10):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            method=config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+            salt_length=config.get('PASSWORD_HASH_SALT_LENGTH', 16),
+            workers=config.get('PASSWORD_HASH_WORKERS', 2),
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 32),
+            timeout=config.get('PASSWORD_HASH_TIMEOUT', 10),
+        )
+
+    @property
+    def current_method(self):
+        method = self.method
+        if method.startswith('pbkdf2:') and method.count(':') == 1:
+            method = '%s:%d' % (method, DEFAULT_PBKDF2_ITERATIONS)
+        return method
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    async def hash_async(self, password):
+        return await self._run_async(generate_password_hash, password, self.method, self.salt_length)
+
+    async def verify_async(self, pwhash, password):
+        return await self._run_async(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        method, _, rest = pwhash.partition('$')
+        salt = rest.partition('$')[0]
+        return method != self.current_method or len(salt) != self.salt_length
+
+    def warm(self):
+        """Start the worker processes now rather than on the first login."""
+        if self.workers:
+            executor = self._get_executor()
+            for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+                future.result(self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return self._run_inline(func, *args)
+        try:
+            return self._submit(func, *args).result(self.timeout)
+        except FutureTimeout:
+            raise HashingUnavailable('Password hashing timed out')
+
+    async def _run_async(self, func, *args):
+        # Awaits the pool instead of blocking on it, so the event loop keeps
+        # serving other requests while the hash runs.
+        import asyncio
+
+        if not self.workers:
+            return self._run_inline(func, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self._submit(func, *args)), self.timeout)
+        except asyncio.TimeoutError:
+            raise HashingUnavailable('Password hashing timed out')
+
+    def _run_inline(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingUnavailable('Too many password hashing jobs in flight')
+        try:
+            return func(*args)
+        finally:
+            self._slots.release()
+
+    def _submit(self, func, *args):
+        # The slot is freed when the job finishes rather than when its caller
+        # gives up, so jobs that timed out still count against max_pending.
+        if not self._slots.acquire(blocking=False):
+            raise HashingUnavailable('Too many password hashing jobs in flight')
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _get_executor(self):
+        with self._lock:
+            # A pool inherited through fork has no live worker processes.
+            if self._executor is None or self._pid != os.getpid():
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+
+def init_password_hasher(app):
+    hasher = PasswordHasher.from_config(app.config)
+    app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,218 @@
+import csv
+import json
+import time
+from functools import partial
+from itertools import islice
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app.auth.models import User
+from app.auth.schemas import register_schema
+from app.database.context import db
+
+FIELDS = ('username', 'password', 'firstname', 'lastname', 'email', 'phone')
+# Uniqueness is checked on the canonical lookup keys, like the unique indexes do.
+UNIQUE_FIELDS = (('username_key', 'Username'), ('email_key', 'Email'), ('phone_key', 'Phone'))
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row, error)`` for every record of a CSV or JSON Lines
+    stream; ``error`` is set when the record itself can't be parsed."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, {}, 'Invalid JSON: %s' % e
+            continue
+        if not isinstance(row, dict):
+            yield line, {}, 'Expected a JSON object'
+            continue
+        yield line, row, None
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_row(row):
+    """Normalise ``row`` in place and return the first validation error, or None."""
+    for field in FIELDS:
+        value = row.get(field)
+        if value is not None:
+            value = str(value)
+            if field != 'password':
+                value = value.strip()
+        row[field] = value
+    return register_schema.first_error(row)
+
+
+class ImportStats(object):
+    __slots__ = ('read', 'imported', 'rejected', 'started')
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.read / elapsed if elapsed else 0.0
+
+
+class UserImporter(object):
+    """Creates users from ``(line, row, error)`` records a chunk at a time.
+
+    Each chunk is validated in memory, checked for duplicates against itself
+    and against the table with one IN query per unique column, hashed across
+    a process pool and written with a single executemany INSERT in its own
+    transaction. Hashing of one chunk overlaps with writing the previous one.
+    """
+
+    def __init__(self, method, salt_length=16, workers=0, chunk_size=1000, reject=None, progress=None):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.reject = reject
+        self.progress = progress
+        self.stats = ImportStats()
+        self._hash_one = partial(generate_password_hash, method=method, salt_length=salt_length)
+        self._pool = None
+
+    def run(self, records):
+        if self.workers:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            pending, pending_values = None, _empty_values()
+            for chunk in chunked(records, self.chunk_size):
+                candidates, values = self._screen(chunk, pending_values)
+                hashes = self._start_hashing(candidates)
+                if pending is not None:
+                    self._write(*pending)
+                pending, pending_values = (candidates, hashes), values
+            if pending is not None:
+                self._write(*pending)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+        return self.stats
+
+    def _screen(self, chunk, pending_values):
+        # ``pending_values`` holds the previous chunk, which may still be on
+        # its way to the table.
+        values = _empty_values()
+        candidates = []
+        for line, row, error in chunk:
+            self.stats.read += 1
+            error = error or validate_row(row)
+            if error is None:
+                keys = _lookup_keys(row)
+                for field, label in UNIQUE_FIELDS:
+                    if keys[field] in values[field] or keys[field] in pending_values[field]:
+                        error = '%s is duplicated in the input' % label
+                        break
+            if error:
+                self._reject(line, row, error)
+                continue
+            for field, _ in UNIQUE_FIELDS:
+                values[field].add(keys[field])
+            candidates.append((line, row))
+        return self._drop_existing(candidates), values
+
+    def _drop_existing(self, candidates):
+        if not candidates:
+            return candidates
+        keys = [_lookup_keys(row) for _, row in candidates]
+        taken = {}
+        for field, _ in UNIQUE_FIELDS:
+            column = getattr(User, field)
+            wanted = {row_keys[field] for row_keys in keys}
+            taken[field] = {value for (value,) in db.session.query(column).filter(column.in_(wanted))}
+        db.session.rollback()
+
+        kept = []
+        for (line, row), row_keys in zip(candidates, keys):
+            for field, label in UNIQUE_FIELDS:
+                if row_keys[field] in taken[field]:
+                    self._reject(line, row, '%s is already in use' % label)
+                    break
+            else:
+                kept.append((line, row))
+        return kept
+
+    def _start_hashing(self, candidates):
+        passwords = [row['password'] for _, row in candidates]
+        if self._pool is None:
+            return [self._hash_one(password) for password in passwords]
+        # map() submits everything now and hands results back in order.
+        return self._pool.map(self._hash_one, passwords, chunksize=max(1, len(passwords) // (self.workers * 4)))
+
+    def _write(self, candidates, hashes):
+        records = [_record(row, pwhash) for (_, row), pwhash in zip(candidates, hashes)]
+        if records and not self._insert(records):
+            # A concurrent registration took one of the values after our
+            # lookup; reject those rows and write the rest.
+            kept = {line for line, _ in self._drop_existing(candidates)}
+            pending = [(line, row, record) for (line, row), record in zip(candidates, records) if line in kept]
+            records = [record for _, _, record in pending]
+            if records and not self._insert(records):
+                # Still racing; settle it row by row.
+                records = self._insert_each(pending)
+        self.stats.imported += len(records)
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def _insert(self, records):
+        try:
+            db.session.execute(User.__table__.insert(), records)
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def _insert_each(self, pending):
+        written = []
+        for line, row, record in pending:
+            if self._insert([record]):
+                written.append(record)
+            elif self._drop_existing([(line, row)]):
+                # The clashing user is gone again; reject it all the same.
+                self._reject(line, row, 'Clashes with an existing user')
+        return written
+
+    def _reject(self, line, row, error):
+        self.stats.rejected += 1
+        if self.reject is not None:
+            self.reject(line, row, error)
+
+
+def _empty_values():
+    return {field: set() for field, _ in UNIQUE_FIELDS}
+
+
+def _lookup_keys(row):
+    return User.lookup_keys(row['username'], row['email'], row['phone'])
+
+
+def _record(row, pwhash):
+    record = {field: row[field] for field in FIELDS}
+    record.update(password=pwhash, email_verified=False, phone_verified=False, is_admin=False)
+    record.update(_lookup_keys(row))
+    return record
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from flask import current_app
+from jwt.exceptions import InvalidTokenError
+
+from app import jwt as jwt_manager
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'EdDSA')
+
+
+class UnknownKey(InvalidTokenError):
+    """No key with the token's ``kid``; handled like any invalid token."""
+
+
+class KeyRing(object):
+    """Keys for signing and verifying JWTs.
+
+    With HS256 this is just ``JWT_SECRET_KEY``. With RS256 or EdDSA it holds
+    one or more key pairs by ``kid``: tokens are signed with the active one
+    and verified with whichever their ``kid`` header names, so retired keys
+    keep verifying tokens issued before a rotation. Keys are parsed once and
+    kept as key objects, which PyJWT uses without parsing them again.
+    """
+
+    def __init__(self, algorithm, secret=None, private_keys=None, public_keys=None, active_kid=None):
+        self.algorithm = algorithm
+        self.secret = secret
+        self.private_keys = dict(private_keys or {})
+        self.public_keys = {kid: key.public_key() for kid, key in self.private_keys.items()}
+        self.public_keys.update(public_keys or {})
+        if self.asymmetric:
+            if not self.private_keys:
+                raise ValueError('%s needs at least one private key' % algorithm)
+            self.active_kid = active_kid or max(self.private_keys)
+            if self.active_kid not in self.private_keys:
+                raise ValueError('No private key with kid %r' % self.active_kid)
+        else:
+            self.active_kid = None
+        self._jwks = None
+
+    @property
+    def asymmetric(self):
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    @property
+    def signing_key(self):
+        if self.asymmetric:
+            return self.private_keys[self.active_kid]
+        return self.secret
+
+    def verification_key(self, kid=None):
+        if not self.asymmetric:
+            return self.secret
+        try:
+            return self.public_keys[kid]
+        except KeyError:
+            raise UnknownKey('Unknown key id %r' % kid)
+
+    def jwks(self):
+        """The public keys as a JWK Set document, serialized once, and its ETag."""
+        if self._jwks is None:
+            keys = []
+            if self.asymmetric:
+                from jwt.algorithms import get_default_algorithms
+                algorithm = get_default_algorithms()[self.algorithm]
+                for kid, key in sorted(self.public_keys.items()):
+                    jwk = json.loads(algorithm.to_jwk(key))
+                    jwk.update(kid=kid, alg=self.algorithm, use='sig')
+                    keys.append(jwk)
+            body = json.dumps({'keys': keys}, sort_keys=True, separators=(',', ':')).encode()
+            self._jwks = (body, hashlib.sha256(body).hexdigest()[:32])
+        return self._jwks
+
+    @classmethod
+    def from_config(cls, config):
+        algorithm = config.get('JWT_ALGORITHM', 'HS256')
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            return cls(algorithm, secret=config['JWT_SECRET_KEY'])
+        private_keys, public_keys = load_key_directory(config['JWT_KEYS_DIR'])
+        return cls(algorithm, private_keys=private_keys, public_keys=public_keys,
+                   active_kid=config.get('JWT_ACTIVE_KEY_ID'))
+
+
+def new_kid():
+    return datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+
+
+def generate_private_key(algorithm):
+    if algorithm == 'RS256':
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == 'EdDSA':
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError('%s does not use key pairs' % algorithm)
+
+
+def private_key_pem(key):
+    from cryptography.hazmat.primitives import serialization
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+def load_key_directory(path):
+    """Read ``<kid>.pem`` private keys and ``<kid>.pub.pem`` public keys.
+
+    Keeping only the public half of a retired key still verifies the tokens
+    it signed.
+    """
+    from cryptography.hazmat.primitives import serialization
+
+    private_keys, public_keys = {}, {}
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.pem'):
+            continue
+        with open(os.path.join(path, name), 'rb') as key_file:
+            data = key_file.read()
+        if name.endswith('.pub.pem'):
+            public_keys[name[:-len('.pub.pem')]] = serialization.load_pem_public_key(data)
+        else:
+            private_keys[name[:-len('.pem')]] = serialization.load_pem_private_key(data, password=None)
+    return private_keys, public_keys
+
+
+def get_key_ring():
+    return current_app.extensions['jwt_keys']
+
+
+def init_key_ring(app):
+    ring = KeyRing.from_config(app.config)
+    app.extensions['jwt_keys'] = ring
+    return ring
+
+
+@jwt_manager.encode_key_loader
+def _encode_key(identity):
+    return get_key_ring().signing_key
+
+
+@jwt_manager.additional_headers_loader
+def _kid_header(identity):
+    ring = get_key_ring()
+    return {'kid': ring.active_kid} if ring.active_kid else {}
+
+
+@jwt_manager.decode_key_loader
+def _decode_key(jwt_header, jwt_data):
+    return get_key_ring().verification_key(jwt_header.get('kid'))
@@ -1,9 +1,34 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.orm import validates
 import re
 
+from sqlalchemy.orm import validates
+
+from app.auth.hashing import get_password_hasher
+from app.auth.schemas import EMAIL, FIRSTNAME, LASTNAME, PASSWORD, PHONE, USERNAME
 from app.database.context import db
 
+
+def _checked(field, value):
+    error = field.validate(value)
+    if error is not None:
+        raise AssertionError(error)
+    return value
+
+
+# Lookups compare these canonical keys instead of the values as entered, so
+# ``Foo@X.com`` finds ``foo@x.com`` through the unique index.
+def canonical_username(username):
+    return username.casefold()
+
+
+def canonical_email(email):
+    return email.lower()
+
+
+def canonical_phone(phone):
+    """E.164: ``+91-7737713067`` becomes ``+917737713067``."""
+    return '+' + re.sub(r'[^0-9]', '', phone)
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(32), unique=True, nullable=False)
@@ -15,80 +40,94 @@ class User(db.Model):
     email_verified = db.Column(db.Boolean, default=False)
     phone_verified = db.Column(db.Boolean, default=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # Set along with the columns above. NULL only for rows created before
+    # they existed, until ``flask users backfill-keys`` has filled them.
+    username_key = db.Column(db.String(96))
+    email_key = db.Column(db.String(64))
+    phone_key = db.Column(db.String(20))
+
+    # Keyset pagination for the admin listing: every filter combination
+    # seeks into an index already ordered by id.
+    __table_args__ = (
+        db.Index('ix_user_email_verified_id', 'email_verified', 'id'),
+        db.Index('ix_user_phone_verified_id', 'phone_verified', 'id'),
+        db.Index('ix_user_verified_id', 'email_verified', 'phone_verified', 'id'),
+        db.Index('uq_user_username_key', 'username_key', unique=True),
+        db.Index('uq_user_email_key', 'email_key', unique=True),
+        db.Index('uq_user_phone_key', 'phone_key', unique=True),
+    )
 
     @validates('username')
     def validate_username(self, key, username):
-        if not username:
-            raise AssertionError('No username provided')
-
-        if User.query.filter(User.username == username).first():
-            raise AssertionError('Username is already in use')
-
-        if len(username) < 5 or len(username) > 32:
-            raise AssertionError('Username must be between 5 and 32 characters')
-
+        username = _checked(USERNAME, username)
+        self.username_key = canonical_username(username)
         return username
-    
+
     @validates('password')
     def validate_password(self, key, password):
-        if not password:
-            raise AssertionError('No password provided')
+        return get_password_hasher().hash(User.check_password_policy(password))
 
-        if len(password) < 8:
-            raise AssertionError('Password must be at least 8 characters')
+    @staticmethod
+    def check_password_policy(password):
+        return _checked(PASSWORD, password)
 
-        return generate_password_hash(password)
-    
     @validates('firstname')
     def validate_firstname(self, key, firstname):
-        if not firstname:
-            raise AssertionError('No firstname provided')
-
-        if len(firstname) < 2 or len(firstname) > 32:
-            raise AssertionError('Firstname must be between 2 and 32 characters')
+        return _checked(FIRSTNAME, firstname)
 
-        return firstname
-    
     @validates('lastname')
     def validate_lastname(self, key, lastname):
-        if not lastname:
-            raise AssertionError('No lastname provided')
-
-        if len(lastname) < 2 or len(lastname) > 32:
-            raise AssertionError('Lastname must be between 2 and 32 characters')
+        return _checked(LASTNAME, lastname)
 
-        return lastname
-    
     @validates('email')
     def validate_email(self, key, email):
-        if not email:
-            raise AssertionError('No email provided')
-
-        if User.query.filter(User.email == email).first():
-            raise AssertionError('Email is already in use')
-        
-        EMAIL_REGEX = r'^[\w+\-.]+@[a-z\d\-]+(\.[a-z]+)*\.[a-z]+$'
-        if not re.match(EMAIL_REGEX, email):
-            raise AssertionError('Invalid email address, must be in the format [email]@[domain]')
-        
+        email = _checked(EMAIL, email)
+        self.email_key = canonical_email(email)
         return email
-    
+
     @validates('phone')
     def validate_phone(self, key, phone):
-        if not phone:
-            raise AssertionError('No phone provided')
-
-        if User.query.filter(User.phone == phone).first():
-            raise AssertionError('Phone is already in use')
-        
-        PHONE_REGEX = r'^\+[1-9]{1,3}-\d{1,14}$'
-        if not re.match(PHONE_REGEX, phone):
-            raise AssertionError('Invalid phone number, must be in the format +[country code]-[number]')
-
+        phone = _checked(PHONE, phone)
+        self.phone_key = canonical_phone(phone)
         return phone
 
+    @staticmethod
+    def lookup_keys(username, email, phone):
+        """The key columns for bulk inserts, which skip the validators."""
+        return {
+            'username_key': canonical_username(username),
+            'email_key': canonical_email(email),
+            'phone_key': canonical_phone(phone),
+        }
+
+    @staticmethod
+    def select_taken(username, email, phone):
+        keys = User.lookup_keys(username, email, phone)
+        return db.select(User.username_key, User.email_key, User.phone_key).where(db.or_(
+            User.username_key == keys['username_key'], User.email_key == keys['email_key'],
+            User.phone_key == keys['phone_key']))
+
+    @staticmethod
+    def uniqueness_error(username, email, phone, taken=None):
+        """Return the error for the first of username, email and phone that is
+        already taken, checked with a single query, or None.
+
+        ``taken`` are rows of ``select_taken`` the caller already fetched.
+        """
+        if taken is None:
+            taken = db.session.execute(User.select_taken(username, email, phone)).all()
+
+        keys = User.lookup_keys(username, email, phone)
+        if any(row.username_key == keys['username_key'] for row in taken):
+            return 'Username is already in use'
+        if any(row.email_key == keys['email_key'] for row in taken):
+            return 'Email is already in use'
+        if any(row.phone_key == keys['phone_key'] for row in taken):
+            return 'Phone is already in use'
+        return None
+
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password, password)
     
     def save(self):
         db.session.add(self)
@@ -100,4 +139,18 @@ class User(db.Model):
 
     def __repr__(self):
         return '<User %r>' % self.username
-    
\ No newline at end of file
+
+
+class RevokedToken(db.Model):
+    """A revoked token (``jti``), or every token issued to ``subject`` before
+    ``revoked_at``. Rows are useless once ``expires_at`` has passed."""
+    __tablename__ = 'revoked_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36))
+    subject = db.Column(db.String(254))
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<RevokedToken %r>' % (self.jti or self.subject)
@@ -0,0 +1,169 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super(RateLimited, self).__init__('Too many requests')
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def _check(previous, current, elapsed, limit, window):
+    """Sliding-window estimate from the current and previous fixed window.
+
+    Returns the seconds to wait, or 0 if one more hit is allowed.
+    """
+    weight = 1 - elapsed / window
+    if previous * weight + current < limit:
+        return 0
+    if current >= limit or previous == 0:
+        return window - elapsed
+    # The previous window's share decays linearly over the current one.
+    needed = (previous * weight + current - limit + 1) / previous * window
+    return min(needed, window - elapsed)
+
+
+class MemoryStore(object):
+    """Per-process counters, one ``[window, current, previous]`` list per key.
+
+    Keys are kept in LRU order and the coldest ones are evicted beyond
+    ``maxsize``, so memory stays bounded under a spray of usernames or IPs.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [index, 0, 0]
+                if len(self._counters) > self.maxsize:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+                if counter[0] != index:
+                    counter[2] = counter[1] if counter[0] == index - 1 else 0
+                    counter[1] = 0
+                    counter[0] = index
+
+            wait = _check(counter[2], counter[1], elapsed, limit, window)
+            if not wait:
+                counter[1] += 1
+            return wait
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class SQLiteStore(object):
+    """Counters in a SQLite file shared by every worker process on the host."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_window ('
+                ' key TEXT NOT NULL, start INTEGER NOT NULL, length INTEGER NOT NULL, count INTEGER NOT NULL,'
+                ' PRIMARY KEY (key, start)) WITHOUT ROWID')
+
+    def hit(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        start = int(index) * window
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(connection.execute(
+                'SELECT start, count FROM rate_limit_window WHERE key = ? AND start IN (?, ?)',
+                (key, start, start - window)))
+            wait = _check(counts.get(start - window, 0), counts.get(start, 0), elapsed, limit, window)
+            if not wait:
+                connection.execute(
+                    'INSERT INTO rate_limit_window (key, start, length, count) VALUES (?, ?, ?, 1)'
+                    ' ON CONFLICT (key, start) DO UPDATE SET count = count + 1',
+                    (key, start, window))
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                # Rules have windows of different lengths; a row is needed
+                # until the window after its own has ended.
+                connection.execute('DELETE FROM rate_limit_window WHERE start + 2 * length <= ?', (now,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self):
+        import sqlite3
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+
+
+class AuthAdmission(object):
+    """Rate limits and the in-flight cap for password verification."""
+
+    def __init__(self, store, per_ip, per_username, max_verifications):
+        self.store = store
+        self.per_ip = per_ip
+        self.per_username = per_username
+        self._verifications = threading.BoundedSemaphore(max_verifications)
+
+    def limit_ip(self, ip):
+        self._hit('ip:%s' % ip, self.per_ip)
+
+    def limit_username(self, username):
+        self._hit('user:%s' % username.lower(), self.per_username)
+
+    @contextmanager
+    def verification_slot(self):
+        if not self._verifications.acquire(blocking=False):
+            raise RateLimited(1)
+        try:
+            yield
+        finally:
+            self._verifications.release()
+
+    def _hit(self, key, rule):
+        limit, window = rule
+        wait = self.store.hit(key, limit, window, time.time())
+        if wait:
+            raise RateLimited(wait)
+
+
+def init_auth_admission(app):
+    admission = None
+    if app.config.get('RATELIMIT_ENABLED', True):
+        storage = app.config.get('RATELIMIT_STORAGE_PATH')
+        store = SQLiteStore(storage) if storage else MemoryStore(app.config.get('RATELIMIT_MAX_KEYS', 100000))
+        admission = AuthAdmission(
+            store,
+            app.config.get('RATELIMIT_AUTH_PER_IP', (60, 60)),
+            app.config.get('RATELIMIT_LOGIN_PER_USERNAME', (10, 300)),
+            app.config.get('LOGIN_MAX_CONCURRENT_VERIFICATIONS', 8),
+        )
+    app.extensions['auth_admission'] = admission
+    return admission
+
+
+def get_auth_admission():
+    return current_app.extensions.get('auth_admission')
@@ -0,0 +1,168 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.auth.models import RevokedToken
+from app.database.context import db
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(moment):
+    return (moment - _EPOCH).total_seconds()
+
+
+def _datetime(timestamp):
+    return _EPOCH + timedelta(seconds=timestamp)
+
+
+def _seconds(value):
+    return value.total_seconds() if isinstance(value, timedelta) else value
+
+
+class TokenRevocations(object):
+    """The ``revoked_token`` table mirrored into memory.
+
+    ``is_revoked`` is two dict lookups and never touches the database. A
+    background thread per process loads the unexpired rows once, then every
+    ``interval`` seconds reads only rows revoked since its last read (less
+    ``lookback`` seconds, to catch transactions that committed late and
+    clock skew between hosts). Entries leave memory when the tokens they
+    cover expire, and expired rows are purged every ``purge_interval``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('JWT_REVOCATION_REFRESH_INTERVAL', 5)
+        self.lookback = app.config.get('JWT_REVOCATION_REFRESH_LOOKBACK', 30)
+        self.purge_interval = app.config.get('JWT_REVOCATION_PURGE_INTERVAL', 300)
+        self.lifetime = max(_seconds(app.config['JWT_ACCESS_TOKEN_EXPIRES']),
+                            app.config.get('JWT_REGISTRATION_TOKEN_EXPIRES', 3600))
+        self._jtis = {}
+        self._subjects = {}
+        self._expiries = []
+        self._lock = threading.Lock()
+        self._refreshed_at = None
+        self._purged_at = 0.0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def is_revoked(self, claims):
+        now = time.time()
+        expires = self._jtis.get(claims.get('jti'))
+        if expires is not None and expires > now:
+            return True
+        entry = self._subjects.get(str(claims.get('sub')))
+        # Both are whole seconds, so a token issued in the second of the
+        # revocation is revoked with the rest.
+        return entry is not None and entry[1] > now and claims.get('iat', 0) <= entry[0]
+
+    def revoke_token(self, jti, expires=None):
+        """Revoke one token until ``expires``, its ``exp`` claim."""
+        now = time.time()
+        expires = expires or now + self.lifetime
+        db.session.add(RevokedToken(jti=jti, revoked_at=_datetime(now), expires_at=_datetime(expires)))
+        db.session.commit()
+        with self._lock:
+            self._add_jti(jti, expires)
+
+    def revoke_subjects(self, subjects):
+        """Revoke every token issued so far to any of ``subjects``."""
+        # ``iat`` is in whole seconds, and so is a MySQL DATETIME.
+        now = int(time.time())
+        expires = now + self.lifetime
+        for subject in subjects:
+            db.session.add(RevokedToken(subject=str(subject), revoked_at=_datetime(now), expires_at=_datetime(expires)))
+        db.session.commit()
+        with self._lock:
+            for subject in subjects:
+                self._add_subject(str(subject), now, expires)
+
+    def refresh(self):
+        """Read new revocations from the table. Needs an app context."""
+        started = datetime.utcnow()
+        query = db.select(RevokedToken.jti, RevokedToken.subject, RevokedToken.revoked_at, RevokedToken.expires_at) \
+            .where(RevokedToken.expires_at > started)
+        if self._refreshed_at is not None:
+            query = query.where(RevokedToken.revoked_at >= self._refreshed_at - timedelta(seconds=self.lookback))
+        with db.engine.connect() as connection:
+            rows = connection.execute(query).all()
+
+        with self._lock:
+            for row in rows:
+                if row.jti is not None:
+                    self._add_jti(row.jti, _timestamp(row.expires_at))
+                else:
+                    self._add_subject(row.subject, int(_timestamp(row.revoked_at)), _timestamp(row.expires_at))
+            self._prune(time.time())
+        self._refreshed_at = started
+
+        if time.monotonic() - self._purged_at >= self.purge_interval:
+            self._purged_at = time.monotonic()
+            with db.engine.begin() as connection:
+                connection.execute(RevokedToken.__table__.delete().where(RevokedToken.expires_at <= started))
+        return len(rows)
+
+    def __len__(self):
+        return len(self._jtis) + len(self._subjects)
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='token-revocations', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _add_jti(self, jti, expires):
+        if self._jtis.get(jti, 0) < expires:
+            self._jtis[jti] = expires
+            heapq.heappush(self._expiries, (expires, 'jti', jti))
+
+    def _add_subject(self, subject, revoked_before, expires):
+        current = self._subjects.get(subject)
+        if current is None or current[0] < revoked_before:
+            self._subjects[subject] = (revoked_before, max(expires, current[1] if current else 0))
+            heapq.heappush(self._expiries, (self._subjects[subject][1], 'subject', subject))
+
+    def _prune(self, now):
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, kind, key = heapq.heappop(self._expiries)
+            entries = self._jtis if kind == 'jti' else self._subjects
+            entry = entries.get(key)
+            # Skip heap items superseded by a later revocation of the same key.
+            if entry is not None and (entry if kind == 'jti' else entry[1]) <= now:
+                del entries[key]
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception:
+                self.app.logger.exception('Refreshing token revocations failed')
+            self._stopping.wait(self.interval)
+
+
+def init_token_revocations(app):
+    if not app.config.get('JWT_REVOCATION_ENABLED', True):
+        return None
+    revocations = TokenRevocations(app)
+    app.extensions['token_revocations'] = revocations
+    return revocations
+
+
+def get_token_revocations():
+    return current_app.extensions.get('token_revocations')
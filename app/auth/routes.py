@@ -1,25 +1,61 @@
+import csv
+import io
+
 from flask import jsonify, request, current_app as app
 
-from flask import Blueprint
+from flask import Blueprint, Response, stream_with_context
+from flask_jwt_extended import get_jwt, jwt_required
+from sqlalchemy.exc import IntegrityError
 
+from app.auth.cache import load_user_by_id
+from app.auth.keys import get_key_ring
 from app.auth.models import User
-from app.auth.utils import authenticate, create_token, verify_token
+from app.auth.schemas import login_schema, register_schema
+from app.auth.ratelimit import RateLimited, get_auth_admission
+from app.auth.revocation import get_token_revocations
+from app.database.context import db, read_replica
+from app.idempotency import idempotent
+from app.auth.utils import (LISTED_COLUMNS, HashingUnavailable, admin_required, authenticate, create_token,
+                            mark_email_verified, select_users, verify_token)
 from app.mailman.utils import send_email
+from app.validation import validate_json
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
+well_known_bp = Blueprint('well_known', __name__, url_prefix='/.well-known')
 
 
+@auth_bp.errorhandler(HashingUnavailable)
+def hashing_unavailable(error):
+    db.session.rollback()
+    return jsonify({'msg': 'Service busy, try again later'}), 503, {'Retry-After': '1'}
 
 
-@auth_bp.route('/login', methods=['POST'])
-def login():
-    username = request['username']
-    password = request['password']
+@auth_bp.errorhandler(RateLimited)
+def rate_limited(error):
+    return jsonify({'msg': 'Too many requests, try again later'}), 429, {'Retry-After': str(error.retry_after)}
+
 
-    if not username or not password:
-        return jsonify({'msg': 'Missing username or password'}), 400
+@auth_bp.before_request
+def limit_client():
+    admission = get_auth_admission()
+    if admission:
+        admission.limit_ip(request.remote_addr)
 
-    user = authenticate(username, password)
+
+@auth_bp.route('/login', methods=['POST'])
+@validate_json(login_schema)
+def login(data):
+    username = data['username']
+    password = data['password']
+
+    # Throttle before any hashing work starts.
+    admission = get_auth_admission()
+    if admission:
+        admission.limit_username(username)
+        with admission.verification_slot():
+            user = authenticate(username, password)
+    else:
+        user = authenticate(username, password)
 
     if not user:
         return jsonify({'msg': 'Invalid username or password'}), 401
@@ -28,24 +64,38 @@ def login():
 
     return jsonify({'access_token': token}), 200
 
-@auth_bp.route('/register', methods=['POST'])
-def register():
-    firstname = request.json.get('firstname')
-    lastname = request.json.get('lastname')
-    email = request.json.get('email')
-    phone = request.json.get('phone')
-    username = request.json.get('username')
-    password = request.json.get('password')
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    claims = get_jwt()
+    revocations = get_token_revocations()
+    if revocations is not None:
+        revocations.revoke_token(claims['jti'], claims.get('exp'))
+    return jsonify({'msg': 'Logged out'}), 200
 
+@auth_bp.route('/register', methods=['POST'])
+@validate_json(register_schema)
+@idempotent()
+def register(data):
+    username = data['username']
+    email = data['email']
+    phone = data['phone']
+
+    # The payload is already valid, so the model validators only re-check it.
+    user = User(**data)
+
+    # Uniqueness is enforced by the unique constraints; only a rejected
+    # insert pays for the lookup that tells which field was taken.
+    db.session.add(user)
     try:
-        user  = User(username=username, firstname=firstname, lastname=lastname, email=email, phone=phone, password=password)
-    except AssertionError as exception_message:
-        return jsonify(msg=str(exception_message)), 400
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(msg=User.uniqueness_error(username, email, phone) or 'User already exists'), 400
 
-    token = create_token(user, for_registration=True, expires_delta=3600)
+    token = create_token(user, for_registration=True, expires_delta=app.config['JWT_REGISTRATION_TOKEN_EXPIRES'])
     confirm_url = "{frontend_url}/confirm/email?token={token}".format(frontend_url=app.config['FRONTEND_URL'], token=token)
-    if send_email(email, 'Confirm your email', 'confirm_email.html', confirm_url=confirm_url):
-        user.save()
+    if send_email(email, 'Confirm your email', 'confirm_email.html', {'confirm_url': confirm_url}):
         return jsonify({'msg': 'Verification email sent'}), 201
     else:
         return jsonify({'msg': 'Error in sending verification email'}), 500
@@ -58,8 +108,104 @@ def confirm_email():
     if not user:
         return jsonify({'msg': 'Invalid token'}), 401
 
-    user.email_verified = True
-    user.save()
+    mark_email_verified(user.id)
 
     return jsonify({'msg': 'Email confirmed'}), 200
-    
\ No newline at end of file
+    
+
+
+@auth_bp.route('/users/<int:user_id>/revoke-tokens', methods=['POST'])
+@admin_required
+def revoke_user_tokens(user_id):
+    user = load_user_by_id(user_id)
+    if not user:
+        return jsonify({'msg': 'User does not exist'}), 404
+
+    revocations = get_token_revocations()
+    if revocations is None:
+        return jsonify({'msg': 'Token revocation is disabled'}), 501
+    # Login tokens carry the user id, registration tokens the email.
+    revocations.revoke_subjects([user.id, user.email])
+    return jsonify({'msg': 'Tokens revoked'}), 200
+
+
+def _flag(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError('%s must be true or false' % name)
+
+
+def _user_filters():
+    return {'email_verified': _flag('email_verified'), 'phone_verified': _flag('phone_verified')}
+
+
+@auth_bp.route('/users', methods=['GET'])
+@admin_required
+def list_users():
+    try:
+        filters = _user_filters()
+        after_id = request.args.get('after', type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), app.config['ADMIN_USERS_PAGE_MAX'])
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+
+    # Keyset pagination: seek past the last id instead of counting an OFFSET.
+    with read_replica() as session:
+        rows = session.execute(select_users(after_id, **filters).limit(limit + 1)).all()
+    users = [row._asdict() for row in rows[:limit]]
+    next_after = users[-1]['id'] if len(rows) > limit else None
+    return jsonify({'users': users, 'next_after': next_after}), 200
+
+
+@auth_bp.route('/users/export', methods=['GET'])
+@admin_required
+def export_users():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'msg': 'format must be ndjson or csv'}), 400
+    try:
+        filters = _user_filters()
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+    batch_size = app.config['ADMIN_USERS_EXPORT_BATCH_SIZE']
+    dumps = app.json.dumps
+
+    def generate():
+        # yield_per streams from a server-side cursor one batch at a time.
+        with read_replica() as session:
+            result = session.execute(select_users(**filters).execution_options(yield_per=batch_size))
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(LISTED_COLUMNS)
+                for rows in result.partitions():
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for rows in result.partitions():
+                    yield ''.join(dumps(row._asdict()) + '\n' for row in rows)
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = 'users.csv' if export_format == 'csv' else 'users.ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+
+@well_known_bp.route('/jwks.json', methods=['GET'])
+def jwks():
+    """Public keys for verifying our tokens without calling back into this app."""
+    body, etag = get_key_ring().jwks()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['JWT_JWKS_MAX_AGE']
+    return response.make_conditional(request)
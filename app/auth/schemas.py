@@ -0,0 +1,25 @@
+from app.validation import Schema, String
+
+# Field rules shared by the request schemas and the User model validators.
+USERNAME = String(min_length=5, max_length=32, length_message='Username must be between 5 and 32 characters')
+PASSWORD = String(min_length=8, length_message='Password must be at least 8 characters')
+FIRSTNAME = String(min_length=2, max_length=32, length_message='Firstname must be between 2 and 32 characters')
+LASTNAME = String(min_length=2, max_length=32, length_message='Lastname must be between 2 and 32 characters')
+EMAIL = String(pattern=r'^[\w+\-.]+@[a-z\d\-]+(\.[a-z]+)*\.[a-z]+$',
+               pattern_message='Invalid email address, must be in the format [email]@[domain]')
+PHONE = String(pattern=r'^\+[1-9]{1,3}-\d{1,14}$',
+               pattern_message='Invalid phone number, must be in the format +[country code]-[number]')
+
+register_schema = Schema(
+    username=USERNAME,
+    firstname=FIRSTNAME,
+    lastname=LASTNAME,
+    email=EMAIL,
+    phone=PHONE,
+    password=PASSWORD,
+)
+
+login_schema = Schema(
+    username=String(missing='Missing username or password'),
+    password=String(missing='Missing username or password'),
+)
@@ -1,29 +1,103 @@
-from flask_jwt_extended import create_access_token
-from flask import current_app as app
+from flask_jwt_extended import create_access_token, current_user, jwt_required
+from flask import jsonify
 import jwt
 from datetime import timedelta
+from functools import wraps
 
-from app.auth.models import User
+from app import jwt as jwt_manager
+from app.auth.cache import invalidate_user, load_user_by_email, load_user_by_id, query_user_record, users
+from app.auth.hashing import HashingUnavailable, get_password_hasher
+from app.auth.keys import get_key_ring
+from app.auth.models import User, canonical_username
+from app.auth.revocation import get_token_revocations
+from app.database.context import db, from_replica
 
 def authenticate(username, password):
-    user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
+    hasher = get_password_hasher()
+    user = from_replica(lambda: query_user_record(users.c.username_key == canonical_username(username)))
+    if user and hasher.verify(user.password, password):
+        if hasher.needs_rehash(user.password):
+            # Upgrade hashes made with outdated parameters while we still
+            # have the plaintext.
+            update_user(user.id, password=hasher.hash(password))
         return user
 
-def create_token(user, for_registration, expires_delta=False):
+def update_user(user_id, *where, **values):
+    """Set ``values`` on a user with one UPDATE, if it matches ``where``;
+    returns whether a row changed."""
+    changed = db.session.execute(users.update().where(users.c.id == user_id, *where).values(**values)).rowcount
+    db.session.commit()
+    if changed:
+        invalidate_user(user_id=user_id)
+    return bool(changed)
+
+def mark_email_verified(user_id):
+    # A no-op, and no cache invalidation, for an already confirmed email.
+    return update_user(user_id, users.c.email_verified.is_not(True), email_verified=True)
+
+# Registration tokens carry the email and only confirm it; they never
+# authenticate a request.
+CONFIRM_EMAIL = 'confirm_email'
+
+def create_token(user, for_registration=False, expires_delta=False):
     if for_registration:
-        token = create_access_token(identity=user.email, expires_delta=timedelta(seconds=expires_delta))
+        token = create_access_token(identity=user.email, expires_delta=timedelta(seconds=expires_delta),
+                                    additional_claims={'purpose': CONFIRM_EMAIL})
     else:
         token = create_access_token(identity=user.id)
     return token
 
+def verified_claims(token):
+    """The claims of ``token``, or None if it has been revoked. Raises
+    ``jwt.InvalidTokenError`` for a bad signature or an expired token."""
+    keys = get_key_ring()
+    claims = jwt.decode(token, keys.verification_key(jwt.get_unverified_header(token).get('kid')),
+                        algorithms=[keys.algorithm])
+    if is_token_revoked(None, claims):
+        return None
+    return claims
+
 def verify_token(token):
     try:
-        email = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])['sub']
-        user = User.query.filter_by(email=email).first()
-        return user
+        claims = verified_claims(token)
+        if claims and claims.get('purpose') == CONFIRM_EMAIL:
+            return load_user_by_email(claims['sub'])
     except Exception as e:
         return None
 
-    
+def admin_required(view):
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not current_user or not current_user.is_admin:
+            return jsonify({'msg': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# Everything an admin listing shows; never the password hash.
+LISTED_COLUMNS = ('id', 'username', 'firstname', 'lastname', 'email', 'phone', 'email_verified', 'phone_verified', 'is_admin')
+
+def select_users(after_id=None, email_verified=None, phone_verified=None):
+    """Listed columns of the users matching the filters, in id order."""
+    query = db.select(*[getattr(User, column) for column in LISTED_COLUMNS]).order_by(User.id)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    if email_verified is not None:
+        query = query.where(User.email_verified == email_verified)
+    if phone_verified is not None:
+        query = query.where(User.phone_verified == phone_verified)
+    return query
+
+@jwt_manager.token_in_blocklist_loader
+def is_token_revoked(_jwt_header, jwt_data):
+    revocations = get_token_revocations()
+    return revocations is not None and revocations.is_revoked(jwt_data)
+
+@jwt_manager.user_lookup_loader
+def load_jwt_user(_jwt_header, jwt_data):
+    # Only login tokens, which carry the user id, load a user.
+    identity = jwt_data['sub']
+    if 'purpose' in jwt_data or not isinstance(identity, int):
+        return None
+    return load_user_by_id(identity)
 
@@ -0,0 +1,103 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class GzipCompressor(object):
+    encoding = 'gzip'
+
+    def __init__(self, config):
+        # wbits=31 writes the gzip header and trailer.
+        self._zlib = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._zlib.compress(data)
+
+    def flush(self):
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._zlib.flush()
+
+
+class BrotliCompressor(object):
+    encoding = 'br'
+
+    def __init__(self, config):
+        self._brotli = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+
+    def compress(self, data):
+        return self._brotli.process(data)
+
+    def flush(self):
+        return self._brotli.flush()
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+def compressors():
+    """Supported encodings, preferred first when the client ranks them equally."""
+    found = {'gzip': GzipCompressor}
+    if brotli is not None:
+        found['br'] = BrotliCompressor
+    return {encoding: found[encoding] for encoding in current_app.config['COMPRESS_ALGORITHMS'] if encoding in found}
+
+
+def compress_response(response):
+    """Encode the body with the best encoding the client accepts.
+
+    Bodies under ``COMPRESS_MIN_SIZE`` are left alone. Streamed bodies are
+    compressed chunk by chunk, flushing after each one so clients still
+    receive rows as they are produced.
+    """
+    config = current_app.config
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    available = compressors()
+    encoding = request.accept_encodings.best_match(list(available))
+    if encoding is None:
+        return response
+
+    compressor = available[encoding](config)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, compressor, response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _compress_stream(chunks, compressor, charset):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Close the wrapped stream so stream_with_context tears down its context.
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_compression(app):
+    if app.config.get('COMPRESS_ENABLED'):
+        app.after_request(compress_response)
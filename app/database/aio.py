@@ -0,0 +1,83 @@
+import os
+
+from flask import current_app
+
+from app.database.context import REPLICA_BIND, db
+
+# Async drivers for the sync ones in the configured database URLs.
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_url(url):
+    """``url`` with its driver swapped for the asyncio one."""
+    backend = url.get_backend_name()
+    if url.get_driver_name() in ('aiosqlite', 'aiomysql', 'asyncmy'):
+        return url
+    try:
+        return url.set(drivername=ASYNC_DRIVERS[backend])
+    except KeyError:
+        raise ValueError('No asyncio driver configured for %s' % backend)
+
+
+class AsyncDatabase(object):
+    """SQLAlchemy asyncio engines over the same databases as ``db``.
+
+    The URLs and engine options are taken from the sync engines, so
+    relative SQLite paths resolve the same way. Engines are created on
+    first use in each process, inside the event loop that serves it; an
+    in-memory SQLite database is never shared with the sync engine.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        self.options.update(app.config.get('SQLALCHEMY_ASYNC_ENGINE_OPTIONS') or {})
+        self._engines = {}
+        self._pid = None
+
+    def engine(self, bind=None):
+        if self._pid != os.getpid():
+            # Engines inherited through fork are bound to the master's loop.
+            self._engines, self._pid = {}, os.getpid()
+        engine = self._engines.get(bind)
+        if engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            with self.app.app_context():
+                url = async_url(db.engines[bind].url)
+            engine = self._engines[bind] = create_async_engine(url, **self.options)
+        return engine
+
+    @property
+    def has_replica(self):
+        return REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {})
+
+    async def dispose(self):
+        engines, self._engines = self._engines, {}
+        for engine in engines.values():
+            await engine.dispose()
+
+
+def init_async_database(app):
+    database = AsyncDatabase(app)
+    app.extensions['async_db'] = database
+    return database
+
+
+def get_async_database():
+    return current_app.extensions['async_db']
+
+
+async def from_replica_async(load):
+    """Await ``load(connection)`` on the replica, then on the primary if it
+    found nothing; the async counterpart of ``from_replica``."""
+    database = get_async_database()
+    if database.has_replica:
+        async with database.engine(REPLICA_BIND).connect() as connection:
+            result = await load(connection)
+        if result is not None:
+            return result
+    async with database.engine().connect() as connection:
+        return await load(connection)
@@ -1,3 +1,53 @@
+from contextlib import contextmanager
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Sends SELECTs issued inside ``read_replica()`` to the ``replica`` bind.
+
+    Anything else, including every flush, goes to the primary, so objects
+    loaded from the replica can still be modified and saved.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('read_replica') and not self._flushing
+                and getattr(clause, 'is_select', False)):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def has_replica():
+    return REPLICA_BIND in db.engines
+
+
+@contextmanager
+def read_replica():
+    session = db.session()
+    previous = session.info.get('read_replica', False)
+    session.info['read_replica'] = True
+    try:
+        yield session
+    finally:
+        session.info['read_replica'] = previous
+
+
+def from_replica(load):
+    """Call ``load`` on the replica, then on the primary if it found nothing.
 
-db = SQLAlchemy()
\ No newline at end of file
+    A row written moments ago may not have replicated yet, e.g. a user
+    confirming their email straight after registering.
+    """
+    with read_replica():
+        result = load()
+    if result is None and has_replica():
+        result = load()
+    return result
@@ -0,0 +1,252 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from app.database.context import db
+
+_serializer = TaggedJSONSerializer()
+
+
+class ServerSession(db.Model):
+    __tablename__ = 'sessions'
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expiry = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<ServerSession %r>' % self.id
+
+
+def dump_session(data):
+    """Compact, key-sorted JSON with Flask's tags for tuples, bytes, dates
+    and the like, so equal sessions serialize to equal bytes."""
+    return current_app.json.dumps(_serializer.tag(dict(data))).encode('utf-8')
+
+
+def load_session(payload):
+    return _serializer.loads(payload)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, stored=None, expiry=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.stored = stored
+        self.expiry = expiry
+        self.modified = False
+        self.accessed = False
+
+
+class SessionCache(object):
+    """Per-process LRU of serialized sessions keyed by session id.
+
+    Entries are written through on every save and kept for at most ``ttl``
+    seconds, which bounds how stale a session changed by another process
+    can be.
+    """
+
+    def __init__(self, maxsize=4096, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(sid)
+                self.hits += 1
+                return entry[0], entry[1]
+            if entry is not None:
+                del self._entries[sid]
+            self.misses += 1
+            return None
+
+    def put(self, sid, payload, expiry):
+        with self._lock:
+            self._entries.pop(sid, None)
+            self._entries[sid] = (payload, expiry, time.monotonic() + self.ttl)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class SQLAlchemySessionInterface(SessionInterface):
+    """Sessions stored in the ``sessions`` table behind a ``SessionCache``.
+
+    The cookie holds only a random session id. A session is written when its
+    serialized payload differs from the stored one, or when a permanent
+    session's expiry would move by more than ``refresh_threshold`` seconds;
+    other requests issue no SQL for hot sessions.
+    """
+
+    def __init__(self, cache, refresh_threshold=300):
+        self.cache = cache
+        self.refresh_threshold = refresh_threshold
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            record = self._load(sid)
+            if record is not None:
+                payload, expiry = record
+                return ServerSideSession(load_session(payload), sid, stored=payload, expiry=expiry)
+        # Never adopt an unknown id from the client.
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        response.vary.add('Cookie')
+        now = datetime.utcnow()
+        expiry = now + app.permanent_session_lifetime
+        payload = dump_session(session)
+        if payload != session.stored:
+            self._write(session.sid, payload, expiry, session.new)
+        elif session.permanent and (expiry - session.expiry).total_seconds() > self.refresh_threshold:
+            self._touch(session.sid, payload, expiry)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _load(self, sid):
+        record = self.cache.get(sid)
+        if record is None:
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    db.select(ServerSession.data, ServerSession.expiry).where(ServerSession.id == sid)).first()
+            if row is None:
+                return None
+            record = (row.data, row.expiry)
+            self.cache.put(sid, *record)
+        if record[1] <= datetime.utcnow():
+            return None
+        return record
+
+    def _write(self, sid, payload, expiry, new):
+        table = ServerSession.__table__
+        values = {'data': payload, 'expiry': expiry}
+        with db.engine.begin() as connection:
+            # Insert if it is new, or was swept since it was loaded.
+            if new or not connection.execute(table.update().where(table.c.id == sid).values(**values)).rowcount:
+                connection.execute(table.insert().values(id=sid, **values))
+        self.cache.put(sid, payload, expiry)
+
+    def _touch(self, sid, payload, expiry):
+        table = ServerSession.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.id == sid).values(expiry=expiry))
+        self.cache.put(sid, payload, expiry)
+
+    def _delete(self, sid):
+        self.cache.discard(sid)
+        table = ServerSession.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.id == sid))
+
+
+class SessionSweeper(object):
+    """Deletes expired sessions in batches from a background thread.
+
+    Each batch seeks the oldest expired ids through the ``expiry`` index and
+    deletes them by primary key in its own short transaction.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('SESSION_SWEEP_INTERVAL', 300)
+        self.batch_size = app.config.get('SESSION_SWEEP_BATCH_SIZE', 500)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None or not self.interval:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='session-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def sweep(self, now=None):
+        """Delete every session expired by ``now``. Needs an app context."""
+        now = now or datetime.utcnow()
+        table = ServerSession.__table__
+        expired = db.select(table.c.id).where(table.c.expiry <= now).order_by(table.c.expiry).limit(self.batch_size)
+        deleted = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(expired).scalars().all()
+                if ids:
+                    connection.execute(table.delete().where(table.c.id.in_(ids)))
+            deleted += len(ids)
+            if len(ids) < self.batch_size or self._stopping.is_set():
+                return deleted
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception:
+                self.app.logger.exception('Session sweep failed')
+
+
+def init_sessions(app):
+    cache = SessionCache(app.config.get('SESSION_CACHE_SIZE', 4096), app.config.get('SESSION_CACHE_TTL', 30))
+    app.session_interface = SQLAlchemySessionInterface(cache, app.config.get('SESSION_REFRESH_THRESHOLD', 300))
+    sweeper = SessionSweeper(app)
+    app.extensions['session_sweeper'] = sweeper
+    return app.session_interface
@@ -0,0 +1,367 @@
+"""Replays of retried requests that carry an ``Idempotency-Key`` header."""
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from app.database.context import db
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Outcomes of IdempotencyStore.claim besides a Completed response or an event.
+OWNER = 'owner'
+BUSY = 'busy'
+
+Completed = namedtuple('Completed', 'fingerprint status_code mimetype body expires_at')
+
+
+class IdempotencyRecord(db.Model):
+    __tablename__ = 'idempotency_key'
+
+    # sha256 of the endpoint, the caller and the header value.
+    key = db.Column(db.String(64), primary_key=True)
+    # HMAC of the request body, keyed with SECRET_KEY.
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL while the first request is in flight.
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(64))
+    body = db.Column(db.LargeBinary)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<IdempotencyRecord %r>' % self.key
+
+
+class IdempotencyStore(object):
+    """Responses by idempotency key: a per-process LRU in front of the
+    ``idempotency_key`` table, which every process shares.
+
+    The first request for a key claims it with an INSERT, and the row holds
+    its response once the view has finished. Duplicates that arrive in the
+    meantime wait, on an event when the first one runs in the same process
+    and by polling the row otherwise. Responses are kept for ``ttl``
+    seconds. The owner keeps extending its claim while the view runs, so
+    only a claim left by a process that died lapses, after ``lock_timeout``
+    seconds.
+    """
+
+    def __init__(self, maxsize=10000, ttl=86400, wait_timeout=30, lock_timeout=60, poll_interval=0.05,
+                 purge_interval=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._held = set()
+        self._lock = threading.Lock()
+        self._renewer = None
+        self._renewer_pid = None
+        self._purged_at = time.monotonic()
+
+    def claim(self, key, fingerprint):
+        """Return the ``Completed`` response for ``key``; ``OWNER`` if the
+        caller is to run the view and then ``complete`` or ``release`` the
+        key; an event to wait on while this process runs it; or ``BUSY``
+        while another process does. Needs an app context."""
+        with self._lock:
+            completed = self._entries.get(key)
+            if completed is not None and completed.expires_at > datetime.utcnow():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return completed
+            if completed is not None:
+                del self._entries[key]
+            event = self._inflight.get(key)
+            if event is not None:
+                return event
+            self.misses += 1
+            self._inflight[key] = threading.Event()
+
+        # Only this thread asks the table about the key; duplicates in this
+        # process wait on its event.
+        try:
+            outcome = self._claim_row(key, fingerprint)
+        except Exception:
+            self._finish(key)
+            raise
+        if outcome is not OWNER:
+            self._finish(key, outcome if isinstance(outcome, Completed) else None)
+        return outcome
+
+    def hold(self, key):
+        """Keep extending the claim on ``key`` until it is completed or
+        released, so that it can't lapse while the view is still running.
+        One thread per process renews every held claim. Needs an app
+        context."""
+        with self._lock:
+            self._held.add(key)
+            # A renewer inherited through fork isn't running.
+            if self._renewer is None or self._renewer_pid != os.getpid():
+                self._renewer = threading.Thread(target=self._renew_held, args=(current_app._get_current_object(),),
+                                                 name='idempotency-renewer', daemon=True)
+                self._renewer_pid = os.getpid()
+                self._renewer.start()
+
+    def complete(self, key, fingerprint, response):
+        """Keep the response for replays. The view has already done its
+        work, so storage failures are logged rather than raised; the claim
+        then lapses and only this process replays the response."""
+        table = IdempotencyRecord.__table__
+        completed = Completed(fingerprint, response.status_code, response.mimetype, response.get_data(),
+                              datetime.utcnow() + timedelta(seconds=self.ttl))
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.key == key).values(
+                    status_code=completed.status_code, mimetype=completed.mimetype, body=completed.body,
+                    expires_at=completed.expires_at))
+        except Exception:
+            current_app.logger.exception('Could not store the response for an idempotency key')
+        finally:
+            self._finish(key, completed)
+        if time.monotonic() - self._purged_at >= self.purge_interval:
+            self._purged_at = time.monotonic()
+            try:
+                self.purge()
+            except Exception:
+                current_app.logger.exception('Could not purge idempotency keys')
+
+    def release(self, key):
+        """Give up a claim, so that a retry runs the view again. A claim
+        that can't be deleted is logged and left to lapse."""
+        table = IdempotencyRecord.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.delete().where(table.c.key == key, table.c.status_code.is_(None)))
+        except Exception:
+            current_app.logger.exception('Could not release an idempotency key')
+        finally:
+            self._finish(key)
+
+    def purge(self, now=None):
+        """Delete expired responses and lapsed claims. Needs an app context."""
+        table = IdempotencyRecord.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(table.delete().where(table.c.expires_at <= (now or datetime.utcnow()))).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'in_flight': len(self._inflight),
+                'held': len(self._held)}
+
+    def _claim_row(self, key, fingerprint):
+        table = IdempotencyRecord.__table__
+        now = datetime.utcnow()
+        claim = {'fingerprint': fingerprint, 'status_code': None, 'mimetype': None, 'body': None,
+                 'expires_at': now + timedelta(seconds=self.lock_timeout)}
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(key=key, **claim))
+            return OWNER
+        except IntegrityError:
+            pass
+
+        with db.engine.begin() as connection:
+            row = connection.execute(db.select(table).where(table.c.key == key)).first()
+            if row is None:
+                # Released or purged since the INSERT failed; try again.
+                return BUSY
+            if row.expires_at <= now:
+                # An expired response or a lapsed claim; take it over.
+                taken = connection.execute(
+                    table.update().where(table.c.key == key, table.c.expires_at <= now).values(**claim)).rowcount
+                return OWNER if taken else BUSY
+        if row.status_code is None:
+            return BUSY
+        return Completed(row.fingerprint, row.status_code, row.mimetype, row.body, row.expires_at)
+
+    def _renew_held(self, app):
+        while True:
+            time.sleep(self.lock_timeout / 3.0)
+            with self._lock:
+                keys = list(self._held)
+                if not keys:
+                    # The next hold starts another.
+                    self._renewer = None
+                    return
+            table = IdempotencyRecord.__table__
+            try:
+                with app.app_context(), db.engine.begin() as connection:
+                    connection.execute(table.update().where(table.c.key.in_(keys), table.c.status_code.is_(None)).values(
+                        expires_at=datetime.utcnow() + timedelta(seconds=self.lock_timeout)))
+            except Exception:
+                app.logger.exception('Could not extend claims on idempotency keys')
+
+    def _finish(self, key, completed=None):
+        with self._lock:
+            if completed is not None:
+                self._entries.pop(key, None)
+                self._entries[key] = completed
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            event = self._inflight.pop(key, None)
+            self._held.discard(key)
+        if event is not None:
+            event.set()
+
+
+def init_idempotency(app):
+    if not app.config.get('IDEMPOTENCY_ENABLED', True):
+        return None
+    store = IdempotencyStore(
+        app.config.get('IDEMPOTENCY_CACHE_SIZE', 10000),
+        app.config.get('IDEMPOTENCY_TTL', 86400),
+        app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 30),
+        app.config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60),
+        app.config.get('IDEMPOTENCY_POLL_INTERVAL', 0.05),
+        app.config.get('IDEMPOTENCY_PURGE_INTERVAL', 300),
+    )
+    app.extensions['idempotency'] = store
+    return store
+
+
+def get_idempotency_store():
+    return current_app.extensions.get('idempotency')
+
+
+def idempotent(per_user=False):
+    """Run the view once per ``Idempotency-Key`` and replay its response to
+    retries with the same key and body.
+
+    Keys are scoped to the endpoint, and with ``per_user`` to the JWT
+    subject, so apply it inside ``jwt_required``. Requests without the
+    header run as usual. 5xx and 429 responses aren't kept, so their
+    retries run again. Works on the sync views and on the async variants.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                store, key, fingerprint, error = _prepare(per_user)
+                if store is None or error is not None:
+                    return error or await view(*args, **kwargs)
+                deadline = time.monotonic() + store.wait_timeout
+                while True:
+                    outcome = await _in_thread(store.claim, key, fingerprint)
+                    if outcome is OWNER:
+                        return await _run_async(store, key, fingerprint, view, args, kwargs)
+                    if isinstance(outcome, Completed):
+                        return _replay(outcome, fingerprint)
+                    if time.monotonic() >= deadline:
+                        return _still_running()
+                    await asyncio.sleep(store.poll_interval)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store, key, fingerprint, error = _prepare(per_user)
+            if store is None or error is not None:
+                return error or view(*args, **kwargs)
+            deadline = time.monotonic() + store.wait_timeout
+            while True:
+                outcome = store.claim(key, fingerprint)
+                if outcome is OWNER:
+                    return _run(store, key, fingerprint, view, args, kwargs)
+                if isinstance(outcome, Completed):
+                    return _replay(outcome, fingerprint)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return _still_running()
+                if outcome is BUSY:
+                    time.sleep(min(store.poll_interval, remaining))
+                else:
+                    outcome.wait(remaining)
+        return wrapper
+    return decorator
+
+
+def _prepare(per_user):
+    store = get_idempotency_store()
+    header = request.headers.get(HEADER)
+    if store is None or header is None:
+        return None, None, None, None
+    if not header or len(header) > MAX_KEY_LENGTH:
+        return store, None, None, (jsonify({'msg': 'Invalid %s header' % HEADER}), 400)
+    caller = str(get_jwt_identity()) if per_user else ''
+    key = _digest(hashlib.sha256(), request.endpoint, caller, header)
+    # Keyed, since the body may hold a password and rows are kept for a day.
+    secret = current_app.config['SECRET_KEY'].encode('utf-8')
+    fingerprint = _digest(hmac.new(secret, digestmod=hashlib.sha256), request.method, request.path, request.get_data())
+    return store, key, fingerprint, None
+
+
+def _digest(digest, *parts):
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _run(store, key, fingerprint, view, args, kwargs):
+    store.hold(key)
+    try:
+        response = make_response(view(*args, **kwargs))
+    except BaseException:
+        store.release(key)
+        raise
+    _keep_or_release(store, key, fingerprint, response)
+    return response
+
+
+async def _run_async(store, key, fingerprint, view, args, kwargs):
+    store.hold(key)
+    try:
+        response = make_response(await view(*args, **kwargs))
+    except BaseException:
+        await _in_thread(store.release, key)
+        raise
+    await _in_thread(_keep_or_release, store, key, fingerprint, response)
+    return response
+
+
+def _keep_or_release(store, key, fingerprint, response):
+    if response.status_code >= 500 or response.status_code == 429 or response.is_streamed:
+        store.release(key)
+    else:
+        store.complete(key, fingerprint, response)
+
+
+def _replay(completed, fingerprint):
+    if completed.fingerprint != fingerprint:
+        return jsonify({'msg': '%s was already used for a different request' % HEADER}), 422
+    response = current_app.response_class(completed.body, status=completed.status_code, mimetype=completed.mimetype)
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _still_running():
+    response = jsonify({'msg': 'A request with this %s is still in progress' % HEADER})
+    response.status_code = 409
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+async def _in_thread(function, *args):
+    # The store talks to the database through the sync engine; keep that off
+    # the event loop, in the current app and request context.
+    return await asyncio.get_running_loop().run_in_executor(None, contextvars.copy_context().run, function, *args)
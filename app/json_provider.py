@@ -0,0 +1,52 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider backed by orjson when it is installed.
+
+    Covers ``jsonify``, ``request.get_json`` and ``app.json.dumps``/``loads``.
+    Dates and everything else orjson doesn't handle natively go through
+    Flask's ``default``, so the output matches the stdlib provider apart from
+    whitespace and non-ASCII characters, which are written as UTF-8.
+    Calls with ``json.dumps`` keyword arguments use the stdlib provider.
+    """
+
+    ensure_ascii = False
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _fast(self):
+        return orjson is not None and not self.ensure_ascii
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or not self._fast():
+            return super(FastJSONProvider, self).dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs or orjson is None:
+            return super(FastJSONProvider, self).loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not self._fast():
+            return super(FastJSONProvider, self).response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        options = self._options() | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options |= orjson.OPT_INDENT_2
+        body = orjson.dumps(obj, default=self.default, option=options)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,117 @@
+import threading
+
+from sqlalchemy.pool import QueuePool
+
+from app.database.context import db
+
+# Optional per-process threads with start() and stop(timeout).
+_BACKGROUND = ('session_sweeper', 'token_revocations')
+
+
+def before_fork(app):
+    """Release what forked workers can't share: threads, sockets and processes."""
+    app.extensions['mail_queue'].stop()
+    _stop_background(app)
+    _close_smtp_pool(app)
+    app.extensions['password_hasher'].shutdown()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def after_fork(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            # Drop connections inherited from the master without closing
+            # them, since their sockets are shared with it.
+            engine.dispose(close=False)
+    start_background(app)
+
+
+def start_background(app):
+    """Start the mail senders and the other per-process threads.
+
+    ``create_app`` only builds them, so CLI commands and tests never claim
+    queued mail; each serving process calls this once. Calling it again is
+    a no-op.
+    """
+    queue = app.extensions['mail_queue']
+    if queue.workers:
+        queue.start()
+    for name in _BACKGROUND:
+        if name in app.extensions:
+            app.extensions[name].start()
+
+
+def warm_up(app, connections=None):
+    """Open DB connections, start the hashing processes and compile mail
+    templates before the worker takes its first request, and start opening
+    SMTP connections in the background.
+
+    ``connections`` caps the connections opened per pool, e.g. at the number
+    of request threads. Returns the SMTP warm-up thread, if any.
+    """
+    smtp_thread = None
+    with app.app_context():
+        for engine in db.engines.values():
+            _warm_engine(engine, connections)
+
+        from app.mailman.pool import get_smtp_pool
+        from app.mailman.utils import get_mail_state
+        if not get_mail_state().suppress:
+            # Requests only enqueue mail, so the SMTP handshakes needn't hold
+            # up the first request; a slow server would.
+            pool = get_smtp_pool()
+            smtp_thread = threading.Thread(
+                target=_warm_smtp_pool, args=(app, pool, connections), name='smtp-warm-up', daemon=True)
+            smtp_thread.start()
+
+    app.extensions['password_hasher'].warm()
+    app.extensions['mail_templates'].warm()
+    return smtp_thread
+
+
+def shutdown(app, timeout=None):
+    """Let mail senders finish their batch, then close every pool."""
+    app.extensions['mail_queue'].stop(timeout)
+    _stop_background(app, timeout)
+    _close_smtp_pool(app)
+    app.extensions['password_hasher'].shutdown()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _warm_engine(engine, connections):
+    size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+    if connections is not None:
+        size = min(size, connections)
+    # Check out all of them at once so the pool has to open distinct ones.
+    opened = []
+    try:
+        for _ in range(max(1, size)):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.exec_driver_sql('SELECT 1')
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def _warm_smtp_pool(app, pool, connections):
+    try:
+        pool.warm(connections)
+    except Exception:
+        app.logger.warning('Could not pre-open SMTP connections', exc_info=True)
+
+
+def _stop_background(app, timeout=None):
+    for name in _BACKGROUND:
+        if name in app.extensions:
+            app.extensions[name].stop(timeout)
+
+
+def _close_smtp_pool(app):
+    pool = app.extensions.get('smtp_pool')
+    if pool is not None:
+        pool.close_all()
@@ -0,0 +1,44 @@
+"""Async variants of the mailman views, served by ``app.asgi.AsyncApp``.
+
+Delivery already happens on the mail queue's sender threads, so a request
+only renders the message and inserts it into ``outbound_email``; here that
+insert is awaited on the asyncio engine. ``/mailman/send/batch`` talks to
+SMTP while it streams and stays on the sync path.
+"""
+from flask import current_app as app, jsonify
+
+from app.asgi import async_view
+from app.auth.async_views import jwt_required_async, load_user
+from app.database.aio import get_async_database
+from app.idempotency import idempotent
+from app.mailman.queue import get_mail_queue
+from app.mailman.schemas import send_schema
+from app.mailman.utils import is_mail_template, queue_email
+from app.validation import validate_json
+
+
+@async_view('mailman.send')
+@jwt_required_async
+@validate_json(send_schema)
+@idempotent(per_user=True)
+async def send(data):
+    to = data['to']
+    subject = data['subject']
+    template_name = data['template_name']
+    params = data['params']
+
+    if not is_mail_template(template_name):
+        return jsonify({'msg': 'Unknown template_name'}), 400
+
+    if not await load_user(email=to):
+        return jsonify({'msg': 'User does not exist'}), 400
+
+    try:
+        async with get_async_database().engine().begin() as connection:
+            await queue_email(connection, to, subject, template_name, params)
+    except Exception as e:
+        app.logger.error('Could not queue email to %s: %r', to, e)
+        return jsonify({'msg': 'Error in queueing email'}), 500
+
+    get_mail_queue().notify()
+    return jsonify({'msg': 'Email queued'}), 202
@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import nodes
+from markupsafe import Markup, escape
+
+
+class CompiledTemplate(object):
+    """A mail template split into static text and per-recipient fields.
+
+    ``statics`` always has one more item than ``fields``; rendering
+    interleaves them, so it costs a join rather than a Jinja render.
+    Templates that use ``params`` in any other way than printing
+    ``params["name"]`` directly keep ``statics`` as ``None`` and are
+    rendered by Jinja on every call.
+    """
+
+    __slots__ = ('template', 'statics', 'fields', 'autoescape')
+
+    def __init__(self, template, statics, fields, autoescape):
+        self.template = template
+        self.statics = statics
+        self.fields = fields
+        self.autoescape = autoescape
+
+    def render(self, params):
+        if self.statics is None:
+            return self.template.render(params=params)
+
+        statics = self.statics
+        html = [statics[0]]
+        for index, field in enumerate(self.fields, 1):
+            value = params.get(field)
+            if value is not None or field in params:
+                html.append(str(escape(value)) if self.autoescape else str(value))
+            html.append(statics[index])
+        return ''.join(html)
+
+
+class MailTemplateEngine(object):
+    """Bounded LRU cache of compiled mail templates.
+
+    Uses the application's Jinja environment directly, so rendering needs
+    neither a request nor an app context.
+    """
+
+    def __init__(self, app, maxsize=64):
+        self.app = app
+        self.maxsize = maxsize
+        self.auto_reload = app.jinja_env.auto_reload
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._names = None
+
+    def get(self, template_name):
+        with self._lock:
+            compiled = self._cache.get(template_name)
+            if compiled is not None:
+                self._cache.move_to_end(template_name)
+
+        if compiled is not None and self.auto_reload and not compiled.template.is_up_to_date:
+            compiled = None
+
+        if compiled is None:
+            self.misses += 1
+            compiled = self._compile(template_name)
+            with self._lock:
+                self._cache[template_name] = compiled
+                self._cache.move_to_end(template_name)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        else:
+            self.hits += 1
+        return compiled
+
+    def render(self, template_name, params):
+        return self.get(template_name).render(params)
+
+    def render_many(self, template_name, params_list):
+        compiled = self.get(template_name)
+        for params in params_list:
+            yield compiled.render(params)
+
+    def invalidate(self, template_name=None):
+        """Drop one compiled template, or all of them, after an edit."""
+        jinja_cache = self.app.jinja_env.cache
+        with self._lock:
+            if template_name is None:
+                self._cache.clear()
+                if jinja_cache is not None:
+                    jinja_cache.clear()
+            else:
+                self._cache.pop(template_name, None)
+                for key in list(jinja_cache.keys() if jinja_cache is not None else ()):
+                    if key[1] == template_name:
+                        try:
+                            del jinja_cache[key]
+                        except KeyError:
+                            pass
+
+    def exists(self, template_name):
+        """Whether ``template_name`` names a mail template. Only exact names
+        match, so paths that climb out of the template folders never do."""
+        names = self._names
+        if names is None or self.auto_reload:
+            names = self._names = frozenset(self.app.jinja_env.list_templates(extensions=['html', 'txt']))
+        return template_name in names
+
+    def warm(self):
+        for template_name in self.app.jinja_env.list_templates(extensions=['html', 'txt']):
+            self.get(template_name)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _compile(self, template_name):
+        env = self.app.jinja_env
+        template = env.get_template(template_name)
+        autoescape = env.autoescape(template_name) if callable(env.autoescape) else env.autoescape
+
+        source = env.loader.get_source(env, template_name)[0]
+        fields = _printed_fields(env.parse(source))
+        if fields is None:
+            return CompiledTemplate(template, None, None, autoescape)
+
+        # Render once with a numbered marker in place of every field value and
+        # cut the output on the markers.
+        markers = {field: Markup('\x00%d\x00' % index) for index, field in enumerate(fields)}
+        parts = template.render(params=markers).split('\x00')
+        order = tuple(fields[int(index)] for index in parts[1::2])
+        return CompiledTemplate(template, tuple(parts[0::2]), order, autoescape)
+
+
+def _printed_fields(ast):
+    """Names of the ``params`` keys the template prints, or ``None`` if it
+    uses ``params`` in a way that depends on the values."""
+    if any(True for _ in ast.find_all((nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport))):
+        return None
+
+    fields = []
+    for output in ast.find_all(nodes.Output):
+        for node in output.nodes:
+            if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const):
+                key = node.arg.value
+            elif isinstance(node, nodes.Getattr) and not hasattr(dict, node.attr):
+                key = node.attr
+            else:
+                continue
+            if isinstance(node.node, nodes.Name) and node.node.name == 'params' and isinstance(key, str):
+                fields.append(key)
+
+    uses = sum(1 for name in ast.find_all(nodes.Name) if name.name == 'params')
+    if uses != len(fields) or any('\x00' in field for field in fields):
+        return None
+    return list(dict.fromkeys(fields))
+
+
+def init_template_engine(app):
+    engine = MailTemplateEngine(app, app.config.get('MAIL_TEMPLATE_CACHE_SIZE', 64))
+    app.extensions['mail_templates'] = engine
+    if app.config.get('MAIL_TEMPLATE_PRECOMPILE', True):
+        engine.warm()
+    return engine
+
+
+def get_template_engine():
+    return current_app.extensions['mail_templates']
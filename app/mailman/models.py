@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from app.database.context import db
+
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'outbound_email'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(254), nullable=False)
+    sender = db.Column(db.String(254), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return '<OutboundEmail %r to %r>' % (self.id, self.recipient)
+
+
+class DeadLetterEmail(db.Model):
+    __tablename__ = 'dead_letter_email'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(254), nullable=False)
+    sender = db.Column(db.String(254), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    failed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def from_outbound(cls, message):
+        return cls(
+            recipient=message.recipient,
+            sender=message.sender,
+            subject=message.subject,
+            html=message.html,
+            attempts=message.attempts,
+            last_error=message.last_error,
+            created_at=message.created_at,
+        )
+
+    def __repr__(self):
+        return '<DeadLetterEmail %r to %r>' % (self.id, self.recipient)
@@ -0,0 +1,177 @@
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import current_app
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def is_connection_error(error):
+    """Whether ``error`` leaves the SMTP session unusable.
+
+    Refused recipients and other 4xx/5xx replies are per-message failures;
+    smtplib resets the session after them so the connection can be reused.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)):
+        return False
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+class SMTPConnectionPool(object):
+    """Bounded, thread-safe pool of authenticated SMTP connections.
+
+    At most ``size`` connections are open or borrowed at once. Idle
+    connections are reused most-recently-used first, closed once they have
+    been idle for ``idle_timeout`` seconds and checked with NOOP before being
+    handed out, so server-side disconnects are replaced transparently.
+    """
+
+    def __init__(self, server, port, use_ssl=False, use_tls=False, username=None, password=None,
+                 size=4, idle_timeout=60, timeout=30):
+        self.server = server
+        self.port = port
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._pid = os.getpid()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['MAIL_SERVER'],
+            config['MAIL_PORT'],
+            use_ssl=config.get('MAIL_USE_SSL', False),
+            use_tls=config.get('MAIL_USE_TLS', False),
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            size=config.get('MAIL_POOL_SIZE', 4),
+            idle_timeout=config.get('MAIL_POOL_IDLE_TIMEOUT', 60),
+        )
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection; it is returned to the pool on exit.
+
+        A connection error raised inside the block discards the connection
+        instead of returning it.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout('No SMTP connection available within %ss' % timeout)
+        smtp = None
+        try:
+            smtp = self._checkout()
+            yield smtp
+        except Exception as e:
+            if smtp is not None and is_connection_error(e):
+                self._close(smtp)
+                smtp = None
+            raise
+        finally:
+            if smtp is not None:
+                self._checkin(smtp)
+            self._slots.release()
+
+    def warm(self, count=None):
+        """Open up to ``count`` (default ``size``) idle connections ahead of the first send."""
+        count = self.size if count is None else min(count, self.size)
+        opened = []
+        try:
+            for _ in range(count - self.idle_count):
+                opened.append(self._connect())
+        finally:
+            with self._lock:
+                self._reset_after_fork()
+                now = time.monotonic()
+                self._idle.extend((smtp, now) for smtp in opened)
+        return len(opened)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for smtp, _ in idle:
+            self._close(smtp)
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                self._reset_after_fork()
+                if not self._idle:
+                    break
+                smtp, last_used = self._idle.pop()
+
+            if time.monotonic() - last_used > self.idle_timeout:
+                self._close(smtp)
+                continue
+            if self._is_alive(smtp):
+                return smtp
+            self._close(smtp)
+        return self._connect()
+
+    def _checkin(self, smtp):
+        with self._lock:
+            if os.getpid() == self._pid:
+                self._idle.append((smtp, time.monotonic()))
+
+    def _reset_after_fork(self):
+        # Sockets inherited from the parent process are shared with it, so a
+        # forked worker must drop them without sending QUIT.
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = deque()
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        return smtp
+
+    @staticmethod
+    def _is_alive(smtp):
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+
+def get_smtp_pool():
+    app = current_app._get_current_object()
+    pool = app.extensions.get('smtp_pool')
+    if pool is None:
+        pool = app.extensions.setdefault('smtp_pool', SMTPConnectionPool.from_config(app.config))
+    return pool
@@ -0,0 +1,134 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.database.context import db
+from app.mailman.models import OutboundEmail, DeadLetterEmail
+
+
+class MailQueue(object):
+    """Durable outbound mail queue backed by the ``outbound_email`` table.
+
+    Requests only insert rows; a pool of sender threads claims due rows in
+    batches, delivers them over a pooled SMTP connection, retries failures
+    with exponential backoff and moves exhausted messages to
+    ``dead_letter_email``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get('MAIL_QUEUE_WORKERS', 0)
+        self.batch_size = app.config.get('MAIL_QUEUE_BATCH_SIZE', 20)
+        self.poll_interval = app.config.get('MAIL_QUEUE_POLL_INTERVAL', 2.0)
+        self.max_attempts = app.config.get('MAIL_QUEUE_MAX_ATTEMPTS', 5)
+        self.retry_backoff = app.config.get('MAIL_QUEUE_RETRY_BACKOFF', 30)
+        self.lease_timeout = app.config.get('MAIL_QUEUE_LEASE_TIMEOUT', 300)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def enqueue(self, recipient, subject, html, sender):
+        message = OutboundEmail(recipient=recipient, subject=subject, html=html, sender=sender)
+        db.session.add(message)
+        return message
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self, workers=None):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index in range(workers if workers is not None else self.workers):
+            thread = threading.Thread(target=self._run, name='mail-queue-%d' % index, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def process_pending(self, limit=None):
+        """Claim and deliver one batch of due messages. Needs an app context."""
+        messages = self._claim(limit or self.batch_size)
+        if not messages:
+            return 0
+
+        errors = self._deliver(messages)
+        now = datetime.utcnow()
+        for message in messages:
+            if message.id not in errors:
+                db.session.delete(message)
+                continue
+
+            message.attempts += 1
+            message.last_error = errors[message.id]
+            if message.attempts >= self.max_attempts:
+                db.session.add(DeadLetterEmail.from_outbound(message))
+                db.session.delete(message)
+            else:
+                message.status = 'queued'
+                message.claimed_by = None
+                message.claimed_at = None
+                message.next_attempt_at = now + timedelta(
+                    seconds=self.retry_backoff * 2 ** (message.attempts - 1))
+        db.session.commit()
+        return len(messages)
+
+    def _claim(self, limit):
+        now = datetime.utcnow()
+        due = db.or_(
+            db.and_(OutboundEmail.status == 'queued', OutboundEmail.next_attempt_at <= now),
+            db.and_(OutboundEmail.status == 'sending',
+                    OutboundEmail.claimed_at < now - timedelta(seconds=self.lease_timeout)),
+        )
+        ids = [row.id for row in db.session.query(OutboundEmail.id)
+               .filter(due).order_by(OutboundEmail.next_attempt_at).limit(limit)]
+        if not ids:
+            db.session.rollback()
+            return []
+
+        # Re-checking ``due`` in the UPDATE makes the claim atomic between
+        # threads and processes sharing the table.
+        token = uuid.uuid4().hex
+        OutboundEmail.query.filter(OutboundEmail.id.in_(ids), due).update(
+            {'status': 'sending', 'claimed_by': token, 'claimed_at': now},
+            synchronize_session=False)
+        db.session.commit()
+        return OutboundEmail.query.filter_by(claimed_by=token).all()
+
+    def _deliver(self, messages):
+        from app.mailman.utils import deliver_messages
+        return deliver_messages(messages)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.process_pending()
+            except Exception:
+                self.app.logger.exception('Mail queue worker failed')
+                processed = 0
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+def init_mail_queue(app):
+    queue = MailQueue(app)
+    app.extensions['mail_queue'] = queue
+    return queue
+
+
+def get_mail_queue():
+    return current_app.extensions['mail_queue']
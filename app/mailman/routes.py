@@ -1,8 +1,13 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, stream_with_context, current_app as app
 from flask_jwt_extended import jwt_required
 
-from app.auth.models import User
-from app.mailman.utils import send_email
+from app.auth.cache import load_user_by_email
+from app.auth.models import User, canonical_email
+from app.database.context import db
+from app.idempotency import idempotent
+from app.mailman.schemas import send_batch_schema, send_schema
+from app.mailman.utils import is_mail_template, render_email_batch, send_email, send_email_batch
+from app.validation import validate_json
 
 mailman_bp = Blueprint('mailman', __name__, url_prefix='/mailman', template_folder='templates')
 
@@ -14,17 +19,61 @@ def index():
 
 @mailman_bp.route('/send', methods=['POST'])
 @jwt_required()
-def send():
-    to = request.json.get('to')
-    subject = request.json.get('subject')
-    template_name = request.json.get('template_name')
-    params = request.json.get('params')
+@validate_json(send_schema)
+@idempotent(per_user=True)
+def send(data):
+    to = data['to']
+    subject = data['subject']
+    template_name = data['template_name']
+    params = data['params']
 
-    user = User.query.filter_by(email=to).first()
+    if not is_mail_template(template_name):
+        return jsonify({'msg': 'Unknown template_name'}), 400
+
+    user = load_user_by_email(to)
 
     if not user:
         return jsonify({'msg': 'User does not exist'}), 400
 
-    send_email(to, subject, template_name, params)
+    if not send_email(to, subject, template_name, params):
+        return jsonify({'msg': 'Error in queueing email'}), 500
+
+    return jsonify({'msg': 'Email queued'}), 202
+
+
+@mailman_bp.route('/send/batch', methods=['POST'])
+@jwt_required()
+@validate_json(send_batch_schema)
+def send_batch(data):
+    subject = data['subject']
+    template_name = data['template_name']
+    recipients = data['recipients']
+
+    if not is_mail_template(template_name):
+        return jsonify({'msg': 'Unknown template_name'}), 400
+
+    chunk_size = app.config['MAILMAN_BATCH_CHUNK_SIZE']
+    dumps = app.json.dumps
+
+    def generate():
+        for start in range(0, len(recipients), chunk_size):
+            chunk = recipients[start:start + chunk_size]
+            keys = [canonical_email(recipient['to']) for recipient in chunk]
+            known = {key for (key,) in db.session.query(User.email_key).filter(User.email_key.in_(set(keys)))}
+
+            deliverable = [recipient for recipient, key in zip(chunk, keys) if key in known]
+            bodies = render_email_batch(template_name, [recipient.get('params') or {} for recipient in deliverable])
+            results = send_email_batch(subject, [(recipient['to'], html) for recipient, html in zip(deliverable, bodies)])
+            statuses = iter(results)
+
+            for recipient, key in zip(chunk, keys):
+                if key not in known:
+                    line = {'to': recipient['to'], 'status': 'unknown_user'}
+                else:
+                    to, status, error = next(statuses)
+                    line = {'to': to, 'status': status}
+                    if error:
+                        line['error'] = error
+                yield dumps(line) + '\n'
 
-    return jsonify({'msg': 'Email sent successfully'}), 200
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
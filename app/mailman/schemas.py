@@ -0,0 +1,21 @@
+from app.validation import List, Object, Schema, String
+
+send_schema = Schema(
+    to=String(missing='Missing to, subject or template_name'),
+    subject=String(missing='Missing to, subject or template_name'),
+    template_name=String(missing='Missing to, subject or template_name'),
+    params=Object(required=False),
+)
+
+recipient_schema = Schema(
+    to=String(),
+    params=Object(required=False),
+)
+
+send_batch_schema = Schema(
+    subject=String(missing='Missing subject, template_name or recipients'),
+    template_name=String(missing='Missing subject, template_name or recipients'),
+    recipients=List(recipient_schema, missing='Missing subject, template_name or recipients',
+                    invalid='Missing subject, template_name or recipients',
+                    item_message='Every recipient needs a "to" address'),
+)
@@ -1,19 +1,144 @@
-from flask import render_template, current_app as app
-from flask_mail import Message
-
-from app import mail
-
-def send_email(to, subject, template_name, **params):
-    html = render_template(template_name, params=params)
-    msg = Message(
-        subject,
-        recipients=[to],
-        html=html,
-        sender=app.config.get("MAIL_DEFAULT_SENDER"),
-    )
+import time
+from contextlib import contextmanager
+
+from flask import current_app as app
+
+from app.database.context import db
+from app.mailman.engine import get_template_engine
+from app.mailman.models import OutboundEmail
+from app.mailman.pool import get_smtp_pool, is_connection_error
+from app.mailman.queue import get_mail_queue
+
+def send_email(to, subject, template_name, params=None):
+    """Queue an email for background delivery; ``params`` fill the template.
+
+    The message is committed together with anything already pending on the
+    session, so callers can stage related rows (e.g. a new user) first.
+    """
+    html = get_template_engine().render(template_name, params or {})
+    queue = get_mail_queue()
+    try:
+        queue.enqueue(to, subject, html, app.config.get("MAIL_DEFAULT_SENDER"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error('Could not queue email to %s: %r', to, e)
+        return False
+    queue.notify()
+    return True
+
+
+async def queue_email(connection, to, subject, template_name, params=None):
+    """``send_email`` for async views: insert the message on ``connection``.
+
+    It commits with the caller's transaction; call ``notify()`` on the mail
+    queue once it has.
+    """
+    html = get_template_engine().render(template_name, params or {})
+    await connection.execute(OutboundEmail.__table__.insert().values(
+        recipient=to, subject=subject, html=html, sender=app.config.get("MAIL_DEFAULT_SENDER")))
+
+
+def is_mail_template(template_name):
+    return get_template_engine().exists(template_name)
+
+
+def render_email_batch(template_name, params_list):
+    """Yield one rendered body per params dict from the compiled template."""
+    return get_template_engine().render_many(template_name, params_list)
+
+
+def send_email_batch(subject, messages):
+    """Send ``(recipient, html)`` pairs synchronously over one pooled connection.
+
+    Returns a ``(recipient, status, error)`` tuple per message. Messages left
+    unsent because the SMTP session broke are handed to the mail queue.
+    """
+    sender = app.config.get("MAIL_DEFAULT_SENDER")
+    results = []
+    sent = 0
+    try:
+        with smtp_connection() as smtp:
+            for recipient, html in messages:
+                try:
+                    _send(smtp, recipient, subject, html, sender)
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    results.append((recipient, 'failed', repr(e)))
+                else:
+                    results.append((recipient, 'sent', None))
+                sent += 1
+    except Exception as e:
+        app.logger.warning('SMTP session failed, queueing %d messages: %r', len(messages) - sent, e)
+        queue = get_mail_queue()
+        for recipient, html in messages[sent:]:
+            queue.enqueue(recipient, subject, html, sender)
+            results.append((recipient, 'queued', None))
+        db.session.commit()
+        queue.notify()
+    return results
+
+
+def deliver_messages(messages):
+    """Send queued messages over one pooled SMTP connection.
+
+    Returns a dict mapping the id of every message that failed to its error.
+    """
+    errors = {}
+    sent = 0
     try:
-        mail.send(msg)
-        return True
+        with smtp_connection() as smtp:
+            for message in messages:
+                try:
+                    _send(smtp, message.recipient, message.subject, message.html, message.sender)
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    errors[message.id] = repr(e)
+                sent += 1
     except Exception as e:
-        print(e)
-        return False
\ No newline at end of file
+        app.logger.warning('SMTP session failed: %r', e)
+        for message in messages[sent:]:
+            errors[message.id] = repr(e)
+    return errors
+
+
+def get_mail_state():
+    """Flask-Mail's per-app state, created on first use."""
+    state = app.extensions.get('mail')
+    if state is None:
+        from flask_mail import Mail
+        state = app.extensions.setdefault('mail', Mail().init_mail(app.config, app.debug, app.testing))
+    return state
+
+
+@contextmanager
+def smtp_connection():
+    # Honour MAIL_SUPPRESS_SEND (on by default when TESTING) like Flask-Mail.
+    if get_mail_state().suppress:
+        yield None
+        return
+    with get_smtp_pool().connection() as smtp:
+        yield smtp
+
+
+def _send(smtp, recipient, subject, html, sender):
+    from flask_mail import Message, email_dispatched
+
+    msg = Message(subject, recipients=[recipient], html=html, sender=sender)
+    if smtp is not None:
+        started = time.perf_counter()
+        try:
+            smtp.sendmail(sender, [recipient], msg.as_bytes())
+        except Exception:
+            _observe_send(started, False)
+            raise
+        _observe_send(started, True)
+    email_dispatched.send(msg, app=app._get_current_object())
+
+
+def _observe_send(started, ok):
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.observe_smtp_send(time.perf_counter() - started, ok)
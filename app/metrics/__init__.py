@@ -0,0 +1 @@
+from app.metrics.routes import metrics_bp
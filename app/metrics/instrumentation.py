@@ -0,0 +1,137 @@
+import random
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics.registry import Registry
+
+ENDPOINT_LABELS = ('blueprint', 'endpoint')
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class RequestStats(object):
+    __slots__ = ('start', 'statements', 'db_time', 'queries')
+
+    def __init__(self, collect_queries):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.queries = [] if collect_queries else None
+
+
+class Instrumentation(object):
+    """Request, database and SMTP metrics for one application.
+
+    Every metric aggregates under its own lock, so request threads and mail
+    senders can record concurrently; ``/metrics`` renders a snapshot.
+    """
+
+    def __init__(self, app):
+        self.registry = Registry()
+        self.request_duration = self.registry.histogram(
+            'http_request_duration_seconds', 'Request latency by blueprint and endpoint.', ENDPOINT_LABELS + ('method',))
+        self.requests = self.registry.counter(
+            'http_requests_total', 'Requests by blueprint, endpoint and status.', ENDPOINT_LABELS + ('method', 'status'))
+        self.request_statements = self.registry.histogram(
+            'http_request_db_statements', 'SQL statements issued per request.', ENDPOINT_LABELS, STATEMENT_BUCKETS)
+        self.db_statements = self.registry.counter(
+            'db_statements_total', 'SQL statements issued while handling requests.', ENDPOINT_LABELS)
+        self.db_duration = self.registry.counter(
+            'db_duration_seconds_total', 'Time spent executing SQL while handling requests.', ENDPOINT_LABELS)
+        self.smtp_duration = self.registry.histogram(
+            'mail_smtp_send_duration_seconds', 'Duration of single SMTP message sends.', ('outcome',))
+
+        self.slow_threshold = app.config.get('METRICS_SLOW_REQUEST_THRESHOLD')
+        self.slow_sample_rate = app.config.get('METRICS_SLOW_REQUEST_SAMPLE_RATE', 1.0)
+        self.max_queries = app.config.get('METRICS_SLOW_REQUEST_MAX_QUERIES', 100)
+        self.logger = app.logger
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def observe_smtp_send(self, duration, ok):
+        self.smtp_duration.observe(duration, 'ok' if ok else 'error')
+
+    def _start_request(self):
+        g._request_stats = RequestStats(self.slow_threshold is not None)
+
+    def _finish_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+
+        duration = time.perf_counter() - stats.start
+        labels = (request.blueprint or '', request.endpoint or 'unmatched')
+        self.request_duration.observe(duration, *(labels + (request.method,)))
+        self.requests.inc(*(labels + (request.method, str(response.status_code))))
+        self.request_statements.observe(stats.statements, *labels)
+        if stats.statements:
+            self.db_statements.inc(*labels, amount=stats.statements)
+            self.db_duration.inc(*labels, amount=stats.db_time)
+
+        if (self.slow_threshold is not None and duration >= self.slow_threshold
+                and random.random() < self.slow_sample_rate):
+            self.logger.warning(
+                'Slow request %s %s: %.3fs, %d statements, %.3fs in DB\n%s',
+                request.method, request.path, duration, stats.statements, stats.db_time,
+                '\n'.join('  %.3fs %s' % (elapsed, statement) for statement, elapsed in stats.queries))
+        return response
+
+    def _record_statement(self, statement, elapsed):
+        stats = g.get('_request_stats')
+        if stats is None:
+            return
+        stats.statements += 1
+        stats.db_time += elapsed
+        if stats.queries is not None and len(stats.queries) < self.max_queries:
+            stats.queries.append((statement, elapsed))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    instrumentation = get_instrumentation()
+    if instrumentation is not None:
+        instrumentation._record_statement(statement, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_started'):
+        connection.info['metrics_started'].pop()
+
+
+def get_instrumentation():
+    if has_app_context():
+        return current_app.extensions.get('metrics')
+
+
+def init_metrics(app):
+    instrumentation = Instrumentation(app)
+    app.extensions['metrics'] = instrumentation
+
+    def cache_stats():
+        cache = app.extensions.get('identity_cache')
+        if cache is None:
+            return []
+        stats = cache.stats()
+        return [
+            ('identity_cache_hits_total', 'counter', 'Identity cache hits.', stats['hits']),
+            ('identity_cache_misses_total', 'counter', 'Identity cache misses.', stats['misses']),
+        ]
+    instrumentation.registry.add_collector(cache_stats)
+
+    from app.metrics import metrics_bp
+    app.register_blueprint(metrics_bp)
+    return instrumentation
@@ -0,0 +1,29 @@
+import hmac
+import ipaddress
+
+from flask import Blueprint, Response, current_app as app, jsonify, request
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    if not _may_scrape():
+        return jsonify({'msg': 'Forbidden'}), 403
+    registry = app.extensions['metrics'].registry
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _may_scrape():
+    # A scraper sends METRICS_TOKEN as a bearer token or connects from one of
+    # METRICS_ALLOWED_NETWORKS.
+    token = app.config.get('METRICS_TOKEN')
+    scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme == 'Bearer' and hmac.compare_digest(presented.encode('utf-8'), token.encode('utf-8')):
+        return True
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in app.config.get('METRICS_ALLOWED_NETWORKS', ()))
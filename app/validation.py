@@ -0,0 +1,145 @@
+import inspect
+import re
+from functools import wraps
+
+from flask import jsonify, request
+
+
+class Field(object):
+    """One value in a JSON payload.
+
+    Every rule, including regexes, is fixed when the schema is defined, so
+    validating is a few comparisons per field.
+    """
+
+    def __init__(self, required=True, missing=None, invalid=None):
+        self.required = required
+        self.missing = missing
+        self.invalid = invalid
+        self.name = None
+
+    def bind(self, name):
+        self.name = name
+        if self.missing is None:
+            self.missing = 'No %s provided' % name
+        return self
+
+    def validate(self, value):
+        """Return the error message for ``value``, or None if it is valid."""
+        if self.is_missing(value):
+            return self.missing if self.required else None
+        return self.check(value)
+
+    def is_missing(self, value):
+        return value is None
+
+    def check(self, value):
+        return None
+
+
+class String(Field):
+    def __init__(self, min_length=None, max_length=None, pattern=None, length_message=None, pattern_message=None, **kwargs):
+        super(String, self).__init__(**kwargs)
+        self.min_length = min_length or 0
+        self.max_length = max_length
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.length_message = length_message
+        self.pattern_message = pattern_message
+
+    def is_missing(self, value):
+        return value is None or value == ''
+
+    def check(self, value):
+        if not isinstance(value, str):
+            return self.invalid or '%s must be a string' % self.name.capitalize()
+        if len(value) < self.min_length or (self.max_length is not None and len(value) > self.max_length):
+            return self.length_message
+        if self.pattern is not None and self.pattern.match(value) is None:
+            return self.pattern_message
+        return None
+
+
+class Object(Field):
+    def check(self, value):
+        if not isinstance(value, dict):
+            return self.invalid or '%s must be an object' % self.name.capitalize()
+        return None
+
+
+class List(Field):
+    """A list whose items all satisfy ``items``, a field or a schema."""
+
+    def __init__(self, items, item_message=None, **kwargs):
+        super(List, self).__init__(**kwargs)
+        self.items = items.bind('item') if isinstance(items, Field) else items
+        self.item_message = item_message
+
+    def check(self, value):
+        if not isinstance(value, list):
+            return self.invalid or '%s must be a list' % self.name.capitalize()
+        for index, item in enumerate(value):
+            if isinstance(self.items, Schema):
+                error = self.items.first_error(item)
+            else:
+                error = self.items.validate(item)
+            if error is not None:
+                return self.item_message or 'Item %d: %s' % (index, error)
+        return None
+
+
+class Schema(object):
+    """Named fields of a JSON object, checked in declaration order."""
+
+    def __init__(self, **fields):
+        self.fields = tuple((name, field.bind(name)) for name, field in fields.items())
+
+    def errors(self, data):
+        """Every field error in ``data`` in one pass, keyed by field name."""
+        if not isinstance(data, dict):
+            return {'_schema': 'Expected a JSON object'}
+        errors = {}
+        for name, field in self.fields:
+            error = field.validate(data.get(name))
+            if error is not None:
+                errors[name] = error
+        return errors
+
+    def first_error(self, data):
+        errors = self.errors(data)
+        return next(iter(errors.values())) if errors else None
+
+    def load(self, data):
+        return {name: data.get(name) for name, _ in self.fields}
+
+
+def validate_json(schema):
+    """Validate the JSON body against ``schema`` before the view runs.
+
+    Invalid payloads get a 400 with the first error as ``msg`` and all of
+    them under ``errors``; valid ones are passed to the view as ``data``.
+    Apply it inside ``jwt_required``, so that unauthenticated callers learn
+    nothing about the schema. Works on async views too.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                error = _load(schema, kwargs)
+                return error or await view(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return _load(schema, kwargs) or view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _load(schema, kwargs):
+    # Puts the valid payload in ``kwargs``, or returns the error response.
+    payload = request.get_json(silent=True)
+    errors = schema.errors(payload)
+    if errors:
+        return jsonify({'msg': next(iter(errors.values())), 'errors': errors}), 400
+    kwargs['data'] = schema.load(payload)
+    return None
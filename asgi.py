@@ -0,0 +1,6 @@
+# The app for ASGI servers, e.g. `uvicorn asgi:asgi_app`; gunicorn serves it
+# with SERVER_MODE=asgi (see gunicorn.conf.py). Kept apart from run.py so the
+# WSGI server and the CLI never import the async views.
+from app.asgi import create_asgi_app
+
+asgi_app = create_asgi_app()
@@ -0,0 +1,44 @@
+"""Run the endpoint benchmarks.
+
+    python -m benchmarks --users 10000 --requests 500 --threads 4 \
+        --output bench.json --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.harness import compare, dump_results, load_results, run_suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='users seeded into the database')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent clients (load mode when > 1)')
+    parser.add_argument('--only', action='append', help='run only this endpoint (repeatable)')
+    parser.add_argument('--hash-method', help='override PASSWORD_HASH_METHOD')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--baseline', help='compare against these stored JSON results')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.hash_method:
+        overrides['PASSWORD_HASH_METHOD'] = args.hash_method
+
+    results = run_suite(args.users, args.requests, args.threads, args.only, **overrides)
+    if args.output:
+        dump_results(results, args.output)
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            sys.stderr.write('REGRESSION %s\n' % regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Compare the sync (WSGI) and async (ASGI) serving modes under concurrent load.
+
+    python -m benchmarks.concurrency --concurrency 200 --threads 4 --db-latency-ms 5
+
+Both modes are driven in-process through their ASGI callables, with
+``--concurrency`` requests in flight. The sync mode runs every request on
+one of ``--threads`` threads, like a gthread worker; the async mode runs
+the async views on the event loop and the rest on the same threads.
+SQLite answers in microseconds where a networked MySQL doesn't, so
+``--db-latency-ms`` adds a round trip to every SQL statement in both modes.
+"""
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.harness import bench_app, default_scenarios, percentile
+
+MODES = ('sync', 'async')
+
+
+def slow_connection(latency):
+    """A sqlite3 connection factory that waits ``latency`` seconds per statement."""
+    class SlowCursor(sqlite3.Cursor):
+        def execute(self, *args):
+            time.sleep(latency)
+            return super(SlowCursor, self).execute(*args)
+
+        def executemany(self, *args):
+            time.sleep(latency)
+            return super(SlowCursor, self).executemany(*args)
+
+    class SlowConnection(sqlite3.Connection):
+        def cursor(self, factory=SlowCursor):
+            return super(SlowConnection, self).cursor(factory)
+
+    return SlowConnection
+
+
+class ASGIResponse(object):
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+
+class ASGIClient(object):
+    """The part of Flask's test client the harness scenarios use, over ASGI."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, path, query_string=None, headers=None):
+        return self.request('GET', path, headers=headers, query_string=query_string)
+
+    def post(self, path, json=None, headers=None):
+        return self.request('POST', path, json=json, headers=headers)
+
+    async def request(self, method, path, json=None, headers=None, query_string=None):
+        body = _dumps(json) if json is not None else b''
+        raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        raw_headers += [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in (headers or {}).items()]
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'root_path': '', 'query_string': urlencode(query_string or {}).encode(),
+            'headers': raw_headers, 'server': ('bench', 80), 'client': ('127.0.0.1', 40000),
+        }
+        messages = [{'type': 'http.request', 'body': body}]
+        response = {'status': None, 'body': bytearray()}
+
+        async def receive():
+            return messages.pop() if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            else:
+                response['body'] += message.get('body', b'')
+
+        await self.app(scope, receive, send)
+        return ASGIResponse(response['status'], bytes(response['body']))
+
+
+def _dumps(data):
+    return json.dumps(data).encode()
+
+
+def run_mode(app, mode, scenario, requests=500, concurrency=200, threads=4, base=0, warmup=10):
+    """Drive ``scenario`` in ``mode`` with ``concurrency`` requests in flight."""
+    state = scenario.prepare(app) if scenario.prepare else None
+    return asyncio.run(_drive(app, mode, scenario, state, requests, concurrency, threads, base, warmup))
+
+
+async def _drive(app, mode, scenario, state, requests, concurrency, threads, base, warmup):
+    from asgiref.wsgi import WsgiToAsgi
+    from app.asgi import create_asgi_app
+
+    # asgiref runs WSGI requests on the loop's default executor.
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(threads, thread_name_prefix='bench-%s' % mode)
+    loop.set_default_executor(executor)
+    asgi = create_asgi_app(app) if mode == 'async' else WsgiToAsgi(app)
+    client = ASGIClient(asgi)
+
+    latencies = []
+    errors = [0]
+
+    async def worker(indexes, record):
+        for index in indexes:
+            started = time.perf_counter()
+            response = await scenario.request(client, index, state)
+            if record:
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != scenario.expected_status:
+                    errors[0] += 1
+
+    try:
+        warmups = iter(range(base + requests, base + requests + warmup))
+        await asyncio.gather(*[worker(warmups, False) for _ in range(min(warmup, concurrency))])
+
+        indexes = iter(range(base, base + requests))
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(indexes, True) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    finally:
+        if mode == 'async':
+            await asgi.aclose()
+        executor.shutdown(wait=True)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        },
+    }
+
+
+def run_comparison(users=1000, requests=500, concurrency=200, threads=4, db_latency=0.0, async_pool_size=20,
+                   only=None, modes=MODES):
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    connect_args = {'timeout': 30}
+    if db_latency:
+        connect_args['factory'] = slow_connection(db_latency)
+    overrides = {
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': connect_args, 'pool_size': threads},
+        'METRICS_SLOW_REQUEST_THRESHOLD': None,
+        # aiosqlite defaults to opening a connection, and a thread, per checkout.
+        'SQLALCHEMY_ASYNC_ENGINE_OPTIONS': {'poolclass': AsyncAdaptedQueuePool, 'pool_size': async_pool_size, 'max_overflow': 0},
+    }
+    results = {}
+    with bench_app(users, **overrides) as app:
+        for scenario in default_scenarios(users):
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = {
+                # Distinct request indexes keep registrations unique across modes.
+                mode: run_mode(app, mode, scenario, requests, concurrency, threads, base=offset * 10 ** 6)
+                for offset, mode in enumerate(modes)
+            }
+    return {
+        'meta': {'users': users, 'requests': requests, 'concurrency': concurrency, 'threads': threads,
+                 'db_latency_ms': db_latency * 1000, 'async_pool_size': async_pool_size},
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.concurrency', description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='users seeded into the database')
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per endpoint and mode')
+    parser.add_argument('--concurrency', type=int, default=200, help='requests in flight')
+    parser.add_argument('--threads', type=int, default=4, help='request threads of the sync mode')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='added to every SQL statement')
+    parser.add_argument('--async-pool-size', type=int, default=20, help='connections of the async engine')
+    parser.add_argument('--only', action='append', help='run only this endpoint (repeatable)')
+    parser.add_argument('--mode', action='append', choices=MODES, help='run only this mode (repeatable)')
+    args = parser.parse_args(argv)
+
+    results = run_comparison(args.users, args.requests, args.concurrency, args.threads, args.db_latency_ms / 1000.0,
+                             args.async_pool_size, args.only, tuple(args.mode or MODES))
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import json
+import math
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from config import Config
+
+PASSWORD = 'benchpassword'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, int(math.ceil(fraction * len(sorted_values))) - 1)]
+
+
+class StatementCounter(object):
+    """Counts SQL statements per thread, so concurrent requests don't mix."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = self.count + 1
+
+
+def bench_config(database_uri, smtp_port, **overrides):
+    settings = {
+        'TESTING': False,
+        'SQLALCHEMY_ECHO': False,
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}},
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': smtp_port,
+        'MAIL_USE_SSL': False,
+        'MAIL_USERNAME': None,
+        'MAIL_PASSWORD': None,
+        'MAIL_SUPPRESS_SEND': False,
+        'MAIL_QUEUE_WORKERS': 1,
+        'RATELIMIT_ENABLED': False,
+        'PASSWORD_HASH_METHOD': Config.PASSWORD_HASH_METHOD,
+        'PASSWORD_HASH_WORKERS': 0,
+    }
+    settings.update(overrides)
+    return type('BenchConfig', (Config,), settings)
+
+
+@contextmanager
+def fake_smtp_sink():
+    """Start an in-process SMTP server that accepts and discards mail."""
+    from aiosmtpd.controller import Controller
+
+    class Sink:
+        received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            self.received += 1
+            return '250 OK'
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    handler = Sink()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        yield port, handler
+    finally:
+        controller.stop()
+
+
+@contextmanager
+def bench_app(users=1000, **overrides):
+    """Yield an app backed by a fresh file-backed SQLite database seeded with ``users`` users."""
+    from app import create_app
+    from app.auth.models import User
+    from app.database.context import db
+    from app.lifecycle import shutdown, start_background
+
+    directory = tempfile.mkdtemp(prefix='flask-app-bench-')
+    try:
+        with fake_smtp_sink() as (port, sink):
+            app = create_app(bench_config('sqlite:///' + os.path.join(directory, 'bench.db'), port, **overrides))
+            app.bench_sink = sink
+            with app.app_context():
+                db.create_all()
+                seed_users(db, User, users, app.config['PASSWORD_HASH_METHOD'])
+            # As a serving process would, once the schema exists; the mail
+            # senders poll outbound_email.
+            start_background(app)
+            try:
+                yield app
+            finally:
+                shutdown(app, timeout=5)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def seed_users(db, User, count, method, chunk_size=5000):
+    # One hash shared by every row keeps seeding fast; bulk inserts skip the
+    # model validators on purpose.
+    password = generate_password_hash(PASSWORD, method)
+    for start in range(0, count, chunk_size):
+        db.session.execute(User.__table__.insert(), [seed_row(index, password) for index in range(start, min(count, start + chunk_size))])
+    db.session.commit()
+
+
+def seed_row(index, password):
+    return {
+        'username': 'benchuser%d' % index,
+        'password': password,
+        'firstname': 'Bench',
+        'lastname': 'User',
+        'email': 'bench%d@example.com' % index,
+        'phone': '+1-%010d' % index,
+        'email_verified': False,
+        'phone_verified': False,
+        'is_admin': False,
+        'username_key': 'benchuser%d' % index,
+        'email_key': 'bench%d@example.com' % index,
+        'phone_key': '+1%010d' % index,
+    }
+
+
+class Scenario(object):
+    """One endpoint under test.
+
+    ``request(client, index, state)`` issues request number ``index`` and
+    returns the response; ``prepare(app)`` builds the shared ``state``.
+    """
+
+    def __init__(self, name, request, expected_status, prepare=None):
+        self.name = name
+        self.request = request
+        self.expected_status = expected_status
+        self.prepare = prepare
+
+
+def default_scenarios(users):
+    def register(client, index, state):
+        return client.post('/auth/register', json={
+            'username': 'newuser%d' % index, 'password': PASSWORD, 'email': 'new%d@example.com' % index,
+            'firstname': 'New', 'lastname': 'User', 'phone': '+2-%d' % index})
+
+    def login(client, index, state):
+        return client.post('/auth/login', json={'username': 'benchuser%d' % (index % users), 'password': PASSWORD})
+
+    def prepare_tokens(app):
+        from app.auth.models import User
+        from app.auth.utils import create_token
+        with app.app_context():
+            sample = User.query.order_by(User.id).limit(min(users, 100)).all()
+            return {
+                'confirm': [create_token(user, True, 3600) for user in sample],
+                'access': create_token(sample[0]),
+                'emails': [user.email for user in sample],
+            }
+
+    def confirm_email(client, index, state):
+        tokens = state['confirm']
+        return client.get('/auth/confirm/email', query_string={'token': tokens[index % len(tokens)]})
+
+    def mailman_send(client, index, state):
+        emails = state['emails']
+        return client.post('/mailman/send', headers={'Authorization': 'Bearer ' + state['access']}, json={
+            'to': emails[index % len(emails)], 'subject': 'Bench', 'template_name': 'confirm_email.html',
+            'params': {'confirm_url': 'http://localhost/confirm'}})
+
+    return [
+        Scenario('register', register, 201),
+        Scenario('login', login, 200),
+        Scenario('confirm_email', confirm_email, 200, prepare_tokens),
+        Scenario('mailman_send', mailman_send, 202, prepare_tokens),
+    ]
+
+
+def run_scenario(app, scenario, requests=200, threads=1, warmup=5):
+    """Drive ``scenario`` with ``threads`` clients issuing ``requests`` in total."""
+    from app.database.context import db
+
+    state = scenario.prepare(app) if scenario.prepare else None
+    with app.app_context():
+        engine = db.engine
+
+    latencies = []
+    statements = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // threads)
+
+    with StatementCounter(engine) as counter:
+        def worker(offset):
+            client = app.test_client()
+            for index in range(warmup):
+                scenario.request(client, offset * per_thread + index + 10 ** 6, state)
+            local_latencies, local_statements, local_errors = [], [], 0
+            for index in range(offset * per_thread, (offset + 1) * per_thread):
+                counter.reset()
+                start = time.perf_counter()
+                response = scenario.request(client, index, state)
+                local_latencies.append(time.perf_counter() - start)
+                local_statements.append(counter.count)
+                if response.status_code != scenario.expected_status:
+                    local_errors += 1
+            with lock:
+                latencies.extend(local_latencies)
+                statements.extend(local_statements)
+                errors[0] += local_errors
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'threads': threads,
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        },
+        'statements_per_request': round(sum(statements) / len(statements), 2),
+    }
+
+
+def run_suite(users=1000, requests=200, threads=1, only=None, **overrides):
+    results = {}
+    with bench_app(users, **overrides) as app:
+        for scenario in default_scenarios(users):
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = run_scenario(app, scenario, requests, threads)
+    return {
+        'meta': {'users': users, 'requests': requests, 'threads': threads, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.10):
+    """List regressions of ``current`` against ``baseline`` beyond ``tolerance``."""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append('%s: throughput %.1f rps < baseline %.1f rps' % (name, result['throughput_rps'], base['throughput_rps']))
+        if result['latency_ms']['p95'] > base['latency_ms']['p95'] * (1 + tolerance):
+            regressions.append('%s: p95 %.2f ms > baseline %.2f ms' % (name, result['latency_ms']['p95'], base['latency_ms']['p95']))
+        if result['statements_per_request'] > base['statements_per_request']:
+            regressions.append('%s: %.2f statements/request > baseline %.2f' % (name, result['statements_per_request'], base['statements_per_request']))
+        if result['errors'] > base['errors']:
+            regressions.append('%s: %d errors > baseline %d' % (name, result['errors'], base['errors']))
+    return regressions
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def dump_results(results, path):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
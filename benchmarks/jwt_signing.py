@@ -0,0 +1,65 @@
+"""Measure JWT sign and verify cost per algorithm.
+
+    python -m benchmarks.jwt_signing --iterations 500
+
+Reports microseconds per sign, per verify with the parsed key object that
+KeyRing keeps, and per verify that parses the PEM public key every time.
+"""
+import argparse
+import json
+import sys
+import time
+import timeit
+
+import jwt
+
+from app.auth.keys import generate_private_key
+
+ALGORITHMS = ('HS256', 'RS256', 'EdDSA')
+
+CLAIMS = {'sub': 42, 'jti': '0f8fad5b-d9cb-469f-a165-70867728950e', 'type': 'access', 'fresh': False}
+
+
+def _per_call_us(function, iterations, repeat=3):
+    return round(min(timeit.repeat(function, number=iterations, repeat=repeat)) / iterations * 1e6, 2)
+
+
+def _keys(algorithm):
+    if algorithm == 'HS256':
+        secret = 'bench-secret-' * 4
+        return secret, secret, secret
+    from cryptography.hazmat.primitives import serialization
+    private_key = generate_private_key(algorithm)
+    public_key = private_key.public_key()
+    pem = public_key.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private_key, public_key, pem
+
+
+def measure(iterations=500, algorithms=ALGORITHMS):
+    results = {}
+    for algorithm in algorithms:
+        signing_key, public_key, public_pem = _keys(algorithm)
+        claims = dict(CLAIMS, exp=int(time.time()) + 3600)
+        token = jwt.encode(claims, signing_key, algorithm=algorithm, headers={'kid': 'bench'})
+        results[algorithm] = {
+            'token_bytes': len(token),
+            'sign_us': _per_call_us(lambda: jwt.encode(claims, signing_key, algorithm=algorithm), iterations),
+            'verify_us': _per_call_us(lambda: jwt.decode(token, public_key, algorithms=[algorithm]), iterations),
+            'verify_parsing_key_us': _per_call_us(lambda: jwt.decode(token, public_pem, algorithms=[algorithm]), iterations),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.jwt_signing', description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500, help='operations per measurement')
+    parser.add_argument('--algorithm', action='append', choices=ALGORITHMS, help='measure only this algorithm (repeatable)')
+    args = parser.parse_args(argv)
+
+    json.dump(measure(args.iterations, args.algorithm or ALGORITHMS), sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
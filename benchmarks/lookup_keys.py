@@ -0,0 +1,73 @@
+"""Show how user lookups use the canonical key indexes on a large table.
+
+    python -m benchmarks.lookup_keys --users 200000 --probes 2000
+
+Seeds ``--users`` users into a file-backed SQLite database, then prints the
+query plan and the mean cost of each lookup the app makes, next to the
+``lower(email)`` comparison a case-insensitive match needs without the keys.
+Plans should read ``SEARCH ... USING INDEX`` (or ``COVERING INDEX`` when the
+index holds every selected column), never ``SCAN``.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from benchmarks.harness import bench_app
+
+
+def lookups():
+    from app.auth.models import User, canonical_email, canonical_phone, canonical_username
+    from app.database.context import db
+
+    return {
+        # app.auth.utils.authenticate
+        'username': lambda index: db.select(User).where(User.username_key == canonical_username('BenchUser%d' % index)),
+        # verify_token and mailman.send, through the identity cache
+        'email': lambda index: db.select(User).where(User.email_key == canonical_email('Bench%d@Example.com' % index)),
+        # mailman.send_batch only needs to know the address exists
+        'email_exists': lambda index: db.select(User.email_key).where(User.email_key.in_([canonical_email('BENCH%d@example.com' % index)])),
+        'phone': lambda index: db.select(User).where(User.phone_key == canonical_phone('+1-%010d' % index)),
+        'unindexed_lower_email': lambda index: db.select(User).where(db.func.lower(User.email) == 'bench%d@example.com' % index),
+    }
+
+
+def measure(users=100000, probes=1000, scan_probes=20, seed=0):
+    from app.database.context import db
+
+    rng = random.Random(seed)
+    results = {}
+    with bench_app(users) as app, app.app_context():
+        with db.engine.connect() as connection:
+            for name, statement in lookups().items():
+                sql = str(statement(0).compile(connection, compile_kwargs={'literal_binds': True}))
+                plan = ' / '.join(row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql))
+                # A scan per lookup is slow enough that a few probes tell.
+                indexes = [rng.randrange(users) for _ in range(scan_probes if 'SCAN' in plan else probes)]
+                started = time.perf_counter()
+                found = sum(1 for index in indexes if connection.execute(statement(index)).first() is not None)
+                elapsed = time.perf_counter() - started
+                results[name] = {
+                    'plan': plan,
+                    'uses_index': 'SCAN' not in plan,
+                    'found': found == len(indexes),
+                    'lookup_us': round(elapsed / len(indexes) * 10 ** 6, 2),
+                }
+    return {'meta': {'users': users, 'probes': probes}, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.lookup_keys', description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000, help='users seeded into the database')
+    parser.add_argument('--probes', type=int, default=1000, help='lookups timed per indexed query')
+    args = parser.parse_args(argv)
+
+    results = measure(args.users, args.probes)
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0 if all(result['uses_index'] for name, result in results['results'].items() if not name.startswith('unindexed')) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Compare ``UserRecord`` lookups with loading full ``User`` instances.
+
+    python -m benchmarks.read_model --users 100000 --lookups 100000
+
+Both paths look users up by email key in a seeded, file-backed SQLite
+database, with the identity cache out of the way. ``lookup_us`` is the mean
+cost of one lookup including its session teardown, as in a request;
+``hydrate_us`` the cost of building the result from rows already fetched;
+``bytes_per_user`` what a loaded user keeps alive, measured over a batch
+held in one session (the identity map included for ``User``).
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.harness import bench_app
+
+
+def paths():
+    from app.auth.cache import UserRecord, query_user_record, select_records, users
+    from app.auth.models import User, canonical_email
+    from app.database.context import db
+
+    def orm(email):
+        return User.query.filter_by(email_key=canonical_email(email)).first()
+
+    def record(email):
+        return query_user_record(users.c.email_key == canonical_email(email))
+
+    def orm_batch(emails):
+        return User.query.filter(User.email_key.in_(emails)).all()
+
+    def record_batch(emails):
+        return [UserRecord(*row) for row in db.session.execute(select_records.where(users.c.email_key.in_(emails)))]
+
+    return {'orm': (orm, orm_batch), 'record': (record, record_batch)}
+
+
+def measure(users=100000, lookups=100000, batch=1000, seed=0):
+    from app.database.context import db
+
+    rng = random.Random(seed)
+    emails = ['bench%d@example.com' % rng.randrange(users) for _ in range(lookups)]
+    held = ['bench%d@example.com' % index for index in rng.sample(range(users), min(batch, users))]
+    results = {}
+    with bench_app(users, IDENTITY_CACHE_ENABLED=False) as app, app.app_context():
+        for name, (lookup, load_batch) in paths().items():
+            for email in emails[:100]:
+                lookup(email)
+                db.session.remove()
+
+            started = time.perf_counter()
+            for email in emails:
+                if lookup(email) is None:
+                    raise AssertionError('%s lookup missed %s' % (name, email))
+                db.session.remove()
+            elapsed = time.perf_counter() - started
+
+            # The same rows each round, so the difference is the hydration.
+            load_batch(held)
+            db.session.remove()
+            rounds = max(1, lookups // batch)
+            started = time.perf_counter()
+            for _ in range(rounds):
+                load_batch(held)
+                db.session.remove()
+            hydrated = time.perf_counter() - started
+
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            loaded = load_batch(held)
+            retained = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            del loaded
+            db.session.remove()
+
+            results[name] = {
+                'lookup_us': round(elapsed / lookups * 10 ** 6, 2),
+                'hydrate_us': round(hydrated / (rounds * len(held)) * 10 ** 6, 3),
+                'bytes_per_user': round(retained / len(held)),
+            }
+    return {'meta': {'users': users, 'lookups': lookups, 'batch': len(held)}, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.read_model', description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000, help='users seeded into the database')
+    parser.add_argument('--lookups', type=int, default=100000, help='single-user lookups timed per path')
+    parser.add_argument('--batch', type=int, default=1000, help='users loaded together for the hydration and memory figures')
+    args = parser.parse_args(argv)
+
+    json.dump(measure(args.users, args.lookups, args.batch), sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
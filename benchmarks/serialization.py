@@ -0,0 +1,99 @@
+"""Compare JSON providers and response compression on representative payloads.
+
+    python -m benchmarks.serialization --iterations 200
+
+Reports microseconds per dumps/loads for Flask's stdlib provider and
+app.json_provider.FastJSONProvider, and the size and cost of each
+compression encoding.
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import compression
+from app.json_provider import FastJSONProvider, orjson
+from config import BaseConfig
+
+
+def user_row(index):
+    return {
+        'id': index, 'username': 'benchuser%d' % index, 'firstname': 'Bench', 'lastname': 'User',
+        'email': 'bench%d@example.com' % index, 'phone': '+1-%d' % (5550000 + index),
+        'email_verified': index % 2 == 0, 'phone_verified': index % 3 == 0, 'is_admin': False,
+    }
+
+
+def payloads():
+    """name -> object, shaped like what the endpoints send and receive."""
+    return {
+        'login_response': {'access_token': 'e' * 320},
+        'register_request': {
+            'username': 'benchuser', 'password': 'benchpassword', 'firstname': 'Bench', 'lastname': 'User',
+            'email': 'bench@example.com', 'phone': '+1-5550000',
+        },
+        'validation_error': {'msg': 'No firstname provided', 'errors': {
+            'firstname': 'No firstname provided', 'email': 'Invalid email address, must be in the format [email]@[domain]',
+        }},
+        'users_page_1000': {'users': [user_row(index) for index in range(1, 1001)], 'next_after': 1000},
+        'send_batch_500': [{'to': 'bench%d@example.com' % index, 'status': 'sent'} for index in range(500)],
+    }
+
+
+def _per_call_us(function, iterations, repeat=3):
+    return round(min(timeit.repeat(function, number=iterations, repeat=repeat)) / iterations * 1e6, 2)
+
+
+def measure_providers(iterations=200):
+    app = Flask('benchmarks')
+    providers = {'stdlib': DefaultJSONProvider(app), 'fast': FastJSONProvider(app)}
+    results = {}
+    for name, payload in sorted(payloads().items()):
+        text = json.dumps(payload)
+        results[name] = {}
+        for label, provider in sorted(providers.items()):
+            results[name][label] = {
+                'dumps_us': _per_call_us(lambda: provider.dumps(payload), iterations),
+                'loads_us': _per_call_us(lambda: provider.loads(text), iterations),
+            }
+    return results
+
+
+def measure_compression(iterations=50):
+    config = {key: getattr(BaseConfig, key) for key in dir(BaseConfig) if key.startswith('COMPRESS_')}
+    classes = [compression.GzipCompressor]
+    if compression.brotli is not None:
+        classes.append(compression.BrotliCompressor)
+    results = {}
+    for name, payload in sorted(payloads().items()):
+        data = json.dumps(payload).encode()
+        results[name] = {'identity_bytes': len(data)}
+        for cls in classes:
+            def compress():
+                compressor = cls(config)
+                return compressor.compress(data) + compressor.finish()
+            results[name][cls.encoding] = {'bytes': len(compress()), 'us': _per_call_us(compress, iterations)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.serialization', description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200, help='calls per measurement')
+    args = parser.parse_args(argv)
+
+    result = {
+        'orjson': orjson is not None,
+        'brotli': compression.brotli is not None,
+        'providers': measure_providers(args.iterations),
+        'compression': measure_compression(max(1, args.iterations // 4)),
+    }
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
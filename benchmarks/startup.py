@@ -0,0 +1,108 @@
+"""Measure cold-start cost: import time and app factory time.
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+
+Each run uses a fresh interpreter. Exits 1 when the median of any
+measurement exceeds its budget.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a CI runner; the app's own modules are what we control.
+BUDGETS_MS = {
+    'import_ms': 1500.0,
+    'app_import_ms': 100.0,
+    'factory_ms': 300.0,
+}
+
+FACTORY_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.extensions['mail_queue'].stop()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'factory_ms': (created - imported) * 1000}))
+'''
+
+
+def parse_importtime(output):
+    """Map module name to ``(self_us, cumulative_us)`` from ``-X importtime`` output."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def is_app_module(name):
+    return name in ('app', 'config') or name.startswith('app.')
+
+
+def measure_once(python=sys.executable):
+    completed = subprocess.run(
+        [python, '-X', 'importtime', '-c', FACTORY_SCRIPT],
+        # The testing profile, unless APP_ENV picks another.
+        cwd=ROOT, env=dict(os.environ, APP_ENV=os.environ.get('APP_ENV', 'testing')),
+        capture_output=True, text=True, check=True)
+    modules = parse_importtime(completed.stderr)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['app_import_ms'] = sum(own for name, (own, _) in modules.items() if is_app_module(name)) / 1000.0
+    result['modules'] = modules
+    return result
+
+
+def measure(runs=5, top=15, python=sys.executable):
+    samples = [measure_once(python) for _ in range(runs)]
+    result = {}
+    for key in BUDGETS_MS:
+        values = sorted(sample[key] for sample in samples)
+        result[key] = round(values[len(values) // 2], 2)
+    # Slowest modules by their own import time, from the last run.
+    modules = samples[-1]['modules']
+    result['slowest_modules_ms'] = [
+        [name, round(own / 1000.0, 2)]
+        for name, (own, _) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    ]
+    return result
+
+
+def check_budget(result, budgets=BUDGETS_MS):
+    return ['%s: %.1f ms > budget %.1f ms' % (key, result[key], budget)
+            for key, budget in sorted(budgets.items()) if result[key] > budget]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup', description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to measure')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to report')
+    parser.add_argument('--output', help='write JSON results to this file')
+    for key, budget in sorted(BUDGETS_MS.items()):
+        parser.add_argument('--%s-budget' % key.replace('_', '-'), type=float, default=budget, dest=key,
+                            help='budget for %s (default %s)' % (key, budget))
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs, args.top)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(result, output_file, indent=2, sort_keys=True)
+            output_file.write('\n')
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+    violations = check_budget(result, {key: getattr(args, key) for key in BUDGETS_MS})
+    for violation in violations:
+        sys.stderr.write('OVER BUDGET %s\n' % violation)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Measure request validation cost.
+
+    python -m benchmarks.validation --iterations 20000 --requests 500
+
+Reports microseconds per schema check for valid and invalid payloads, and
+the latency and SQL statement count of a rejected /auth/register request.
+"""
+import argparse
+import json
+import sys
+import time
+import timeit
+
+from app.auth.schemas import login_schema, register_schema
+from app.database.context import db
+from app.mailman.schemas import send_batch_schema
+from benchmarks.harness import StatementCounter, bench_app, percentile
+
+VALID_REGISTER = {
+    'username': 'benchuser', 'password': 'benchpassword', 'firstname': 'Bench', 'lastname': 'User',
+    'email': 'bench@example.com', 'phone': '+1-5550000',
+}
+# Every field wrong, so every rule runs and every error is collected.
+INVALID_REGISTER = {
+    'username': 'usr', 'password': 'short', 'firstname': 'B', 'lastname': 'U',
+    'email': 'not-an-email', 'phone': '5550000',
+}
+
+CASES = {
+    'register_valid': (register_schema, VALID_REGISTER),
+    'register_invalid': (register_schema, INVALID_REGISTER),
+    'login_valid': (login_schema, {'username': 'benchuser', 'password': 'benchpassword'}),
+    'login_missing': (login_schema, {}),
+    'send_batch_100': (send_batch_schema, {
+        'subject': 'Hello', 'template_name': 'confirm_email.html',
+        'recipients': [{'to': 'user%d@example.com' % index, 'params': {}} for index in range(100)],
+    }),
+}
+
+
+def measure_schemas(iterations=20000, repeat=3):
+    """Best-of-``repeat`` microseconds per ``Schema.errors`` call for each case."""
+    results = {}
+    for name, (schema, payload) in sorted(CASES.items()):
+        best = min(timeit.repeat(lambda: schema.errors(payload), number=iterations, repeat=repeat))
+        results[name] = round(best / iterations * 1e6, 3)
+    return results
+
+
+def measure_rejected_requests(requests=500):
+    """Latency and statements per request for invalid /auth/register posts."""
+    with bench_app(users=0, RATELIMIT_ENABLED=False) as app:
+        client = app.test_client()
+        latencies = []
+        with app.app_context():
+            engine = db.engine
+        with StatementCounter(engine) as counter:
+            counter.reset()
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.post('/auth/register', json=INVALID_REGISTER)
+                latencies.append((time.perf_counter() - started) * 1e6)
+                assert response.status_code == 400, response.status_code
+            statements = counter.count
+    latencies.sort()
+    return {
+        'requests': requests,
+        'statements_per_request': statements / float(requests),
+        'latency_us': {'p50': round(percentile(latencies, 0.50), 1), 'p99': round(percentile(latencies, 0.99), 1)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.validation', description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000, help='schema checks per case')
+    parser.add_argument('--requests', type=int, default=500, help='rejected register requests')
+    args = parser.parse_args(argv)
+
+    result = {
+        'schema_us': measure_schemas(args.iterations),
+        'rejected_register': measure_rejected_requests(args.requests),
+    }
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
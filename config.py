@@ -1,7 +1,29 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv("test.env")
+_required = object()
+
+
+class env(object):
+    """A setting read from the environment when an app is created rather
+    than when this module is imported; ``cast`` converts the raw string."""
+
+    def __init__(self, name, default=_required, cast=None):
+        self.name = name
+        self.default = default
+        self.cast = cast
+
+    def resolve(self, environ):
+        if self.name not in environ:
+            if self.default is _required:
+                raise RuntimeError("Environment variable %s is not set" % self.name)
+            return self.default
+        value = environ[self.name]
+        return self.cast(value) if self.cast else value
+
+
+def _split(value):
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
 
 class BaseConfig(object):
     MAIL_DEFAULT_SENDER = "noreply@flask.com"
@@ -10,23 +32,175 @@ class BaseConfig(object):
     MAIL_USE_TLS = False
     MAIL_USE_SSL = True
     MAIL_DEBUG = False
-    MAIL_USERNAME = os.environ["EMAIL_USER"]
-    MAIL_PASSWORD = os.environ["EMAIL_PASSWORD"]
-    JWT_SECRET_KEY = os.environ["JWT_SECRET_KEY"]
+    MAIL_USERNAME = env("EMAIL_USER")
+    MAIL_PASSWORD = env("EMAIL_PASSWORD")
+    MAIL_TEMPLATE_CACHE_SIZE = 64
+    MAIL_TEMPLATE_PRECOMPILE = True
+    MAIL_POOL_SIZE = 4
+    MAIL_POOL_IDLE_TIMEOUT = 60
+    MAIL_QUEUE_WORKERS = 2
+    MAIL_QUEUE_BATCH_SIZE = 20
+    MAIL_QUEUE_POLL_INTERVAL = 2.0
+    MAIL_QUEUE_MAX_ATTEMPTS = 5
+    MAIL_QUEUE_RETRY_BACKOFF = 30
+    MAIL_QUEUE_LEASE_TIMEOUT = 300
+    MAILMAN_BATCH_CHUNK_SIZE = 500
+    ADMIN_USERS_PAGE_MAX = 1000
+    ADMIN_USERS_EXPORT_BATCH_SIZE = 1000
+    JWT_SECRET_KEY = env("JWT_SECRET_KEY")
+    JWT_ALGORITHM = env("JWT_ALGORITHM", "HS256")
+    JWT_KEYS_DIR = env("JWT_KEYS_DIR", None)
+    JWT_ACTIVE_KEY_ID = env("JWT_ACTIVE_KEY_ID", None)
+    JWT_JWKS_MAX_AGE = 300
     JWT_ACCESS_TOKEN_EXPIRES = 3600
+    JWT_REGISTRATION_TOKEN_EXPIRES = 3600
+    JWT_REVOCATION_ENABLED = True
+    JWT_REVOCATION_REFRESH_INTERVAL = 5
+    JWT_REVOCATION_REFRESH_LOOKBACK = 30
+    JWT_REVOCATION_PURGE_INTERVAL = 300
+    IDENTITY_CACHE_ENABLED = True
+    IDENTITY_CACHE_SIZE = 1024
+    IDENTITY_CACHE_TTL = 60
+    IDEMPOTENCY_ENABLED = True
+    IDEMPOTENCY_TTL = 86400
+    IDEMPOTENCY_CACHE_SIZE = 10000
+    IDEMPOTENCY_WAIT_TIMEOUT = 30
+    IDEMPOTENCY_LOCK_TIMEOUT = 60
+    IDEMPOTENCY_POLL_INTERVAL = 0.05
+    IDEMPOTENCY_PURGE_INTERVAL = 300
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    METRICS_ENABLED = True
+    # /metrics answers requests bearing this token or coming from these
+    # networks; loopback only unless configured.
+    METRICS_TOKEN = env("METRICS_TOKEN", None)
+    METRICS_ALLOWED_NETWORKS = env("METRICS_ALLOWED_NETWORKS", ("127.0.0.1", "::1"), _split)
+    # Seconds after which a request logs its queries; off unless set.
+    METRICS_SLOW_REQUEST_THRESHOLD = env("METRICS_SLOW_REQUEST_THRESHOLD", None, float)
+    METRICS_SLOW_REQUEST_SAMPLE_RATE = 1.0
+    METRICS_SLOW_REQUEST_MAX_QUERIES = 100
     SESSION_TYPE = "SqlAlchemy"
-    SESSION_SQLALCHEMY_TABLE = "sessions"
-    SECRET_KEY = os.environ["SECRET_KEY"]
-    SECURITY_PASSWORD_SALT = os.environ["SECURITY_PASSWORD_SALT"]
+    SESSION_CACHE_SIZE = 4096
+    SESSION_CACHE_TTL = 30
+    SESSION_REFRESH_THRESHOLD = 300
+    SESSION_SWEEP_INTERVAL = 300
+    SESSION_SWEEP_BATCH_SIZE = 500
+    SECRET_KEY = env("SECRET_KEY")
+    SECURITY_PASSWORD_SALT = env("SECURITY_PASSWORD_SALT")
     SECURITY_PASSWORD_HASH = "sha512_crypt"
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:260000"
+    PASSWORD_HASH_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = env("PASSWORD_HASH_WORKERS", os.cpu_count() or 1, int)
+    PASSWORD_HASH_MAX_PENDING = 32
+    PASSWORD_HASH_TIMEOUT = 10
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE_PATH = None
+    RATELIMIT_MAX_KEYS = 100000
+    RATELIMIT_AUTH_PER_IP = (60, 60)
+    RATELIMIT_LOGIN_PER_USERNAME = (10, 300)
+    LOGIN_MAX_CONCURRENT_VERIFICATIONS = 8
+    COMPRESS_ENABLED = False
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+    COMPRESS_ALGORITHMS = ("br", "gzip")
+    COMPRESS_MIMETYPES = ("application/json", "application/x-ndjson", "text/csv", "text/html", "text/plain")
 
     
 class Config(BaseConfig):
     """Test config."""
+    DOTENV_FILE = "test.env"
     FLASK_DEBUG = True
-    SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ECHO = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     FRONTEND_URL = "http://localhost:3000"
+    MAIL_QUEUE_WORKERS = 0
+    SESSION_SWEEP_INTERVAL = 0
+    JWT_REVOCATION_REFRESH_INTERVAL = 0
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    PASSWORD_HASH_WORKERS = 0
     TESTING = True
-    WTF_CSRF_ENABLED = False
\ No newline at end of file
+    WTF_CSRF_ENABLED = False
+
+
+def _replica_binds(url, engine_options=None):
+    # SQLALCHEMY_ENGINE_OPTIONS only covers the default bind, so the replica
+    # carries its own copy.
+    if not url:
+        return {}
+    return {"replica": dict(engine_options or {}, url=url)}
+
+
+# Recycle well before MySQL's wait_timeout drops idle connections, and ping
+# on checkout so a failover doesn't surface as a failed request.
+_pooled_engine_options = {
+    "pool_size": env("DATABASE_POOL_SIZE", 10, int),
+    "max_overflow": env("DATABASE_MAX_OVERFLOW", 20, int),
+    "pool_timeout": env("DATABASE_POOL_TIMEOUT", 10, int),
+    "pool_recycle": env("DATABASE_POOL_RECYCLE", 1800, int),
+    "pool_pre_ping": True,
+}
+
+
+class DevelopmentConfig(BaseConfig):
+    """Local development against a SQLite file."""
+    DOTENV_FILE = "test.env"
+    FLASK_DEBUG = True
+    SQLALCHEMY_DATABASE_URI = env("DATABASE_URL", "sqlite:///dev.db")
+    SQLALCHEMY_BINDS = env("DATABASE_REPLICA_URL", {}, _replica_binds)
+    FRONTEND_URL = env("FRONTEND_URL", "http://localhost:3000")
+    PASSWORD_HASH_WORKERS = 0
+    METRICS_SLOW_REQUEST_THRESHOLD = env("METRICS_SLOW_REQUEST_THRESHOLD", 1.0, float)
+
+
+class ProductionConfig(BaseConfig):
+    """MySQL primary with an optional read replica."""
+    FLASK_DEBUG = False
+    SQLALCHEMY_ECHO = False
+    SQLALCHEMY_DATABASE_URI = env("DATABASE_URL")
+    SQLALCHEMY_ENGINE_OPTIONS = _pooled_engine_options
+    SQLALCHEMY_BINDS = env("DATABASE_REPLICA_URL", {}, lambda url: _replica_binds(url, _pooled_engine_options))
+    # One connection per in-flight async view rather than per thread.
+    SQLALCHEMY_ASYNC_ENGINE_OPTIONS = {
+        "pool_size": env("DATABASE_ASYNC_POOL_SIZE", 20, int),
+        "max_overflow": env("DATABASE_ASYNC_MAX_OVERFLOW", 40, int),
+    }
+    FRONTEND_URL = env("FRONTEND_URL")
+
+
+configs = {
+    "development": DevelopmentConfig,
+    "production": ProductionConfig,
+    "testing": Config,
+}
+
+
+def get_config(name=None):
+    """Return the config class named by ``name`` or the ``APP_ENV`` variable,
+    which defaults to production so that a missing variable fails closed."""
+    name = name or os.environ.get("APP_ENV", "production")
+    try:
+        return configs[name]
+    except KeyError:
+        raise ValueError("Unknown APP_ENV %r, expected one of %s" % (name, ", ".join(sorted(configs))))
+
+
+def configure(app, config=None):
+    """Load ``config``, or the profile named by ``APP_ENV``, into ``app.config``
+    and fill in the settings it reads from the environment, after the
+    profile's ``DOTENV_FILE`` if it has one."""
+    config = config or get_config()
+    dotenv_file = getattr(config, "DOTENV_FILE", None)
+    if dotenv_file:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_file)
+    app.config.from_object(config)
+    for key, value in list(app.config.items()):
+        app.config[key] = _resolve(value, os.environ)
+
+
+def _resolve(value, environ):
+    if isinstance(value, env):
+        return _resolve(value.resolve(environ), environ)
+    if isinstance(value, dict):
+        return {key: _resolve(item, environ) for key, item in value.items()}
+    return value
@@ -0,0 +1,63 @@
+# Gunicorn settings for `gunicorn run:app`, picked up from the working
+# directory. The app is built once in the master (preload_app) and forked;
+# every worker then drops the inherited connections, starts the mail
+# senders and warms its pools before it accepts a request.
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Password hashing runs in a process pool per worker, so a worker per core
+# keeps the CPU busy; threads cover requests waiting on MySQL and SMTP.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+wsgi_app = "run:app"
+
+# SERVER_MODE=asgi serves asgi:asgi_app from uvicorn workers instead: the
+# async auth and mailman views wait on the database on the event loop, so
+# a worker's concurrency is bounded by sockets rather than threads. Other
+# routes run on the loop's thread pool.
+if os.environ.get("SERVER_MODE", "wsgi") == "asgi":
+    worker_class = "uvicorn.workers.UvicornWorker"
+    wsgi_app = "asgi:asgi_app"
+
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# On SIGTERM or SIGHUP a worker stops accepting and gets this long to finish
+# in-flight requests and its current mail batch.
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Read by config.py when the app is preloaded: one DB connection per request
+# thread and the cores shared between the workers' hashing pools.
+os.environ.setdefault("DATABASE_POOL_SIZE", str(threads))
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+
+def _flask_app(application):
+    # The Flask app behind asgi:asgi_app, or run:app itself.
+    app = application.wsgi()
+    return getattr(app, "flask_app", app)
+
+
+def when_ready(server):
+    from app.lifecycle import before_fork
+    before_fork(_flask_app(server.app))
+
+
+def post_fork(server, worker):
+    from app.lifecycle import after_fork
+    after_fork(_flask_app(worker.app))
+
+
+def post_worker_init(worker):
+    from app.lifecycle import warm_up
+    warm_up(_flask_app(worker.app), threads)
+
+
+def worker_exit(server, worker):
+    from app.lifecycle import shutdown
+    shutdown(_flask_app(worker.app), graceful_timeout)
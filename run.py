@@ -1,13 +1,19 @@
 from app import create_app
 from app import db
+from app.lifecycle import start_background
 
-# Create the Flask application instance
+# Create the Flask application instance; production serves it with
+# `gunicorn run:app` (see gunicorn.conf.py), ASGI servers with asgi.py
 app = create_app()
 
 if __name__ == "__main__":
     # Create the database tables
     with app.app_context():
         db.create_all()
-    
-    # Run the application
+
+    # Mail senders and the other background threads; gunicorn starts them
+    # in each worker instead
+    start_background(app)
+
+    # Run the development server
     app.run()   
\ No newline at end of file
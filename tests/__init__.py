@@ -0,0 +1,4 @@
+import os
+
+# Tests run against the in-memory testing profile unless told otherwise.
+os.environ.setdefault('APP_ENV', 'testing')
@@ -0,0 +1,41 @@
+import socket
+from aiosmtpd.controller import Controller
+from config import Config
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.envelopes = []
+        self.peers = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        self.peers.append(session.peer)
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_smtp_server(port):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    return controller, handler
+
+
+def smtp_test_config(port, **overrides):
+    settings = {
+        'SQLALCHEMY_ECHO': False,
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': port,
+        'MAIL_USE_SSL': False,
+        'MAIL_USERNAME': None,
+        'MAIL_PASSWORD': None,
+        'MAIL_SUPPRESS_SEND': False,
+    }
+    settings.update(overrides)
+    return type('SMTPTestConfig', (Config,), settings)
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy.engine import make_url
+
+from app import create_app
+from app.asgi import create_asgi_app
+from app.auth.models import User
+from app.auth.utils import create_token
+from app.database.aio import async_url
+from app.database.context import db
+from app.mailman.models import OutboundEmail
+from config import Config
+
+PASSWORD = 'Testpassword1!'
+
+
+class AsyncAppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # The async engine needs a database it can share with the sync one.
+        config = type('AsyncConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.directory, 'app.db')})
+        self.app = create_app(config)
+        self.asgi = create_asgi_app(self.app)
+        self.loop = asyncio.new_event_loop()
+        with self.app.app_context():
+            db.create_all()
+            self.user = User(username='testuser', password=PASSWORD, firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067')
+            self.user.save()
+            self.token = create_token(self.user)
+            self.confirm_token = create_token(self.user, for_registration=True, expires_delta=60)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.asgi.aclose())
+        self.loop.close()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def request(self, method, path, body=None, token=None, query_string=b'', headers=()):
+        headers = [(b'content-type', b'application/json')] + list(headers)
+        if token:
+            headers.append((b'authorization', b'Bearer ' + token.encode()))
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string, 'headers': headers,
+                 'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000)}
+        messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+        response = {'body': b''}
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = dict(message['headers'])
+            else:
+                response['body'] += message.get('body', b'')
+
+        await self.asgi(scope, receive, send)
+        return response['status'], json.loads(response['body']) if response['body'].startswith(b'{') else response['body']
+
+    def call(self, *args, **kwargs):
+        return self.loop.run_until_complete(self.request(*args, **kwargs))
+
+    def test_async_views_are_registered(self):
+        self.assertEqual(set(self.asgi.views), {'auth.login', 'auth.register', 'auth.confirm_email', 'mailman.send'})
+
+    def test_register_and_login(self):
+        payload = {'username': 'newuser', 'password': PASSWORD, 'firstname': 'New', 'lastname': 'User',
+                   'email': 'new@example.com', 'phone': '+91-7737713068'}
+
+        self.assertEqual(self.call('POST', '/auth/register', payload), (201, {'msg': 'Verification email sent'}))
+        self.assertEqual(self.call('POST', '/auth/register', payload), (400, {'msg': 'Username is already in use'}))
+        status, body = self.call('POST', '/auth/login', {'username': 'newuser', 'password': PASSWORD})
+        self.assertEqual(status, 200)
+        self.assertIn('access_token', body)
+        self.assertEqual(self.call('POST', '/auth/login', {'username': 'newuser', 'password': 'Wrong-password1'})[0], 401)
+
+        with self.app.app_context():
+            user = User.query.filter_by(username='newuser').one()
+            self.assertTrue(user.check_password(PASSWORD))
+            self.assertEqual([message.recipient for message in OutboundEmail.query], ['new@example.com'])
+
+    def test_idempotency_keys(self):
+        payload = {'username': 'newuser', 'password': PASSWORD, 'firstname': 'New', 'lastname': 'User',
+                   'email': 'new@example.com', 'phone': '+91-7737713068'}
+        key = [(b'idempotency-key', b'register-1')]
+        send = {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'x'}}
+
+        async def duplicates(*args, **kwargs):
+            return await asyncio.gather(*[self.request(*args, **kwargs) for _ in range(3)])
+
+        registrations = self.loop.run_until_complete(duplicates('POST', '/auth/register', payload, headers=key))
+        sends = self.loop.run_until_complete(duplicates('POST', '/mailman/send', send, token=self.token, headers=key))
+
+        self.assertEqual(registrations, [(201, {'msg': 'Verification email sent'})] * 3)
+        self.assertEqual(sends, [(202, {'msg': 'Email queued'})] * 3)
+        with self.app.app_context():
+            self.assertEqual(sorted(message.recipient for message in OutboundEmail.query), ['new@example.com', 'test@example.com'])
+
+    def test_invalid_bodies_are_rejected_before_any_work(self):
+        status, body = self.call('POST', '/auth/login', {'username': 'testuser'})
+        self.assertEqual(status, 400)
+        self.assertEqual(body['msg'], 'Missing username or password')
+
+    def test_confirm_email_invalidates_cached_user(self):
+        self.assertEqual(self.call('POST', '/mailman/send', {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'x'}}, token=self.token)[0], 202)
+        self.assertIsNotNone(self.app.extensions['identity_cache'].cached(self.user.id))
+
+        status, _ = self.call('GET', '/auth/confirm/email', query_string=b'token=' + self.confirm_token.encode())
+
+        self.assertEqual(status, 200)
+        self.assertIsNone(self.app.extensions['identity_cache'].cached(self.user.id))
+        with self.app.app_context():
+            self.assertTrue(db.session.get(User, self.user.id).email_verified)
+        self.assertEqual(self.call('GET', '/auth/confirm/email', query_string=b'token=bad')[0], 401)
+
+    def test_mailman_send_checks_the_token_like_jwt_required(self):
+        payload = {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'x'}}
+
+        self.assertEqual(self.call('POST', '/mailman/send', payload), (401, {'msg': 'Missing Authorization Header'}))
+        self.assertEqual(self.call('POST', '/mailman/send', {}), (401, {'msg': 'Missing Authorization Header'}))
+        self.assertEqual(self.call('POST', '/mailman/send', {}, token=self.token)[0], 400)
+        self.assertEqual(self.call('POST', '/mailman/send', dict(payload, template_name='../../config.py'), token=self.token), (400, {'msg': 'Unknown template_name'}))
+        self.assertEqual(self.call('POST', '/mailman/send', dict(payload, params={'to': 'x', 'subject': 'x', 'template_name': 'x'}), token=self.token)[0], 202)
+        self.assertEqual(self.call('POST', '/mailman/send', payload, token='not-a-jwt')[0], 422)
+        self.assertEqual(self.call('POST', '/mailman/send', dict(payload, to='nobody@example.com'), token=self.token), (400, {'msg': 'User does not exist'}))
+
+        self.assertEqual(self.call('POST', '/mailman/send', payload, token=self.confirm_token)[0], 401)
+
+        with self.app.app_context():
+            self.app.extensions['token_revocations'].revoke_subjects([self.user.id])
+        self.assertEqual(self.call('POST', '/mailman/send', payload, token=self.token), (401, {'msg': 'Token has been revoked'}))
+
+    def test_other_routes_fall_back_to_flask(self):
+        self.assertEqual(self.call('GET', '/auth/users', token=self.token), (403, {'msg': 'Admin access required'}))
+        self.assertEqual(self.call('GET', '/mailman/'), (200, {'msg': 'Welcome to the email service'}))
+        self.assertEqual(self.call('GET', '/missing')[0], 404)
+
+    def test_requests_overlap_on_one_loop(self):
+        async def logins():
+            return await asyncio.gather(*[self.request('POST', '/auth/login', {'username': 'testuser', 'password': PASSWORD}) for _ in range(8)])
+
+        self.assertEqual([status for status, _ in self.loop.run_until_complete(logins())], [200] * 8)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(self.asgi({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class AsyncURLTestCase(unittest.TestCase):
+    def test_swaps_in_async_drivers(self):
+        self.assertEqual(async_url(make_url('sqlite:////tmp/app.db')).drivername, 'sqlite+aiosqlite')
+        self.assertEqual(async_url(make_url('mysql://user:secret@db/app')).render_as_string(hide_password=False),
+                         'mysql+aiomysql://user:secret@db/app')
+        self.assertEqual(async_url(make_url('mysql+aiomysql://db/app')).drivername, 'mysql+aiomysql')
+        with self.assertRaises(ValueError):
+            async_url(make_url('oracle://db/app'))
+
+
+if __name__ == '__main__':
+    unittest.main()
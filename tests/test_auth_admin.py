@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import unittest
+from flask_testing import TestCase
+from app.database.context import db
+from app.auth.models import User
+from app.auth.utils import create_token, select_users
+from app import create_app
+
+
+class AdminUsersTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        db.create_all()
+        admin = User(username='adminuser', password='testpassword', firstname='Admin', lastname='User', email='admin@example.com', phone='+91-7737713000', is_admin=True)
+        admin.save()
+        for index in range(1, 6):
+            User(username='testuser%d' % index, password='testpassword', firstname='Test', lastname='User',
+                 email='test%d@example.com' % index, phone='+91-77377130%02d' % index,
+                 email_verified=index % 2 == 0, phone_verified=index > 3).save()
+        regular = User.query.filter_by(username='testuser1').one()
+        self.admin_headers = {'Authorization': 'Bearer ' + create_token(admin)}
+        self.user_headers = {'Authorization': 'Bearer ' + create_token(regular)}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_listing_requires_admin(self):
+        self.assertEqual(self.client.get('/auth/users').status_code, 401)
+        self.assertEqual(self.client.get('/auth/users', headers=self.user_headers).status_code, 403)
+        self.assertEqual(self.client.get('/auth/users/export', headers=self.user_headers).status_code, 403)
+
+    def test_listing_pages_by_id(self):
+        seen = []
+        after = None
+        while True:
+            response = self.client.get('/auth/users', headers=self.admin_headers, query_string={'limit': 2, 'after': after} if after else {'limit': 2})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(user['username'] for user in response.json['users'])
+            after = response.json['next_after']
+            if after is None:
+                break
+
+        self.assertEqual(seen, ['adminuser'] + ['testuser%d' % index for index in range(1, 6)])
+        self.assertNotIn('password', response.json['users'][0])
+
+    def test_listing_filters(self):
+        response = self.client.get('/auth/users', headers=self.admin_headers, query_string={'email_verified': 'true', 'phone_verified': 'false'})
+
+        self.assertEqual([user['username'] for user in response.json['users']], ['testuser2'])
+        self.assertEqual(self.client.get('/auth/users', headers=self.admin_headers, query_string={'email_verified': 'maybe'}).status_code, 400)
+
+    def test_export_ndjson(self):
+        response = self.client.get('/auth/users/export', headers=self.admin_headers, query_string={'phone_verified': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['testuser4', 'testuser5'])
+        self.assertTrue(all('password' not in row for row in rows))
+
+    def test_export_csv_streams_in_batches(self):
+        self.app.config['ADMIN_USERS_EXPORT_BATCH_SIZE'] = 2
+        response = self.client.get('/auth/users/export', headers=self.admin_headers, query_string={'format': 'csv'}, buffered=False)
+
+        chunks = list(response.response)
+        rows = list(csv.DictReader(io.StringIO(''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks))))
+        self.assertEqual(len(rows), 6)
+        self.assertNotIn('password', rows[0])
+        self.assertEqual(rows[0]['username'], 'adminuser')
+        self.assertGreaterEqual(len(chunks), 3)
+
+    def test_every_filter_uses_an_index(self):
+        filters = [{}, {'email_verified': True}, {'phone_verified': False}, {'email_verified': False, 'phone_verified': True}]
+        for after_id in (None, 3):
+            for kwargs in filters:
+                query = select_users(after_id, **kwargs).limit(10)
+                compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+                plan = ' '.join(row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN %s' % compiled)))
+                self.assertNotIn('TEMP B-TREE', plan, plan)
+                if len(kwargs) == 2:
+                    self.assertIn('INDEX ix_user_verified_id', plan, plan)
+                elif kwargs:
+                    self.assertIn('INDEX ix_user_%s_id' % list(kwargs)[0], plan, plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
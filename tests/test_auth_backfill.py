@@ -0,0 +1,74 @@
+import unittest
+from flask_testing import TestCase
+from sqlalchemy import Column, MetaData, Table, inspect
+from app.database.context import db
+from app.auth.backfill import KEY_INDEXES, backfill_keys
+from app.auth.models import User
+from app import create_app
+
+KEY_COLUMNS = ('username_key', 'email_key', 'phone_key')
+
+
+class BackfillKeysTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        # The user table as an older release created it, without the keys.
+        metadata = MetaData()
+        self.legacy = Table('user', metadata, *[Column(column.name, column.type, primary_key=column.primary_key)
+                                              for column in User.__table__.columns if column.name not in KEY_COLUMNS])
+        metadata.create_all(db.engine)
+        rows = [
+            {'username': 'FirstUser', 'email': 'First@Example.com', 'phone': '+91-7737713061'},
+            {'username': 'seconduser', 'email': 'second@example.com', 'phone': '+91-7737713062'},
+            {'username': 'ThirdUser', 'email': 'FIRST@example.com', 'phone': '+91-7737713063'},
+        ]
+        with db.engine.begin() as connection:
+            connection.execute(self.legacy.insert(), [
+                dict(row, password='x', firstname='Test', lastname='User', email_verified=False, phone_verified=False, is_admin=False)
+                for row in rows])
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def keys(self):
+        return db.session.execute(db.select(User.id, User.username_key, User.email_key, User.phone_key).order_by(User.id)).all()
+
+    def test_adds_columns_and_fills_them_in_batches(self):
+        batches = []
+
+        stats = backfill_keys(batch_size=2, progress=lambda stats: batches.append(stats.scanned))
+
+        self.assertEqual(stats.added_columns, list(KEY_COLUMNS))
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(self.keys(), [
+            (1, 'firstuser', 'first@example.com', '+917737713061'),
+            (2, 'seconduser', 'second@example.com', '+917737713062'),
+            (3, 'thirduser', None, '+917737713063'),
+        ])
+        self.assertEqual(stats.conflicts, [(3, 'email', 'FIRST@example.com', 1)])
+        indexes = {index['name']: index['unique'] for index in inspect(db.engine).get_indexes('user')}
+        self.assertTrue(all(indexes[name] for name in KEY_INDEXES))
+
+    def test_rerun_only_retries_the_conflicts(self):
+        backfill_keys()
+        with db.engine.begin() as connection:
+            connection.execute(self.legacy.update().where(self.legacy.c.id == 3).values(email='third@example.com'))
+
+        stats = backfill_keys()
+
+        self.assertEqual((stats.added_columns, stats.scanned, stats.conflicts), ([], 1, []))
+        self.assertEqual(self.keys()[2], (3, 'thirduser', 'third@example.com', '+917737713063'))
+
+    def test_command(self):
+        result = self.app.test_cli_runner(mix_stderr=False).invoke(args=['users', 'backfill-keys', '--batch-size', '10'])
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Filled keys of 3 users, 1 conflicts', result.output)
+        self.assertIn("User 3: email 'FIRST@example.com' clashes with user 1; left unset", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
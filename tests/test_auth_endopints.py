@@ -1,5 +1,6 @@
 import unittest
 from flask_testing import TestCase
+from sqlalchemy import event
 from app.database.context import db
 from app.auth.models import User
 from app.auth.utils import create_token
@@ -47,6 +48,43 @@ class AuthTestCase(TestCase):
         user = User.query.filter_by(username='testuser').first()
         self.assertTrue(user.email_verified)
 
+    def test_tokens_keep_to_their_purpose(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        self.client.post('/auth/register', json=data)
+        user = User.query.filter_by(username='testuser').first()
+        payload = {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'x'}}
+
+        response = self.client.post('/mailman/send', json=payload, headers={'Authorization': 'Bearer ' + create_token(user, True, 60)})
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get('/auth/confirm/email', query_string={'token': create_token(user)})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(User.query.filter_by(username='testuser').first().email_verified)
+
+
+    def test_login(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        self.client.post('/auth/register', json=data)
+
+        response = self.client.post('/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.json)
+
+    def test_login_ignores_username_case(self):
+        data = {'username': 'TestUser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        self.client.post('/auth/register', json=data)
+
+        response = self.client.post('/auth/login', json={'username': 'testuser', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_wrong_password(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        self.client.post('/auth/register', json=data)
+
+        response = self.client.post('/auth/login', json={'username': 'testuser', 'password': 'wrongpassword'})
+        self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(response.json['msg'], 'Invalid username or password')
 
     def test_register_user_missing_username(self):
         data = {'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '1234567890'}
@@ -123,6 +161,16 @@ class AuthTestCase(TestCase):
 
         self.assertEqual(response.json['msg'], 'Email is already in use')
 
+    def test_register_user_duplicate_email_in_other_case(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        self.assertEqual(self.client.post('/auth/register', json=data).status_code, 201)
+
+        data.update(username='testuser2', email='TEST@example.com', phone='+91-7737713068')
+        response = self.client.post('/auth/register', json=data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['msg'], 'Email is already in use')
+
     def test_register_user_duplicate_phone(self):
         data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
         response = self.client.post('/auth/register', json=data)
@@ -141,6 +189,22 @@ class AuthTestCase(TestCase):
 
         self.assertEqual(response.json['msg'], 'Phone is already in use')
 
+    def test_register_user_statement_count(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.post('/auth/register', json=data)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertLessEqual(len(statements), 2, statements)
+
     def test_register_user_invalid_email(self):
         data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test243', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
         response = self.client.post('/auth/register', json=data)
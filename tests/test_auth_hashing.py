@@ -0,0 +1,119 @@
+import asyncio
+import time
+import unittest
+from flask_testing import TestCase
+from app.database.context import db
+from app.auth.hashing import HashingUnavailable, PasswordHasher, get_password_hasher
+from app.auth.models import User
+from app import create_app
+
+
+class PasswordHashingTestCase(TestCase):
+    def create_app(self):
+        app = create_app()
+        app.config['SQLALCHEMY_ECHO'] = False
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.user_data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def login(self, password='testpassword'):
+        return self.client.post('/auth/login', json={'username': 'testuser', 'password': password})
+
+    def test_password_is_hashed_with_configured_method(self):
+        user = User(**self.user_data)
+
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(user.check_password('testpassword'))
+        self.assertFalse(user.check_password('wrongpassword'))
+
+    def test_login_rehashes_outdated_hash(self):
+        hasher = get_password_hasher()
+        hasher.method = 'pbkdf2:sha256:500'
+        User(**self.user_data).save()
+        hasher.method = 'pbkdf2:sha256:1000'
+
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+
+        user = User.query.filter_by(username='testuser').first()
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:1000$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_failed_login_does_not_rehash(self):
+        hasher = get_password_hasher()
+        hasher.method = 'pbkdf2:sha256:500'
+        User(**self.user_data).save()
+        hasher.method = 'pbkdf2:sha256:1000'
+
+        self.assertEqual(self.login('wrongpassword').status_code, 401)
+
+        user = User.query.filter_by(username='testuser').first()
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:500$'))
+
+    def test_saturated_hasher_returns_503(self):
+        User(**self.user_data).save()
+        hasher = get_password_hasher()
+        for _ in range(hasher.max_pending):
+            hasher._slots.acquire()
+        try:
+            response = self.login()
+        finally:
+            for _ in range(hasher.max_pending):
+                hasher._slots.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+
+class ProcessPoolHasherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_hash_and_verify_in_process_pool(self):
+        pwhash = self.hasher.hash('testpassword')
+
+        self.assertTrue(self.hasher.verify(pwhash, 'testpassword'))
+        self.assertFalse(self.hasher.verify(pwhash, 'wrongpassword'))
+        self.assertFalse(self.hasher.needs_rehash(pwhash))
+
+    def test_async_hash_and_verify_await_the_pool(self):
+        async def check():
+            pwhash = await self.hasher.hash_async('testpassword')
+            return await asyncio.gather(self.hasher.verify_async(pwhash, 'testpassword'),
+                                        self.hasher.verify_async(pwhash, 'wrongpassword'))
+
+        self.assertEqual(asyncio.run(check()), [True, False])
+
+    def test_timed_out_jobs_keep_their_slot_until_they_finish(self):
+        hasher = PasswordHasher(workers=1, max_pending=1, timeout=0.2)
+        hasher.warm()
+        try:
+            self.assertRaisesRegex(HashingUnavailable, 'timed out', hasher._run, time.sleep, 1)
+            self.assertRaisesRegex(HashingUnavailable, 'Too many', hasher.hash, 'testpassword')
+            self.assertRaisesRegex(HashingUnavailable, 'Too many', asyncio.run, hasher.hash_async('testpassword'))
+
+            deadline = time.monotonic() + 5
+            while not hasher._slots.acquire(blocking=False):
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+            hasher._slots.release()
+        finally:
+            hasher.shutdown()
+
+    def test_needs_rehash(self):
+        self.assertTrue(self.hasher.needs_rehash(PasswordHasher(method='pbkdf2:sha256:500', workers=0).hash('testpassword')))
+        self.assertTrue(self.hasher.needs_rehash(PasswordHasher(method='pbkdf2:sha256:1000', salt_length=8, workers=0).hash('testpassword')))
+        self.assertTrue(PasswordHasher().needs_rehash(self.hasher.hash('testpassword')))
+
+
+if __name__ == '__main__':
+    unittest.main()
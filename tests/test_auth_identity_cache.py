@@ -0,0 +1,119 @@
+import unittest
+from flask_testing import TestCase
+from sqlalchemy import event
+from app.database.context import db
+from app.auth.cache import UserRecord, load_user_by_email, load_user_by_id
+from app.auth.models import User
+from app.auth.utils import create_token, mark_email_verified, verify_token
+from app import create_app
+
+
+class IdentityCacheTestCase(TestCase):
+    def create_app(self):
+        app = create_app()
+        app.config['SQLALCHEMY_ECHO'] = False
+        return app
+
+    def setUp(self):
+        db.create_all()
+        User(username='testuser', password='testpassword', firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067').save()
+        self.cache = self.app.extensions['identity_cache']
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_repeated_lookups_hit_cache(self):
+        first = load_user_by_email('test@example.com')
+        db.session.remove()
+        second = load_user_by_email('test@example.com')
+        third = load_user_by_id(first.id)
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual((second.id, second.username, second.password), (first.id, first.username, first.password))
+        self.assertIs(third, second)
+
+    def test_email_lookups_ignore_case(self):
+        first = load_user_by_email('Test@Example.com')
+        second = load_user_by_email('test@EXAMPLE.com')
+
+        self.assertEqual(first.email, 'test@example.com')
+        self.assertIs(second, first)
+        self.assertEqual(len(self.statements), 1)
+
+    def test_targeted_update_invalidates_cache(self):
+        token = self.registration_token()
+        load_user_by_email('test@example.com')
+        db.session.remove()
+
+        user = verify_token(token)
+        del self.statements[:]
+        self.assertTrue(mark_email_verified(user.id))
+        self.assertFalse(mark_email_verified(user.id))
+
+        updates = [statement for statement in self.statements if statement.startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('email_verified IS NOT', updates[0])
+        self.assertFalse([statement for statement in self.statements if statement.startswith('SELECT')])
+        self.assertTrue(User.query.filter_by(email='test@example.com').first().email_verified)
+        self.assertTrue(load_user_by_email('test@example.com').email_verified)
+
+    def test_records_are_read_only(self):
+        user = load_user_by_email('test@example.com')
+
+        self.assertIsInstance(user, UserRecord)
+        with self.assertRaises(AttributeError):
+            user.email_verified = True
+        self.assertNotIn('phone', user._fields)
+        self.assertEqual(len(db.session.identity_map), 0)
+
+    def test_save_and_delete_invalidate_cache(self):
+        user = load_user_by_email('test@example.com')
+        changed = db.session.get(User, user.id)
+        changed.email = 'changed@example.com'
+        changed.save()
+
+        self.assertIsNone(load_user_by_email('test@example.com'))
+        self.assertEqual(load_user_by_email('changed@example.com').id, user.id)
+
+        changed.delete()
+        self.assertIsNone(load_user_by_id(user.id))
+        self.assertIsNone(load_user_by_email('changed@example.com'))
+
+    def test_jwt_protected_route_uses_cache(self):
+        token = create_token(User.query.filter_by(username='testuser').first())
+        headers = {'Authorization': 'Bearer ' + token}
+        data = {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'http://x/'}}
+
+        self.client.post('/mailman/send', json=data, headers=headers)
+        del self.statements[:]
+        response = self.client.post('/mailman/send', json=data, headers=headers)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse([statement for statement in self.statements if 'FROM user' in statement])
+
+    def test_disabled_cache_returns_same_users(self):
+        cached = load_user_by_email('test@example.com')
+        cached = {key: getattr(cached, key) for key in ('id', 'username', 'email', 'password', 'email_verified')}
+        del self.app.extensions['identity_cache']
+        db.session.remove()
+
+        user = load_user_by_email('test@example.com')
+
+        self.assertIsInstance(user, UserRecord)
+        self.assertEqual({key: getattr(user, key) for key in cached}, cached)
+
+    def registration_token(self):
+        return create_token(User.query.filter_by(username='testuser').first(), True, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
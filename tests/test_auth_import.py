@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from flask_testing import TestCase
+from sqlalchemy import event
+from werkzeug.security import check_password_hash
+from app.database.context import db
+from app.auth.importer import UserImporter, read_rows
+from app.auth.models import User
+from app import create_app
+
+FIELDS = ['username', 'password', 'firstname', 'lastname', 'email', 'phone']
+
+
+def user_row(index, **overrides):
+    row = {
+        'username': 'importuser%d' % index,
+        'password': 'password%d' % index,
+        'firstname': 'Import',
+        'lastname': 'User',
+        'email': 'import%d@example.com' % index,
+        'phone': '+1-%d' % (5550000 + index),
+    }
+    row.update(overrides)
+    return row
+
+
+class UserImportTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        db.create_all()
+        User(username='existing', password='testpassword', firstname='Test', lastname='User', email='taken@example.com', phone='+91-7737713067').save()
+        self.directory = tempfile.mkdtemp()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.directory, 'users.jsonl')
+        with open(path, 'w') as users_file:
+            for row in rows:
+                users_file.write((row if isinstance(row, str) else json.dumps(row)) + '\n')
+        return path
+
+    def invoke(self, *args):
+        return self.app.test_cli_runner(mix_stderr=False).invoke(args=['users', 'import'] + list(args))
+
+    def test_import_jsonl_with_rejects(self):
+        path = self.write_jsonl([
+            user_row(1),
+            user_row(2, email='not-an-email'),
+            user_row(3, username='importuser1'),
+            user_row(4, email='taken@example.com'),
+            'not json',
+            user_row(5),
+        ])
+        rejects = os.path.join(self.directory, 'rejects.jsonl')
+
+        result = self.invoke(path, '--rejects', rejects, '--chunk-size', '2')
+
+        self.assertEqual(result.exit_code, 0, result.output + result.stderr)
+        self.assertIn('Imported 2 users, rejected 4', result.output)
+        self.assertIn('6 read, 2 imported, 4 rejected', result.stderr)
+        self.assertEqual({user.username for user in User.query}, {'existing', 'importuser1', 'importuser5'})
+        imported = User.query.filter_by(username='importuser5').one()
+        self.assertTrue(check_password_hash(imported.password, 'password5'))
+        self.assertFalse(imported.email_verified)
+
+        with open(rejects) as rejects_file:
+            rejected = [json.loads(line) for line in rejects_file]
+        self.assertEqual([(entry['line'], entry['error']) for entry in rejected], [
+            (2, 'Invalid email address, must be in the format [email]@[domain]'),
+            (3, 'Username is duplicated in the input'),
+            (4, 'Email is already in use'),
+            (5, rejected[3]['error']),
+        ])
+        self.assertTrue(rejected[3]['error'].startswith('Invalid JSON'))
+        self.assertTrue(all('password' not in entry['row'] for entry in rejected))
+
+    def test_import_csv_in_chunked_bulk_inserts(self):
+        path = os.path.join(self.directory, 'users.csv')
+        with open(path, 'w', newline='') as users_file:
+            writer = csv.DictWriter(users_file, FIELDS)
+            writer.writeheader()
+            writer.writerows(user_row(index) for index in range(10))
+        self.statements = []
+
+        result = self.invoke(path, '--chunk-size', '5')
+
+        self.assertEqual(result.exit_code, 0, result.output + result.stderr)
+        self.assertEqual(User.query.count(), 11)
+        inserts = [statement for statement in self.statements if statement.startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        # Three IN lookups, one per unique column, for each chunk.
+        self.assertEqual(len([statement for statement in self.statements if ' IN (' in statement]), 6)
+
+    def test_duplicates_are_found_in_any_case(self):
+        rows = [(1, user_row(1), None), (2, user_row(2, username='ImportUser1'), None),
+                (3, user_row(3, email='Taken@example.com'), None), (4, user_row(4, phone='+15-550001'), None)]
+        rejected = []
+        importer = UserImporter(self.app.config['PASSWORD_HASH_METHOD'], reject=lambda line, row, error: rejected.append((line, error)))
+
+        stats = importer.run(rows)
+
+        self.assertEqual((stats.imported, stats.rejected), (1, 3))
+        self.assertEqual(rejected, [(2, 'Username is duplicated in the input'), (4, 'Phone is duplicated in the input'),
+                                    (3, 'Email is already in use')])
+        self.assertEqual(User.query.filter_by(email_key='import1@example.com').one().username, 'importuser1')
+
+    def test_rows_taken_while_importing_are_rejected(self):
+        rows = [(index, user_row(index), None) for index in (1, 2, 3)]
+        rejected = []
+        importer = UserImporter(self.app.config['PASSWORD_HASH_METHOD'], reject=lambda line, row, error: rejected.append((line, error)))
+        # Registrations that land between the importer's lookups and inserts.
+        racers = [User(username='racer2', password='testpassword', firstname='Race', lastname='User', email='import2@example.com', phone='+91-7737713069'),
+                  User(username='importuser1', password='testpassword', firstname='Race', lastname='User', email='racer1@example.com', phone='+91-7737713068')]
+        drop_existing = importer._drop_existing
+
+        def race(candidates):
+            # After the chunk's lookup, and again after the lookup that
+            # follows the failed bulk insert.
+            kept = drop_existing(candidates)
+            if racers:
+                racers.pop().save()
+            return kept
+
+        importer._drop_existing = race
+
+        stats = importer.run(rows)
+
+        self.assertEqual((stats.imported, stats.rejected), (1, 2))
+        self.assertEqual(rejected, [(1, 'Username is already in use'), (2, 'Email is already in use')])
+        self.assertIsNotNone(User.query.filter_by(username='importuser3').first())
+
+    def test_hashing_in_process_pool(self):
+        rows = [(index + 1, user_row(index), None) for index in range(6)]
+        importer = UserImporter(self.app.config['PASSWORD_HASH_METHOD'], workers=2, chunk_size=4)
+
+        stats = importer.run(rows)
+
+        self.assertEqual((stats.read, stats.imported, stats.rejected), (6, 6, 0))
+        user = User.query.filter_by(username='importuser3').one()
+        self.assertTrue(user.check_password('password3'))
+
+    def test_read_rows_csv_line_numbers(self):
+        path = os.path.join(self.directory, 'users.csv')
+        with open(path, 'w', newline='') as users_file:
+            writer = csv.DictWriter(users_file, FIELDS)
+            writer.writeheader()
+            writer.writerows([user_row(1), user_row(2)])
+
+        with open(path, newline='') as users_file:
+            lines = [line for line, row, error in read_rows(users_file, 'csv')]
+        self.assertEqual(lines, [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
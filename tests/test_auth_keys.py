@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+import jwt
+from flask_testing import TestCase
+from app.database.context import db
+from app.auth.keys import generate_private_key, private_key_pem
+from app.auth.models import User
+from app.auth.utils import create_token, verify_token
+from app import create_app
+from config import Config
+
+
+def write_key(directory, kid, algorithm, public_only=False):
+    key = generate_private_key(algorithm)
+    if public_only:
+        from cryptography.hazmat.primitives import serialization
+        data = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        name = kid + '.pub.pem'
+    else:
+        data, name = private_key_pem(key), kid + '.pem'
+    with open(os.path.join(directory, name), 'wb') as key_file:
+        key_file.write(data)
+    return key
+
+
+class AsymmetricKeysTestCase(TestCase):
+    algorithm = 'EdDSA'
+
+    def create_app(self):
+        self.directory = tempfile.mkdtemp()
+        self.old_key = write_key(self.directory, '20240101T000000', self.algorithm)
+        write_key(self.directory, '20230101T000000', self.algorithm, public_only=True)
+        write_key(self.directory, '20250101T000000', self.algorithm)
+        config = type('KeysConfig', (Config,), {'JWT_ALGORITHM': self.algorithm, 'JWT_KEYS_DIR': self.directory})
+        return create_app(config)
+
+    def setUp(self):
+        db.create_all()
+        self.user = User(username='testuser', password='testpassword', firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067', is_admin=True)
+        self.user.save()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_users(self, token):
+        return self.client.get('/auth/users', headers={'Authorization': 'Bearer ' + token})
+
+    def test_signs_with_the_newest_key(self):
+        token = create_token(self.user)
+
+        self.assertEqual(jwt.get_unverified_header(token), {'alg': self.algorithm, 'kid': '20250101T000000', 'typ': 'JWT'})
+        self.assertEqual(self.get_users(token).status_code, 200)
+        self.assertEqual(verify_token(create_token(self.user, for_registration=True, expires_delta=60)).id, self.user.id)
+
+    def test_retired_keys_still_verify(self):
+        claims = {'sub': self.user.id, 'jti': 'old', 'type': 'access', 'fresh': False}
+        token = jwt.encode(claims, self.old_key, algorithm=self.algorithm, headers={'kid': '20240101T000000'})
+        self.assertEqual(self.get_users(token).status_code, 200)
+
+        forged = jwt.encode(claims, generate_private_key(self.algorithm), algorithm=self.algorithm, headers={'kid': 'unknown'})
+        self.assertEqual(self.get_users(forged).status_code, 422)
+
+    def test_jwks_lets_other_services_verify_locally(self):
+        response = self.client.get('/.well-known/jwks.json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=300', response.headers['Cache-Control'])
+        keys = jwt.PyJWKSet.from_dict(response.json)
+        self.assertEqual([key.key_id for key in keys.keys], ['20230101T000000', '20240101T000000', '20250101T000000'])
+        self.assertTrue(all('d' not in key for key in response.json['keys']))
+
+        token = create_token(self.user)
+        kid = jwt.get_unverified_header(token)['kid']
+        key = next(key for key in keys.keys if key.key_id == kid)
+        self.assertEqual(jwt.decode(token, key.key, algorithms=[self.algorithm])['sub'], self.user.id)
+
+        cached = self.client.get('/.well-known/jwks.json', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+
+class RS256KeysTestCase(AsymmetricKeysTestCase):
+    algorithm = 'RS256'
+
+
+class SharedSecretTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def test_jwks_is_empty_for_hs256(self):
+        response = self.client.get('/.well-known/jwks.json')
+        self.assertEqual(response.json, {'keys': []})
+
+    def test_generate_key_command(self):
+        directory = tempfile.mkdtemp()
+        try:
+            result = self.app.test_cli_runner().invoke(args=['jwt', 'generate-key', '--algorithm', 'EdDSA', '--directory', directory])
+
+            self.assertEqual(result.exit_code, 0, result.output)
+            kid = result.output.strip()
+            self.assertEqual(os.listdir(directory), [kid + '.pem'])
+            self.assertEqual(os.stat(os.path.join(directory, kid + '.pem')).st_mode & 0o777, 0o600)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -103,6 +103,21 @@ class UserModelTestCase(unittest.TestCase):
         self.assertIsNotNone(saved_user)
         self.assertEqual(saved_user.email, 'test@example.com')
 
+    def test_lookup_keys_follow_values(self):
+        user = User(username='TestUser', password='testpassword', firstname='Test', lastname='User', email='Test@example.com', phone='+91-1234567890')
+
+        self.assertEqual((user.username_key, user.email_key, user.phone_key), ('testuser', 'test@example.com', '+911234567890'))
+        user.email = 'Other@example.com'
+        self.assertEqual(user.email_key, 'other@example.com')
+        self.assertEqual(User.lookup_keys('Straße', 'A@B.com', '+1-555'), {'username_key': 'strasse', 'email_key': 'a@b.com', 'phone_key': '+1555'})
+
+    def test_uniqueness_ignores_case(self):
+        User(username='testuser', password='testpassword', firstname='Test', lastname='User', email="test@example.com", phone="+91-1234567890").save()
+
+        self.assertEqual(User.uniqueness_error('TESTUSER', 'other@example.com', '+91-1111111111'), 'Username is already in use')
+        self.assertEqual(User.uniqueness_error('otheruser', 'Test@Example.COM', '+91-1111111111'), 'Email is already in use')
+        self.assertIsNone(User.uniqueness_error('otheruser', 'other@example.com', '+91-1111111111'))
+
     def test_delete_user(self):
         user = User(username='testuser', password='testpassword', firstname='Test', lastname='User', email="test@example.com", phone="+91-1234567890")
         db.session.add(user)
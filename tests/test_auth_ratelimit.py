@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import unittest
+from flask_testing import TestCase
+from app.database.context import db
+from app.auth.models import User
+from app.auth.ratelimit import MemoryStore, SQLiteStore, get_auth_admission
+from app import create_app
+
+
+class LoginThrottlingTestCase(TestCase):
+    def create_app(self):
+        app = create_app()
+        app.config['SQLALCHEMY_ECHO'] = False
+        return app
+
+    def setUp(self):
+        db.create_all()
+        User(username='testuser', password='testpassword', firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067').save()
+        self.admission = get_auth_admission()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def login(self, password='testpassword', username='testuser'):
+        return self.client.post('/auth/login', json={'username': username, 'password': password})
+
+    def test_login_is_throttled_per_username(self):
+        self.admission.per_username = (3, 60)
+        for _ in range(3):
+            self.assertEqual(self.login('wrongpassword').status_code, 401)
+
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+        self.assertEqual(self.login(username='otheruser').status_code, 401)
+
+    def test_auth_routes_are_throttled_per_ip(self):
+        self.admission.per_ip = (2, 60)
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login().status_code, 200)
+
+        self.assertEqual(self.client.get('/auth/confirm/email').status_code, 429)
+
+        response = self.client.post('/auth/login', json={'username': 'testuser', 'password': 'testpassword'}, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_concurrent_verifications_are_capped(self):
+        self.admission._verifications = threading.BoundedSemaphore(1)
+        with self.admission.verification_slot():
+            response = self.login()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+
+class RateLimitStoreTestCase(unittest.TestCase):
+    def test_sliding_window(self):
+        store = MemoryStore()
+        for now in (0, 10, 20):
+            self.assertEqual(store.hit('key', 3, 60, now), 0)
+        self.assertGreater(store.hit('key', 3, 60, 30), 0)
+
+        # Halfway into the next window half of the previous count remains.
+        self.assertEqual(store.hit('key', 3, 60, 90), 0)
+        self.assertEqual(store.hit('key', 3, 60, 91), 0)
+        self.assertGreater(store.hit('key', 3, 60, 92), 0)
+        self.assertEqual(store.hit('key', 3, 60, 200), 0)
+
+    def test_memory_store_evicts_cold_keys(self):
+        store = MemoryStore(maxsize=2)
+        for key in ('a', 'b', 'a', 'c'):
+            store.hit(key, 1, 60, 0)
+
+        self.assertEqual(len(store), 2)
+        self.assertGreater(store.hit('a', 1, 60, 1), 0)
+        self.assertEqual(store.hit('b', 1, 60, 1), 0)
+
+    def test_sqlite_store_is_shared(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            first, second = SQLiteStore(path), SQLiteStore(path)
+            self.assertEqual(first.hit('key', 2, 60, 0), 0)
+            self.assertEqual(second.hit('key', 2, 60, 1), 0)
+            self.assertGreater(first.hit('key', 2, 60, 2), 0)
+            self.assertGreater(second.hit('key', 2, 60, 3), 0)
+        finally:
+            os.remove(path)
+
+    def test_sqlite_prune_keeps_longer_windows(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            store = SQLiteStore(path)
+            store.PRUNE_EVERY = 5
+            now = 100000.0
+            for _ in range(3):
+                store.hit('user:victim', 3, 300, now)
+            self.assertGreater(store.hit('user:victim', 3, 300, now + 1), 0)
+
+            # Per-IP hits on a 60s rule, two windows later, trigger a prune.
+            for offset in range(5):
+                store.hit('ip:%d' % offset, 60, 60, now + 130)
+
+            self.assertGreater(store.hit('user:victim', 3, 300, now + 131), 0)
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+from flask_testing import TestCase
+from sqlalchemy import event
+from app.database.context import db
+from app.auth.models import RevokedToken, User
+from app.auth.revocation import TokenRevocations
+from app.auth.utils import create_token, verify_token
+from app import create_app
+
+
+class TokenRevocationTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        db.create_all()
+        self.admin = User(username='adminuser', password='testpassword', firstname='Admin', lastname='User', email='admin@example.com', phone='+91-7737713000', is_admin=True)
+        self.user = User(username='testuser', password='testpassword', firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067')
+        db.session.add_all([self.admin, self.user])
+        db.session.commit()
+        self.revocations = self.app.extensions['token_revocations']
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def headers(self, token):
+        return {'Authorization': 'Bearer ' + token}
+
+    def test_logout_revokes_only_that_token(self):
+        token, other = create_token(self.user), create_token(self.user)
+
+        response = self.client.post('/auth/logout', headers=self.headers(token))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post('/auth/logout', headers=self.headers(token)).status_code, 401)
+        self.assertEqual(self.client.get('/auth/users', headers=self.headers(other)).status_code, 403)
+        self.assertEqual(RevokedToken.query.count(), 1)
+
+    def test_checks_issue_no_queries(self):
+        token = create_token(self.admin)
+        self.client.post('/auth/logout', headers=self.headers(create_token(self.admin)))
+        statements = []
+        record = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get('/auth/users', headers=self.headers(token))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([statement for statement in statements if 'revoked_token' in statement])
+
+    def test_admin_revokes_every_token_of_a_user(self):
+        login_token = create_token(self.user)
+        registration_token = create_token(self.user, for_registration=True, expires_delta=3600)
+        admin_token = create_token(self.admin)
+
+        self.assertEqual(self.client.post('/auth/users/%d/revoke-tokens' % self.user.id, headers=self.headers(login_token)).status_code, 403)
+        response = self.client.post('/auth/users/%d/revoke-tokens' % self.user.id, headers=self.headers(admin_token))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post('/auth/logout', headers=self.headers(login_token)).status_code, 401)
+        self.assertIsNone(verify_token(registration_token))
+        self.assertEqual(self.client.get('/auth/users', headers=self.headers(admin_token)).status_code, 200)
+        self.assertEqual(self.client.post('/auth/users/999/revoke-tokens', headers=self.headers(admin_token)).status_code, 404)
+
+    def test_tokens_issued_after_a_revocation_stay_valid(self):
+        self.revocations.revoke_subjects([self.user.id])
+        revoked_before = time.time()
+
+        self.assertTrue(self.revocations.is_revoked({'sub': self.user.id, 'iat': int(revoked_before) - 1}))
+        self.assertFalse(self.revocations.is_revoked({'sub': self.user.id, 'iat': int(revoked_before) + 1}))
+        self.assertFalse(self.revocations.is_revoked({'sub': self.admin.id, 'iat': int(revoked_before) - 1}))
+
+    def test_tokens_issued_in_the_second_of_a_revocation_are_revoked(self):
+        worker = TokenRevocations(self.app)
+        self.revocations.revoke_subjects([self.user.id])
+        revoked_at = RevokedToken.query.filter_by(subject=str(self.user.id)).one().revoked_at
+        worker.refresh()
+
+        # Stored as MySQL would keep it.
+        self.assertEqual(revoked_at.microsecond, 0)
+        iat = int((revoked_at - datetime(1970, 1, 1)).total_seconds())
+        for revocations in (self.revocations, worker):
+            self.assertTrue(revocations.is_revoked({'sub': self.user.id, 'iat': iat}))
+            self.assertFalse(revocations.is_revoked({'sub': self.user.id, 'iat': iat + 1}))
+
+    def test_other_workers_pick_up_revocations_incrementally(self):
+        worker = TokenRevocations(self.app)
+        now = datetime.utcnow()
+        db.session.add(RevokedToken(jti='old', revoked_at=now - timedelta(hours=2), expires_at=now - timedelta(hours=1)))
+        db.session.add(RevokedToken(jti='live', revoked_at=now - timedelta(minutes=5), expires_at=now + timedelta(minutes=55)))
+        db.session.commit()
+
+        self.assertEqual(worker.refresh(), 1)
+        self.assertTrue(worker.is_revoked({'jti': 'live'}))
+        self.assertFalse(worker.is_revoked({'jti': 'old'}))
+        # The first refresh purged the expired row.
+        self.assertEqual(RevokedToken.query.count(), 1)
+
+        self.revocations.revoke_token('fresh', time.time() + 60)
+        self.assertEqual(worker.refresh(), 1)
+        self.assertTrue(worker.is_revoked({'jti': 'fresh'}))
+
+    def test_entries_leave_memory_when_tokens_expire(self):
+        self.revocations.revoke_token('short', time.time() + 0.05)
+        self.revocations.revoke_token('long', time.time() + 60)
+        self.assertTrue(self.revocations.is_revoked({'jti': 'short'}))
+
+        time.sleep(0.1)
+        self.assertFalse(self.revocations.is_revoked({'jti': 'short'}))
+        self.revocations._purged_at = time.monotonic()
+        self.revocations.refresh()
+        self.assertEqual(len(self.revocations), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
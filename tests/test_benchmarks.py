@@ -0,0 +1,124 @@
+import copy
+import unittest
+from benchmarks.concurrency import run_comparison
+from benchmarks.harness import compare, percentile, run_suite
+from benchmarks.jwt_signing import measure as measure_signing
+from benchmarks.lookup_keys import measure as measure_lookups
+from benchmarks.read_model import measure as measure_read_model
+from benchmarks.serialization import measure_compression, measure_providers, payloads
+from benchmarks.startup import BUDGETS_MS, check_budget, measure, parse_importtime
+from benchmarks.validation import CASES, measure_rejected_requests, measure_schemas
+
+
+class BenchmarkHarnessTestCase(unittest.TestCase):
+    def test_suite_reports_every_endpoint(self):
+        results = run_suite(users=20, requests=4, threads=2, PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+
+        self.assertEqual(set(results['results']), {'register', 'login', 'confirm_email', 'mailman_send'})
+        for result in results['results'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertEqual(result['requests'], 4)
+            self.assertGreater(result['throughput_rps'], 0)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertLessEqual(results['results']['register']['statements_per_request'], 2)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': {'login': {'throughput_rps': 100.0, 'latency_ms': {'p95': 10.0}, 'statements_per_request': 1.0, 'errors': 0}}}
+        current = copy.deepcopy(baseline)
+        self.assertEqual(compare(current, baseline), [])
+
+        current['results']['login'].update(throughput_rps=80.0, statements_per_request=2.0)
+        current['results']['login']['latency_ms']['p95'] = 12.0
+        self.assertEqual(len(compare(current, baseline)), 3)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+
+class StartupBenchmarkTestCase(unittest.TestCase):
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   config\n'
+            'import time:      3000 |     640000 | app\n'
+            'some warning\n')
+
+        self.assertEqual(parse_importtime(output), {'config': (120, 120), 'app': (3000, 640000)})
+
+    def test_measure_reports_against_budget(self):
+        result = measure(runs=1, top=3)
+
+        for key in BUDGETS_MS:
+            self.assertGreater(result[key], 0)
+        self.assertEqual(len(result['slowest_modules_ms']), 3)
+        self.assertEqual(check_budget(result, dict.fromkeys(BUDGETS_MS, float('inf'))), [])
+        self.assertEqual(len(check_budget(result, dict.fromkeys(BUDGETS_MS, 0.0))), len(BUDGETS_MS))
+
+
+class ValidationBenchmarkTestCase(unittest.TestCase):
+    def test_reports_every_case(self):
+        results = measure_schemas(iterations=10, repeat=1)
+
+        self.assertEqual(set(results), set(CASES))
+        self.assertTrue(all(cost > 0 for cost in results.values()))
+
+    def test_rejected_requests_run_no_statements(self):
+        result = measure_rejected_requests(requests=5)
+
+        self.assertEqual(result['statements_per_request'], 0)
+        self.assertLessEqual(result['latency_us']['p50'], result['latency_us']['p99'])
+
+
+class SerializationBenchmarkTestCase(unittest.TestCase):
+    def test_compares_providers_and_encodings(self):
+        providers = measure_providers(iterations=2)
+        sizes = measure_compression(iterations=1)
+
+        self.assertEqual(set(providers), set(payloads()))
+        for result in providers.values():
+            self.assertEqual(set(result), {'stdlib', 'fast'})
+        self.assertLess(sizes['users_page_1000']['gzip']['bytes'], sizes['users_page_1000']['identity_bytes'])
+
+
+class ConcurrencyBenchmarkTestCase(unittest.TestCase):
+    def test_compares_both_modes(self):
+        results = run_comparison(users=5, requests=6, concurrency=3, threads=2, db_latency=0.001, only=['login', 'mailman_send'])
+
+        self.assertEqual(set(results['results']), {'login', 'mailman_send'})
+        for modes in results['results'].values():
+            self.assertEqual(set(modes), {'sync', 'async'})
+            for result in modes.values():
+                self.assertEqual((result['requests'], result['errors']), (6, 0))
+
+
+class JWTSigningBenchmarkTestCase(unittest.TestCase):
+    def test_reports_sign_and_verify_costs(self):
+        results = measure_signing(iterations=1, algorithms=('HS256', 'EdDSA'))
+
+        self.assertEqual(set(results), {'HS256', 'EdDSA'})
+        self.assertEqual(set(results['EdDSA']), {'token_bytes', 'sign_us', 'verify_us', 'verify_parsing_key_us'})
+
+
+class LookupKeysBenchmarkTestCase(unittest.TestCase):
+    def test_lookups_search_the_key_indexes(self):
+        results = measure_lookups(users=50, probes=5, scan_probes=2)['results']
+
+        self.assertTrue(all(result['found'] for result in results.values()))
+        self.assertEqual({name for name, result in results.items() if not result['uses_index']}, {'unindexed_lower_email'})
+        self.assertIn('COVERING INDEX', results['email_exists']['plan'])
+
+
+class ReadModelBenchmarkTestCase(unittest.TestCase):
+    def test_compares_records_with_orm_users(self):
+        results = measure_read_model(users=20, lookups=10, batch=5)['results']
+
+        self.assertEqual(set(results), {'orm', 'record'})
+        self.assertEqual(set(results['record']), {'lookup_us', 'hydrate_us', 'bytes_per_user'})
+        self.assertLess(results['record']['bytes_per_user'], results['orm']['bytes_per_user'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import event
+
+from app import create_app
+from app.auth.models import User
+from app.auth.utils import authenticate, create_token, verify_token
+from app.database.context import REPLICA_BIND, db, read_replica
+from flask import Flask
+from config import Config, DevelopmentConfig, ProductionConfig, _replica_binds, configure, env, get_config
+
+
+def forget_replica_metadata():
+    # init_app registers an empty MetaData per bind key on the shared ``db``;
+    # drop it so create_all() in apps without a replica doesn't look for one.
+    db.metadatas.pop(REPLICA_BIND, None)
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """A primary and a replica SQLite file; rows are written to one or the other directly."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app(type('ReplicaConfig', (Config,), {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.directory, 'primary.db'),
+            'SQLALCHEMY_BINDS': {'replica': 'sqlite:///' + os.path.join(self.directory, 'replica.db')},
+            'IDENTITY_CACHE_ENABLED': False,
+            'RATELIMIT_ENABLED': False,
+        }))
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.primary = db.engines[None]
+        self.replica = db.engines['replica']
+        db.metadata.create_all(self.replica)
+        self.statements = {'primary': [], 'replica': []}
+        event.listen(self.primary, 'before_cursor_execute', self.record('primary'))
+        event.listen(self.replica, 'before_cursor_execute', self.record('replica'))
+
+    def tearDown(self):
+        db.session.remove()
+        for engine in (self.primary, self.replica):
+            engine.dispose()
+        self.context.pop()
+        forget_replica_metadata()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def record(self, name):
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            self.statements[name].append(statement)
+        return listener
+
+    def seed(self, engine, username='testuser', email='test@example.com'):
+        user = User(username=username, password='testpassword', firstname='Test', lastname='User', email=email, phone='+91-7737713067')
+        row = {column.key: getattr(user, column.key) for column in User.__table__.columns if column.key != 'id'}
+        row.update(email_verified=False, phone_verified=False, is_admin=False)
+        with engine.begin() as connection:
+            connection.execute(User.__table__.insert(), row)
+        self.statements = {'primary': [], 'replica': []}
+
+    def test_authenticate_reads_from_replica(self):
+        self.seed(self.replica)
+
+        user = authenticate('testuser', 'testpassword')
+
+        self.assertIsNotNone(user)
+        self.assertEqual(len(self.statements['replica']), 1)
+        self.assertEqual(self.statements['primary'], [])
+
+    def test_lookup_falls_back_to_primary_before_replication(self):
+        self.seed(self.primary)
+        token = create_token(User(email='test@example.com'), True, 3600)
+
+        user = verify_token(token)
+
+        self.assertEqual(user.email, 'test@example.com')
+        self.assertEqual(len(self.statements['replica']), 1)
+        self.assertEqual(len(self.statements['primary']), 1)
+
+    def test_writes_go_to_primary(self):
+        self.seed(self.replica)
+        self.seed(self.primary)
+
+        with read_replica():
+            user = User.query.filter_by(username='testuser').first()
+            user.email_verified = True
+            db.session.commit()
+
+        with self.primary.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('SELECT email_verified FROM user').scalar(), 1)
+        with self.replica.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('SELECT email_verified FROM user').scalar(), 0)
+        self.assertTrue(any(statement.startswith('UPDATE') for statement in self.statements['primary']))
+
+    def test_register_writes_to_primary(self):
+        response = self.app.test_client().post('/auth/register', json={
+            'username': 'newuser', 'password': 'testpassword', 'email': 'new@example.com',
+            'firstname': 'New', 'lastname': 'User', 'phone': '+91-7737713068'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.statements['replica'], [])
+        with self.primary.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('SELECT username FROM user').scalar(), 'newuser')
+
+    def test_without_replica_reads_use_primary_once(self):
+        self.seed(self.primary)
+        engines = db.engines
+        with mock.patch.dict(engines):
+            del engines['replica']
+            self.assertIsNone(authenticate('nobody', 'testpassword'))
+        self.assertEqual(len(self.statements['primary']), 1)
+
+
+class ConfigProfileTestCase(unittest.TestCase):
+    def test_profile_from_environment(self):
+        with mock.patch.dict(os.environ, {'APP_ENV': 'production'}):
+            self.assertIs(get_config(), ProductionConfig)
+        with mock.patch.dict(os.environ, {'APP_ENV': 'development'}):
+            self.assertIs(get_config(), DevelopmentConfig)
+        with mock.patch.dict(os.environ, {'APP_ENV': 'testing'}):
+            self.assertIs(get_config(), Config)
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIs(get_config(), ProductionConfig)
+        self.assertRaises(ValueError, get_config, 'staging')
+
+    def test_environment_is_read_when_app_is_created(self):
+        config = type('EnvConfig', (Config,), {'PASSWORD_HASH_WORKERS': env('PASSWORD_HASH_WORKERS', 0, int)})
+        with mock.patch.dict(os.environ, {'EMAIL_USER': 'late@example.com', 'PASSWORD_HASH_WORKERS': '3'}):
+            app = create_app(config)
+        self.assertEqual(app.config['MAIL_USERNAME'], 'late@example.com')
+        self.assertEqual(app.config['PASSWORD_HASH_WORKERS'], 3)
+
+        with mock.patch.dict(os.environ):
+            del os.environ['JWT_SECRET_KEY']
+            self.assertRaises(RuntimeError, create_app)
+
+    def test_dotenv_file_is_only_read_by_local_profiles(self):
+        directory = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            with open(os.path.join(directory, 'test.env'), 'w') as dotenv_file:
+                dotenv_file.write('EMAIL_USER=dotenv@example.com\n')
+            os.chdir(directory)
+            production = {'DATABASE_URL': 'sqlite://', 'FRONTEND_URL': 'http://localhost:3000', 'EMAIL_USER': ''}
+            with mock.patch.dict(os.environ, production):
+                del os.environ['EMAIL_USER']
+                self.assertRaises(RuntimeError, configure, Flask(__name__), ProductionConfig)
+                app = Flask(__name__)
+                configure(app, Config)
+            self.assertEqual(app.config['MAIL_USERNAME'], 'dotenv@example.com')
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_empty_replica_url_means_no_replica(self):
+        app = Flask(__name__)
+        with mock.patch.dict(os.environ, {'DATABASE_REPLICA_URL': ''}):
+            configure(app, DevelopmentConfig)
+        self.assertEqual(app.config['SQLALCHEMY_BINDS'], {})
+
+    def test_production_engine_options(self):
+        directory = tempfile.mkdtemp()
+        try:
+            app = create_app(type('PooledConfig', (ProductionConfig,), {
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'primary.db'),
+                'SQLALCHEMY_BINDS': _replica_binds('sqlite:///' + os.path.join(directory, 'replica.db'), ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS),
+                'FRONTEND_URL': 'http://localhost:3000',
+                'MAIL_QUEUE_WORKERS': 0,
+                'PASSWORD_HASH_WORKERS': 0,
+            }))
+            with app.app_context():
+                self.assertEqual(set(db.engines), {None, REPLICA_BIND})
+                options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+                for engine in db.engines.values():
+                    self.assertEqual(engine.pool.size(), options['pool_size'])
+                    self.assertEqual(engine.pool._recycle, options['pool_recycle'])
+                    self.assertTrue(engine.pool._pre_ping)
+                    engine.dispose()
+        finally:
+            forget_replica_metadata()
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from flask import jsonify
+from flask_testing import TestCase
+from sqlalchemy.exc import OperationalError
+from app.database.context import db
+from app.auth.models import User
+from app.auth.utils import create_token
+from app.idempotency import BUSY, Completed, IdempotencyRecord, IdempotencyStore, idempotent
+from app.mailman.models import OutboundEmail
+from app import create_app
+from config import Config
+
+REGISTRATION = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+
+
+class IdempotentEndpointsTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        db.create_all()
+        self.store = self.app.extensions['idempotency']
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def register(self, data=REGISTRATION, key='key-1'):
+        return self.client.post('/auth/register', json=data, headers={'Idempotency-Key': key} if key else {})
+
+    def test_register_retry_is_replayed(self):
+        first = self.register()
+        second = self.register()
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.json, first.json)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(User.query.count(), 1)
+        self.assertEqual(OutboundEmail.query.count(), 1)
+
+    def test_register_retry_is_replayed_from_the_table(self):
+        self.register()
+        # As seen by another process, whose LRU has never heard of the key.
+        self.store.clear()
+
+        response = self.register()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(OutboundEmail.query.count(), 1)
+
+    def test_requests_without_a_key_run_every_time(self):
+        self.assertEqual(self.register(key=None).status_code, 201)
+        response = self.register(key=None)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['msg'], 'Username is already in use')
+        self.assertEqual(IdempotencyRecord.query.count(), 0)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.register()
+
+        response = self.register(dict(REGISTRATION, username='otheruser'))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(User.query.count(), 1)
+
+    def test_fingerprint_is_keyed_with_the_secret(self):
+        self.register()
+        self.app.config['SECRET_KEY'] = 'another-secret'
+        self.store.clear()
+
+        # The body hashes differently, so it no longer matches.
+        self.assertEqual(self.register().status_code, 422)
+
+    def test_storage_failures_keep_the_real_response(self):
+        failure = OperationalError('UPDATE idempotency_key', {}, Exception('database is locked'))
+        with mock.patch.object(IdempotencyRecord.__table__, 'update', side_effect=failure), \
+                self.assertLogs(self.app.logger, 'ERROR'):
+            response = self.register()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.query.count(), 1)
+        # This process still replays it.
+        self.assertEqual(self.register().headers['Idempotent-Replayed'], 'true')
+
+    def test_invalid_key(self):
+        self.assertEqual(self.register(key='x' * 256).status_code, 400)
+
+    def test_expired_responses_are_not_replayed(self):
+        self.register()
+        self.store.clear()
+        IdempotencyRecord.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+
+        response = self.register()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(self.store.purge(datetime.utcnow() + timedelta(days=2)), 1)
+
+    def test_mailman_send_keys_are_per_user(self):
+        self.register(key=None)
+        other = User(username='otheruser', password='testpassword', firstname='Other', lastname='User', email='other@example.com', phone='+91-7737713068')
+        other.save()
+        user = User.query.filter_by(username='testuser').one()
+        payload = {'to': 'test@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': {'confirm_url': 'x'}}
+
+        def send(sender):
+            return self.client.post('/mailman/send', json=payload, headers={'Authorization': 'Bearer ' + create_token(sender), 'Idempotency-Key': 'send-1'})
+
+        statuses = [send(user).status_code, send(user).status_code, send(other).status_code]
+
+        self.assertEqual(statuses, [202, 202, 202])
+        self.assertEqual(OutboundEmail.query.filter_by(subject='Hi').count(), 2)
+
+
+class ConcurrentDuplicatesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # Threads need a database they can share.
+        config = type('FileConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.directory, 'app.db')})
+        self.app = create_app(config)
+        self.calls = []
+        self.release = threading.Event()
+
+        @self.app.route('/slow', methods=['POST'])
+        @idempotent()
+        def slow():
+            self.calls.append(1)
+            self.release.wait(5)
+            if len(self.calls) == 1 and self.app.config.get('FAIL_FIRST'):
+                return jsonify({'msg': 'boom'}), 500
+            return jsonify({'calls': len(self.calls)}), 201
+
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def post(self, results):
+        response = self.app.test_client().post('/slow', json={}, headers={'Idempotency-Key': 'slow-1'})
+        results.append((response.status_code, response.get_json(), response.headers.get('Idempotent-Replayed')))
+
+    def test_duplicates_wait_for_the_first_request(self):
+        results = []
+        threads = [threading.Thread(target=self.post, args=(results,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while not self.calls:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(results, key=lambda result: result[2] or ''), [(201, {'calls': 1}, None)] + [(201, {'calls': 1}, 'true')] * 3)
+
+    def test_duplicates_give_up_after_the_wait_timeout(self):
+        self.app.extensions['idempotency'].wait_timeout = 0.1
+        first = []
+        thread = threading.Thread(target=self.post, args=(first,))
+        thread.start()
+        while not self.calls:
+            time.sleep(0.01)
+
+        second = []
+        self.post(second)
+        self.release.set()
+        thread.join(10)
+
+        self.assertEqual(second[0][0], 409)
+        self.assertEqual(first[0][0], 201)
+
+    def test_claims_are_extended_while_the_view_runs(self):
+        self.app.extensions['idempotency'].lock_timeout = 0.3
+        first = []
+        thread = threading.Thread(target=self.post, args=(first,))
+        thread.start()
+        while not self.calls:
+            time.sleep(0.01)
+        time.sleep(0.6)
+
+        # As seen by another process, well after the first claim would have lapsed.
+        other = IdempotencyStore(lock_timeout=0.3)
+        with self.app.app_context():
+            key, fingerprint = db.session.execute(db.select(IdempotencyRecord.key, IdempotencyRecord.fingerprint)).one()
+            self.assertIs(other.claim(key, fingerprint), BUSY)
+            self.release.set()
+            thread.join(10)
+            self.assertIsInstance(other.claim(key, fingerprint), Completed)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first[0][0], 201)
+        self.assertEqual(self.app.extensions['idempotency'].stats()['held'], 0)
+
+    def test_one_thread_renews_every_claim(self):
+        store = self.app.extensions['idempotency']
+        store.lock_timeout = 0.3
+        with self.app.app_context():
+            store.hold('key-1')
+            renewer = store._renewer
+            for index in range(2, 6):
+                store.hold('key-%d' % index)
+                self.assertIs(store._renewer, renewer)
+            self.assertEqual(store.stats()['held'], 5)
+
+            for index in range(1, 6):
+                store.release('key-%d' % index)
+        renewer.join(5)
+
+        # It stops once nothing is held.
+        self.assertFalse(renewer.is_alive())
+        self.assertIsNone(store._renewer)
+
+    def test_server_errors_are_not_kept(self):
+        self.app.config['FAIL_FIRST'] = True
+        self.release.set()
+        results = []
+
+        self.post(results)
+        self.post(results)
+
+        self.assertEqual([status for status, _, _ in results], [500, 201])
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
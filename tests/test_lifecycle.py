@@ -0,0 +1,106 @@
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.database.context import db
+from app.lifecycle import after_fork, before_fork, shutdown, start_background, warm_up
+from tests.smtp_server import free_port, smtp_test_config, start_smtp_server
+
+
+class LifecycleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.smtp_port = free_port()
+        self.smtp, self.handler = start_smtp_server(self.smtp_port)
+        self.app = create_app(smtp_test_config(
+            self.smtp_port,
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(self.directory, 'app.db'),
+            SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3},
+            MAIL_POOL_SIZE=2,
+            MAIL_QUEUE_WORKERS=1,
+            MAIL_QUEUE_POLL_INTERVAL=0.05,
+            SESSION_SWEEP_INTERVAL=60,
+            JWT_REVOCATION_REFRESH_INTERVAL=60,
+        ))
+        self.queue = self.app.extensions['mail_queue']
+        with self.app.app_context():
+            db.create_all()
+            self.engine = db.engine
+
+    def tearDown(self):
+        shutdown(self.app, timeout=5)
+        self.smtp.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_warm_up_opens_pools(self):
+        self.app.extensions['mail_templates'].invalidate()
+
+        smtp_thread = warm_up(self.app)
+        smtp_thread.join(5)
+
+        self.assertEqual(self.engine.pool.checkedin(), 3)
+        self.assertEqual(self.app.extensions['smtp_pool'].idle_count, 2)
+        self.assertEqual(len(self.app.extensions['mail_templates']), 1)
+
+    def test_warm_up_caps_connections(self):
+        self.engine.dispose()
+        warm_up(self.app, connections=1).join(5)
+
+        self.assertEqual(self.engine.pool.checkedin(), 1)
+        self.assertEqual(self.app.extensions['smtp_pool'].idle_count, 1)
+
+    def test_factory_starts_no_threads(self):
+        self.assertFalse(self.queue.running)
+        self.assertFalse(self.app.extensions['session_sweeper'].running)
+        self.assertFalse(self.app.extensions['token_revocations'].running)
+
+    def test_fork_hooks_stop_and_restart_background_threads(self):
+        queue = self.queue
+        background = [self.app.extensions['session_sweeper'], self.app.extensions['token_revocations']]
+        start_background(self.app)
+        warm_up(self.app).join(5)
+        self.assertTrue(queue.running)
+        self.assertTrue(all(service.running for service in background))
+
+        before_fork(self.app)
+        self.assertFalse(queue.running)
+        self.assertFalse(any(service.running for service in background))
+        self.assertEqual(self.engine.pool.checkedin(), 0)
+        self.assertEqual(self.app.extensions['smtp_pool'].idle_count, 0)
+
+        after_fork(self.app)
+        self.assertTrue(queue.running)
+        self.assertTrue(all(service.running for service in background))
+
+    def test_gunicorn_config(self):
+        with mock.patch.dict(os.environ):
+            settings = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+
+        self.assertTrue(settings['preload_app'])
+        self.assertGreaterEqual(settings['workers'], 1)
+        self.assertEqual(settings['worker_class'], 'gthread')
+        for hook in ('when_ready', 'post_fork', 'post_worker_init', 'worker_exit'):
+            self.assertTrue(callable(settings[hook]))
+
+        with mock.patch.dict(os.environ, {'SERVER_MODE': 'asgi'}):
+            settings = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+
+        self.assertEqual(settings['worker_class'], 'uvicorn.workers.UvicornWorker')
+        self.assertEqual(settings['wsgi_app'], 'asgi:asgi_app')
+
+    def test_wsgi_entry_point_leaves_the_async_views_unloaded(self):
+        script = 'import sys, run; print(sorted(name for name in ("asgiref", "app.auth.async_views", "app.mailman.async_views") if name in sys.modules))'
+        output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(output.strip().splitlines()[-1], '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
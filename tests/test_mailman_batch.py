@@ -0,0 +1,113 @@
+import json
+import unittest
+from flask import render_template
+from flask_testing import TestCase
+from sqlalchemy import event
+from app.database.context import db
+from app.auth.models import User
+from app.mailman.models import OutboundEmail
+from app.auth.utils import create_token
+from app.mailman.pool import get_smtp_pool
+from app.mailman.utils import render_email_batch
+from app import create_app
+from tests.smtp_server import free_port, smtp_test_config, start_smtp_server
+
+
+class MailmanBatchTestCase(TestCase):
+    def create_app(self):
+        self.smtp_port = free_port()
+        return create_app(smtp_test_config(self.smtp_port, MAILMAN_BATCH_CHUNK_SIZE=2))
+
+    def setUp(self):
+        db.create_all()
+        self.smtp, self.handler = start_smtp_server(self.smtp_port)
+        for index in range(3):
+            User(username='testuser%d' % index, password='testpassword', firstname='Test', lastname='User',
+                 email='test%d@example.com' % index, phone='+91-773771306%d' % index).save()
+        token = create_token(User.query.first(), False)
+        self.headers = {'Authorization': 'Bearer ' + token}
+
+    def tearDown(self):
+        get_smtp_pool().close_all()
+        self.smtp.stop()
+        db.session.remove()
+        db.drop_all()
+
+    def send_batch(self, recipients):
+        data = {'subject': 'Confirm', 'template_name': 'confirm_email.html', 'recipients': recipients}
+        response = self.client.post('/mailman/send/batch', json=data, headers=self.headers)
+        return response, [json.loads(line) for line in response.data.decode().splitlines()]
+
+    def test_send_batch_streams_status_per_recipient(self):
+        recipients = [
+            {'to': 'test0@example.com', 'params': {'confirm_url': 'http://x/0'}},
+            {'to': 'nobody@example.com', 'params': {'confirm_url': 'http://x/1'}},
+            {'to': 'test1@example.com', 'params': {'confirm_url': 'http://x/2'}},
+            {'to': 'test2@example.com'},
+        ]
+        response, lines = self.send_batch(recipients)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(lines, [
+            {'to': 'test0@example.com', 'status': 'sent'},
+            {'to': 'nobody@example.com', 'status': 'unknown_user'},
+            {'to': 'test1@example.com', 'status': 'sent'},
+            {'to': 'test2@example.com', 'status': 'sent'},
+        ])
+        self.assertEqual([envelope.rcpt_tos for envelope in self.handler.envelopes],
+                         [['test0@example.com'], ['test1@example.com'], ['test2@example.com']])
+        self.assertIn(b'http://x/2', self.handler.envelopes[1].content)
+        self.assertEqual(len(set(self.handler.peers)), 1)
+
+    def test_send_batch_checks_users_once_per_chunk(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM user' in statement and ' IN ' in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            self.send_batch([{'to': 'test%d@example.com' % index} for index in range(3)])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(len(statements), 2)
+
+    def test_send_batch_matches_emails_in_any_case(self):
+        response, lines = self.send_batch([{'to': 'Test0@Example.com'}, {'to': 'Nobody@example.com'}])
+
+        self.assertEqual(lines, [{'to': 'Test0@Example.com', 'status': 'sent'}, {'to': 'Nobody@example.com', 'status': 'unknown_user'}])
+
+    def test_send_batch_requires_recipients(self):
+        response = self.client.post('/mailman/send/batch', json={'subject': 'Confirm', 'template_name': 'confirm_email.html'}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_templates_are_rejected(self):
+        for template_name in ('missing.html', '../../config.py'):
+            response = self.client.post('/mailman/send/batch', json={'subject': 'Hi', 'template_name': template_name, 'recipients': [{'to': 'test0@example.com'}]}, headers=self.headers)
+            self.assertEqual((response.status_code, response.json), (400, {'msg': 'Unknown template_name'}), template_name)
+            response = self.client.post('/mailman/send', json={'to': 'test0@example.com', 'subject': 'Hi', 'template_name': template_name}, headers=self.headers)
+            self.assertEqual((response.status_code, response.json), (400, {'msg': 'Unknown template_name'}), template_name)
+        self.assertEqual(OutboundEmail.query.count(), 0)
+
+    def test_params_may_use_any_name(self):
+        params = {'to': 'someone@example.com', 'subject': 'x', 'template_name': 'x', 'confirm_url': 'https://example.com/confirm'}
+        response = self.client.post('/mailman/send', json={'to': 'test0@example.com', 'subject': 'Hi', 'template_name': 'confirm_email.html', 'params': params}, headers=self.headers)
+
+        self.assertEqual(response.status_code, 202)
+        message = OutboundEmail.query.one()
+        self.assertEqual((message.recipient, message.subject), ('test0@example.com', 'Hi'))
+        self.assertIn('https://example.com/confirm', message.html)
+
+    def test_render_email_batch_matches_full_render(self):
+        params_list = [{'confirm_url': 'http://x/?a=1&b=<2>'}, {'confirm_url': 'http://y/'}, {}]
+
+        rendered = list(render_email_batch('confirm_email.html', params_list))
+
+        self.assertEqual(rendered, [render_template('confirm_email.html', params=params) for params in params_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from flask import render_template
+from jinja2 import ChoiceLoader, DictLoader
+from app import create_app
+
+
+class MailTemplateEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.templates = DictLoader({
+            'greeting.html': '<p>Hi {{ params.name }}, {{ params["name"] }}!</p>',
+            'conditional.html': '{% if params.vip %}VIP {% endif %}{{ params.name }}',
+        })
+        self.app.jinja_env.loader = ChoiceLoader([self.templates, self.app.jinja_env.loader])
+        self.engine = self.app.extensions['mail_templates']
+
+    def test_templates_are_precompiled(self):
+        self.assertIsNotNone(self.engine._cache.get('confirm_email.html'))
+        misses = self.engine.misses
+
+        for _ in range(3):
+            self.engine.render('confirm_email.html', {'confirm_url': 'http://x/'})
+
+        self.assertEqual(self.engine.misses, misses)
+        self.assertEqual(self.engine.hits, 3)
+
+    def test_render_matches_jinja_outside_request_context(self):
+        params = {'confirm_url': 'http://x/?a=1&b=<2>'}
+
+        html = self.engine.render('confirm_email.html', params)
+
+        with self.app.test_request_context():
+            self.assertEqual(html, render_template('confirm_email.html', params=params))
+
+    def test_static_skeleton_is_split_from_fields(self):
+        compiled = self.engine.get('greeting.html')
+
+        self.assertEqual(compiled.fields, ('name', 'name'))
+        self.assertEqual(compiled.statics, ('<p>Hi ', ', ', '!</p>'))
+        self.assertEqual(compiled.render({'name': '<b>'}), '<p>Hi &lt;b&gt;, &lt;b&gt;!</p>')
+        self.assertEqual(compiled.render({}), '<p>Hi , !</p>')
+
+    def test_value_dependent_template_falls_back_to_jinja(self):
+        compiled = self.engine.get('conditional.html')
+
+        self.assertIsNone(compiled.statics)
+        self.assertEqual(compiled.render({'vip': True, 'name': 'Ann'}), 'VIP Ann')
+        self.assertEqual(compiled.render({'vip': False, 'name': 'Ann'}), 'Ann')
+
+    def test_cache_is_bounded(self):
+        self.engine.maxsize = 2
+        for template_name in ('confirm_email.html', 'greeting.html', 'conditional.html'):
+            self.engine.get(template_name)
+
+        self.assertEqual(len(self.engine), 2)
+        self.assertNotIn('confirm_email.html', self.engine._cache)
+
+    def test_invalidate_recompiles_edited_template(self):
+        self.assertEqual(self.engine.render('greeting.html', {'name': 'Ann'}), '<p>Hi Ann, Ann!</p>')
+        self.templates.mapping['greeting.html'] = 'Hello {{ params.name }}'
+
+        self.engine.invalidate('greeting.html')
+
+        self.assertEqual(self.engine.render('greeting.html', {'name': 'Ann'}), 'Hello Ann')
+
+
+if __name__ == '__main__':
+    unittest.main()
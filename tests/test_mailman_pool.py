@@ -0,0 +1,81 @@
+import threading
+import unittest
+from flask_testing import TestCase
+from app.mailman.pool import get_smtp_pool
+from app import create_app
+from tests.smtp_server import free_port, smtp_test_config, start_smtp_server
+
+
+class SMTPConnectionPoolTestCase(TestCase):
+    def create_app(self):
+        self.smtp_port = free_port()
+        return create_app(smtp_test_config(self.smtp_port, MAIL_POOL_SIZE=2))
+
+    def setUp(self):
+        self.smtp, self.handler = start_smtp_server(self.smtp_port)
+        self.pool = get_smtp_pool()
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.smtp.stop()
+
+    def send(self, smtp, to='test@example.com'):
+        smtp.sendmail('noreply@flask.com', [to], b'Subject: test\r\n\r\nHello')
+
+    def test_connection_is_reused(self):
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+
+        self.assertEqual(len(self.handler.envelopes), 2)
+        self.assertEqual(self.handler.peers[0], self.handler.peers[1])
+        self.assertEqual(self.pool.idle_count, 1)
+
+    def test_idle_connection_is_replaced(self):
+        self.pool.idle_timeout = 0
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+
+        self.assertNotEqual(self.handler.peers[0], self.handler.peers[1])
+
+    def test_disconnected_connection_is_replaced(self):
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+        self.smtp.stop()
+        self.smtp, self.handler = start_smtp_server(self.smtp_port)
+
+        with self.pool.connection() as smtp:
+            self.send(smtp)
+
+        self.assertEqual(len(self.handler.envelopes), 1)
+
+    def test_pool_size_is_bounded(self):
+        borrowed = []
+        peak = []
+        lock = threading.Lock()
+
+        def borrow():
+            with self.pool.connection() as smtp:
+                with lock:
+                    borrowed.append(smtp)
+                    peak.append(len(borrowed))
+                self.send(smtp)
+                with lock:
+                    borrowed.remove(smtp)
+
+        threads = [threading.Thread(target=borrow) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.handler.envelopes), 6)
+        self.assertLessEqual(max(peak), 2)
+        self.assertLessEqual(self.pool.idle_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
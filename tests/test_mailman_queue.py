@@ -0,0 +1,84 @@
+import time
+import unittest
+from flask_testing import TestCase
+from app.database.context import db
+from app.mailman.models import OutboundEmail, DeadLetterEmail
+from app.mailman.pool import get_smtp_pool
+from app.mailman.queue import get_mail_queue
+from app import create_app
+from tests.smtp_server import free_port, smtp_test_config, start_smtp_server
+
+
+class MailQueueTestCase(TestCase):
+    def create_app(self):
+        self.smtp_port = free_port()
+
+        return create_app(smtp_test_config(self.smtp_port, MAIL_QUEUE_RETRY_BACKOFF=0, MAIL_QUEUE_MAX_ATTEMPTS=3))
+
+    def setUp(self):
+        db.create_all()
+        self.smtp, self.handler = start_smtp_server(self.smtp_port)
+
+    def tearDown(self):
+        get_mail_queue().stop(timeout=5)
+        get_smtp_pool().close_all()
+        if self.smtp is not None:
+            self.smtp.stop()
+        db.session.remove()
+        db.drop_all()
+
+    def register(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        return self.client.post('/auth/register', json=data)
+
+    def test_register_only_queues_email(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(OutboundEmail.query.count(), 1)
+        self.assertEqual(self.handler.envelopes, [])
+
+    def test_process_pending_delivers_queued_email(self):
+        self.register()
+
+        self.assertEqual(get_mail_queue().process_pending(), 1)
+
+        self.assertEqual(len(self.handler.envelopes), 1)
+        self.assertEqual(self.handler.envelopes[0].rcpt_tos, ['test@example.com'])
+        self.assertIn(b'/confirm/email?token=', self.handler.envelopes[0].content)
+        self.assertEqual(OutboundEmail.query.count(), 0)
+        self.assertIn('mail_smtp_send_duration_seconds_count{outcome="ok"} 1', self.app.extensions['metrics'].registry.render())
+
+    def test_failed_email_is_retried_then_dead_lettered(self):
+        self.smtp.stop()
+        self.smtp = None
+        self.register()
+        queue = get_mail_queue()
+
+        queue.process_pending()
+        message = OutboundEmail.query.one()
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.status, 'queued')
+        self.assertIsNotNone(message.last_error)
+
+        queue.process_pending()
+        queue.process_pending()
+
+        self.assertEqual(OutboundEmail.query.count(), 0)
+        dead_letter = DeadLetterEmail.query.one()
+        self.assertEqual(dead_letter.recipient, 'test@example.com')
+        self.assertEqual(dead_letter.attempts, 3)
+
+    def test_background_worker_drains_queue(self):
+        get_mail_queue().start(workers=1)
+        self.register()
+
+        deadline = time.time() + 5
+        while not self.handler.envelopes and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(len(self.handler.envelopes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
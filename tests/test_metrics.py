@@ -0,0 +1,86 @@
+import unittest
+from flask_testing import TestCase
+from app.database.context import db
+from app.metrics.registry import Registry
+from app import create_app
+
+
+class MetricsTestCase(TestCase):
+    def create_app(self):
+        app = create_app()
+        app.config['METRICS_SLOW_REQUEST_THRESHOLD'] = None
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def register(self):
+        data = {'username': 'testuser', 'password': 'testpassword', 'email': 'test@example.com', 'firstname': 'Test', 'lastname': 'User', 'phone': '+91-7737713067'}
+        return self.client.post('/auth/register', json=data)
+
+    def test_metrics_endpoint_reports_requests_and_sql(self):
+        self.register()
+        self.client.get('/mailman/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+
+        text = response.data.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_count{blueprint="auth",endpoint="auth.register",method="POST"} 1', text)
+        self.assertIn('http_requests_total{blueprint="auth",endpoint="auth.register",method="POST",status="201"} 1', text)
+        self.assertIn('http_requests_total{blueprint="mailman",endpoint="mailman.index",method="GET",status="200"} 1', text)
+        self.assertIn('db_statements_total{blueprint="auth",endpoint="auth.register"} 2', text)
+        self.assertIn('db_duration_seconds_total{blueprint="auth",endpoint="auth.register"}', text)
+        self.assertIn('identity_cache_misses_total', text)
+
+    def test_metrics_are_only_served_to_allowed_scrapers(self):
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        self.assertEqual(self.client.get('/metrics', environ_base=remote).status_code, 403)
+
+        self.app.config['METRICS_TOKEN'] = 'scrape-token'
+        self.assertEqual(self.client.get('/metrics', environ_base=remote, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get('/metrics', environ_base=remote, headers={'Authorization': 'Bearer scrape-token'}).status_code, 200)
+
+        self.app.config['METRICS_ALLOWED_NETWORKS'] = ('203.0.113.0/24',)
+        self.assertEqual(self.client.get('/metrics', environ_base=remote).status_code, 200)
+
+    def test_slow_requests_log_their_queries(self):
+        self.app.extensions['metrics'].slow_threshold = 0.0
+
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.register()
+
+        self.assertIn('Slow request POST /auth/register', logs.output[0])
+        self.assertIn('INSERT INTO user', logs.output[0])
+
+
+class RegistryTestCase(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram('latency_seconds', 'Latency.', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value, 'a')
+
+        text = registry.render()
+
+        self.assertIn('latency_seconds_bucket{endpoint="a",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{endpoint="a",le="1.0"} 3', text)
+        self.assertIn('latency_seconds_bucket{endpoint="a",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_sum{endpoint="a"} 5.65', text)
+        self.assertIn('latency_seconds_count{endpoint="a"} 4', text)
+
+    def test_counter_labels_are_escaped(self):
+        registry = Registry()
+        registry.counter('events_total', 'Events.', ('name',)).inc('say "hi"', amount=2)
+
+        self.assertIn('events_total{name="say \\"hi\\""} 2', registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import datetime
+import gzip
+import json
+import unittest
+import uuid
+from unittest import mock
+from flask import jsonify, request
+from flask_testing import TestCase
+from app.database.context import db
+from app.auth.models import User
+from app.auth.utils import create_token
+from app.json_provider import FastJSONProvider
+from app import create_app
+from config import Config
+
+
+class CompressedConfig(Config):
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 200
+    ADMIN_USERS_EXPORT_BATCH_SIZE = 2
+
+
+class JSONProviderTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def test_app_uses_fast_provider(self):
+        self.assertIsInstance(self.app.json, FastJSONProvider)
+
+    def test_matches_stdlib_output(self):
+        value = {
+            'when': datetime.datetime(2024, 1, 2, 3, 4, 5),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'counts': {2: 'two', 1: 'one'},
+            'b': [1.5, None, True],
+        }
+        fast = json.loads(self.app.json.dumps(value))
+        with mock.patch('app.json_provider.orjson', None):
+            stdlib = json.loads(self.app.json.dumps(value))
+
+        self.assertEqual(fast, stdlib)
+        self.assertEqual(fast['when'], 'Tue, 02 Jan 2024 03:04:05 GMT')
+
+    def test_parses_requests_and_writes_responses(self):
+        with self.app.test_request_context('/', method='POST', data='{"name": "Zoë"}', content_type='application/json'):
+            self.assertEqual(self.app.json.loads(b'[1, 2]'), [1, 2])
+            self.assertEqual(request.get_json(), {'name': 'Zoë'})
+            response = jsonify(name='Zoë')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.get_data(), '{"name":"Zoë"}\n'.encode())
+
+    def test_invalid_request_body_is_a_bad_request(self):
+        response = self.client.post('/auth/login', data='{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompressionTestCase(TestCase):
+    def create_app(self):
+        return create_app(CompressedConfig)
+
+    def setUp(self):
+        db.create_all()
+        admin = User(username='adminuser', password='testpassword', firstname='Admin', lastname='User',
+                     email='admin@example.com', phone='+91-7737713000', is_admin=True)
+        admin.save()
+        for index in range(1, 6):
+            User(username='testuser%d' % index, password='testpassword', firstname='Test', lastname='User',
+                 email='test%d@example.com' % index, phone='+91-77377130%02d' % index).save()
+        self.headers = {'Authorization': 'Bearer ' + create_token(admin)}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_compresses_large_responses(self):
+        response = self.client.get('/auth/users', headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))['users']), 6)
+
+    def test_leaves_small_or_unaccepted_responses_alone(self):
+        small = self.client.post('/auth/login', json={'username': 'x'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertEqual(small.json['msg'], 'Missing username or password')
+
+        identity = self.client.get('/auth/users', headers=dict(self.headers, **{'Accept-Encoding': 'identity'}))
+        self.assertNotIn('Content-Encoding', identity.headers)
+        self.assertEqual(len(identity.json['users']), 6)
+
+    def test_compresses_streams_chunk_by_chunk(self):
+        response = self.client.get('/auth/users/export', headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}), buffered=False)
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        chunks = list(response.response)
+        response.close()
+        self.assertGreaterEqual(len(chunks), 3)
+        lines = gzip.decompress(b''.join(chunks)).decode().splitlines()
+        self.assertEqual([json.loads(line)['username'] for line in lines][:2], ['adminuser', 'testuser1'])
+        self.assertEqual(len(lines), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
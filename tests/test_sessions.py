@@ -0,0 +1,135 @@
+import datetime
+import unittest
+from flask import jsonify, request, session
+from flask_testing import TestCase
+from sqlalchemy import event
+from app.database.context import db
+from app.database.sessions import ServerSession, SessionCache, SessionSweeper, dump_session, load_session
+from app import create_app
+
+
+class SessionStoreTestCase(TestCase):
+    def create_app(self):
+        app = create_app()
+
+        @app.route('/test/session', methods=['GET', 'POST', 'DELETE'])
+        def session_view():
+            if request.method == 'POST':
+                session.update(request.get_json())
+            elif request.method == 'DELETE':
+                session.clear()
+            return jsonify(dict(session))
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if 'sessions' in statement:
+            self.statements.append(statement.split()[0])
+
+    def test_writes_only_when_the_session_changes(self):
+        response = self.client.get('/test/session')
+        self.assertEqual(response.json, {})
+        self.assertNotIn('Set-Cookie', response.headers)
+        self.assertEqual(self.statements, [])
+
+        self.client.post('/test/session', json={'cart': [1, 2]})
+        self.assertEqual(self.statements, ['INSERT'])
+
+        # Hot reads and identical rewrites come from the in-process tier.
+        self.assertEqual(self.client.get('/test/session').json, {'cart': [1, 2]})
+        self.client.post('/test/session', json={'cart': [1, 2]})
+        self.assertEqual(self.statements, ['INSERT'])
+
+        self.client.post('/test/session', json={'cart': [3]})
+        self.assertEqual(self.statements, ['INSERT', 'UPDATE'])
+        self.assertEqual(ServerSession.query.count(), 1)
+
+    def test_loads_from_the_table_on_a_cache_miss(self):
+        self.client.post('/test/session', json={'step': 2})
+        self.app.session_interface.cache.clear()
+
+        self.assertEqual(self.client.get('/test/session').json, {'step': 2})
+        self.assertEqual(self.statements, ['INSERT', 'SELECT'])
+
+    def test_clearing_deletes_the_row(self):
+        self.client.post('/test/session', json={'step': 2})
+
+        response = self.client.delete('/test/session')
+
+        self.assertIn('session=;', response.headers['Set-Cookie'])
+        self.assertEqual(ServerSession.query.count(), 0)
+        self.assertEqual(self.client.get('/test/session').json, {})
+
+    def test_expired_sessions_are_not_loaded(self):
+        self.client.post('/test/session', json={'step': 2})
+        ServerSession.query.update({'expiry': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)})
+        db.session.commit()
+        self.app.session_interface.cache.clear()
+
+        self.assertEqual(self.client.get('/test/session').json, {})
+
+    def test_unknown_session_ids_are_replaced(self):
+        self.client.set_cookie('localhost', 'session', 'chosen-by-the-client')
+        self.client.post('/test/session', json={'step': 1})
+
+        self.assertNotEqual(ServerSession.query.one().id, 'chosen-by-the-client')
+
+    def test_sweeper_deletes_expired_in_batches(self):
+        now = datetime.datetime.utcnow()
+        for index in range(7):
+            db.session.add(ServerSession(id='expired%d' % index, data=b'{}', expiry=now - datetime.timedelta(minutes=index + 1)))
+        db.session.add(ServerSession(id='live', data=b'{}', expiry=now + datetime.timedelta(hours=1)))
+        db.session.commit()
+        self.statements = []
+        sweeper = SessionSweeper(self.app)
+        sweeper.batch_size = 3
+
+        self.assertEqual(sweeper.sweep(now), 7)
+        self.assertEqual([row.id for row in ServerSession.query], ['live'])
+        self.assertEqual(self.statements.count('DELETE'), 3)
+
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN SELECT id FROM sessions WHERE expiry <= :now ORDER BY expiry LIMIT 3'), {'now': now}))
+        self.assertIn('ix_sessions_expiry', plan)
+
+
+class SessionSerializationTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def test_round_trips_tagged_values(self):
+        data = {'b': (1, 2), 'a': b'\x00raw', 'when': datetime.datetime(2024, 1, 2, 3, 4, 5)}
+
+        payload = dump_session(data)
+
+        self.assertEqual(payload, dump_session(dict(reversed(list(data.items())))))
+        self.assertEqual(payload, b'{"a":{" b":"AHJhdw=="},"b":{" t":[1,2]},"when":{" d":"Tue, 02 Jan 2024 03:04:05 GMT"}}')
+        loaded = load_session(payload)
+        self.assertEqual(loaded['b'], (1, 2))
+        self.assertEqual(loaded['a'], b'\x00raw')
+        self.assertEqual(loaded['when'].replace(tzinfo=None), data['when'])
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = SessionCache(maxsize=2, ttl=60)
+        cache.put('a', b'1', None)
+        cache.put('b', b'2', None)
+        cache.get('a')
+        cache.put('c', b'3', None)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (b'1', None))
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
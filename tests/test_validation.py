@@ -0,0 +1,96 @@
+import unittest
+from flask_testing import TestCase
+from sqlalchemy import event
+from app.database.context import db
+from app.auth.models import User
+from app.auth.schemas import register_schema
+from app.auth.utils import create_token
+from app.mailman.schemas import send_batch_schema
+from app.validation import List, Object, Schema, String
+from app import create_app
+
+
+class SchemaTestCase(unittest.TestCase):
+    def test_collects_every_field_error_in_order(self):
+        errors = register_schema.errors({'username': 'usr', 'firstname': 'T', 'email': 'nope', 'phone': '123', 'password': 'short'})
+
+        self.assertEqual(list(errors), ['username', 'firstname', 'lastname', 'email', 'phone', 'password'])
+        self.assertEqual(errors['lastname'], 'No lastname provided')
+        self.assertEqual(errors['password'], 'Password must be at least 8 characters')
+        self.assertEqual(register_schema.first_error({'username': 'usr'}), 'Username must be between 5 and 32 characters')
+
+    def test_rejects_wrong_types(self):
+        schema = Schema(name=String(), tags=List(String()), meta=Object(required=False))
+
+        self.assertEqual(schema.errors(['not', 'an', 'object']), {'_schema': 'Expected a JSON object'})
+        self.assertEqual(schema.errors(None), {'_schema': 'Expected a JSON object'})
+        self.assertEqual(schema.errors({'name': 5, 'tags': ['a', 1], 'meta': 'x'}), {
+            'name': 'Name must be a string',
+            'tags': 'Item 1: Item must be a string',
+            'meta': 'Meta must be an object',
+        })
+        self.assertEqual(schema.errors({'name': 'x', 'tags': []}), {})
+
+    def test_list_of_schemas(self):
+        data = {'subject': 'Hi', 'template_name': 'confirm_email.html', 'recipients': [{'to': 'a@example.com'}, {'params': {}}]}
+
+        self.assertEqual(send_batch_schema.first_error(data), 'Every recipient needs a "to" address')
+        data['recipients'] = 'a@example.com'
+        self.assertEqual(send_batch_schema.first_error(data), 'Missing subject, template_name or recipients')
+
+    def test_model_validators_share_the_rules(self):
+        with self.assertRaises(AssertionError) as context:
+            User.validate_email(None, 'email', 'not-an-email')
+        self.assertEqual(str(context.exception), 'Invalid email address, must be in the format [email]@[domain]')
+        self.assertEqual(User.check_password_policy('longenough'), 'longenough')
+
+
+class ValidateJsonTestCase(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        db.create_all()
+        user = User(username='testuser', password='testpassword', firstname='Test', lastname='User', email='test@example.com', phone='+91-7737713067')
+        user.save()
+        self.headers = {'Authorization': 'Bearer ' + create_token(user)}
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_invalid_register_touches_no_database(self):
+        response = self.client.post('/auth/register', json={'username': 'testuser', 'email': 'bad', 'phone': 'bad'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['msg'], 'No firstname provided')
+        self.assertEqual(set(response.json['errors']), {'firstname', 'lastname', 'email', 'phone', 'password'})
+        self.assertEqual(self.statements, [])
+
+    def test_login_rejects_malformed_bodies(self):
+        for kwargs in ({'data': 'username=testuser', 'content_type': 'text/plain'}, {'json': ['testuser']}, {'json': {'username': 7, 'password': 'testpassword'}}):
+            response = self.client.post('/auth/login', **kwargs)
+            self.assertEqual(response.status_code, 400, kwargs)
+        self.assertEqual(self.client.post('/auth/login', json={'username': 'testuser'}).json['msg'], 'Missing username or password')
+        self.assertEqual(self.statements, [])
+
+    def test_mail_requests_authenticate_before_validating(self):
+        for path in ('/mailman/send', '/mailman/send/batch'):
+            response = self.client.post(path, json={'to': 'test@example.com'})
+            self.assertEqual(response.status_code, 401, path)
+            self.assertNotIn('errors', response.json)
+
+        response = self.client.post('/mailman/send', json={'to': 'test@example.com'}, headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['msg'], 'Missing to, subject or template_name')
+
+
+if __name__ == '__main__':
+    unittest.main()